@@ -9,9 +9,12 @@ import json
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Any
 from enum import Enum
-import openai
 from datetime import datetime, timedelta
 
+from integrations.llm_client_pool import LLMClientPool, RequestPriority, get_shared_pool
+from opportunity_catalog import OpportunityCatalog
+from tools.freedom_kernel import FreedomKernel, financial_formula, get_default_kernel, time_formula
+
 class AgentType(Enum):
     DECISION_SUPPORT = "decision_support"
     EXECUTION_ASSISTANT = "execution_assistant"
@@ -44,47 +47,104 @@ class Opportunity:
     deadline: Optional[datetime]
     source: str
 
+# 默认目录的截止日期相对构建时间，超过该时长后重新构建
+DEFAULT_CATALOG_TTL = timedelta(days=1)
+
+_default_catalog: Optional[OpportunityCatalog] = None
+_default_catalog_built_at: Optional[datetime] = None
+
+def get_default_catalog() -> OpportunityCatalog:
+    """进程内共享的默认机会目录，构建超过 DEFAULT_CATALOG_TTL 后重新构建"""
+    global _default_catalog, _default_catalog_built_at
+    now = datetime.now()
+    if _default_catalog is None or now - _default_catalog_built_at >= DEFAULT_CATALOG_TTL:
+        built_at = now
+        catalog = OpportunityCatalog()
+        catalog.extend([
+            Opportunity(
+                title="AI内容创作服务",
+                description="为企业提供AI辅助的内容创作服务",
+                potential_income=5000.0,
+                time_investment=20,
+                risk_level=4,
+                skills_required=["AI工具使用", "内容策划", "客户沟通"],
+                deadline=built_at + timedelta(days=30),
+                source="市场趋势分析"
+            ),
+            Opportunity(
+                title="在线技能培训课程",
+                description="创建和销售专业技能培训课程",
+                potential_income=3000.0,
+                time_investment=40,
+                risk_level=3,
+                skills_required=["教学能力", "视频制作", "营销推广"],
+                deadline=built_at + timedelta(days=60),
+                source="技能变现分析"
+            )
+        ])
+        _default_catalog, _default_catalog_built_at = catalog, built_at
+    return _default_catalog
+
 class FreedomMetrics:
-    """自由度指标计算"""
-    
-    def __init__(self):
-        self.metrics = {
-            'time_freedom': 0.0,
-            'location_freedom': 0.0,
-            'financial_freedom': 0.0,
-            'skill_freedom': 0.0,
-            'relationship_freedom': 0.0
-        }
+    """自由度指标计算 (无状态，各维度公式和综合评分都来自共享评分内核)"""
+    
+    # 指标名 -> 评分内核中的维度
+    METRIC_DIMENSIONS = {
+        'time_freedom': 'time',
+        'location_freedom': 'location',
+        'financial_freedom': 'financial',
+        'skill_freedom': 'skill',
+        'relationship_freedom': 'relationship'
+    }
     
-    def calculate_time_freedom(self, flexible_hours: int, total_hours: int = 168) -> float:
-        """计算时间自由度 (每周可支配时间比例)"""
-        return min(flexible_hours / total_hours, 1.0)
+    def __init__(self, kernel: Optional[FreedomKernel] = None):
+        self.kernel = kernel or get_default_kernel()
     
-    def calculate_financial_freedom(self, passive_income: float, monthly_expenses: float) -> float:
-        """计算财务自由度 (被动收入覆盖支出比例)"""
-        return min(passive_income / monthly_expenses, 1.0) if monthly_expenses > 0 else 0.0
+    def empty_metrics(self) -> Dict[str, float]:
+        """各项指标初始值 (每次调用返回新字典)"""
+        return {name: 0.0 for name in self.METRIC_DIMENSIONS}
     
-    def calculate_overall_freedom(self) -> float:
-        """计算综合自由度"""
-        return sum(self.metrics.values()) / len(self.metrics)
+    def calculate_time_freedom(self, flexible_hours: float, *, work_hours_per_week: float = 40,
+                               vacation_days: float = 0, can_work_remotely: bool = False) -> float:
+        """计算时间自由度 (与 FreedomCalculator 相同的公式，以每周工作时间而不是168小时为基数)
+
+        除 flexible_hours 外的参数只能按关键字传入，旧的 (flexible_hours, total_hours) 位置调用会直接报错。
+        """
+        return time_formula(work_hours_per_week, flexible_hours, vacation_days, can_work_remotely)['score']
+    
+    def calculate_financial_freedom(self, passive_income: float, monthly_expenses: float, *,
+                                    active_income: float = 0, emergency_fund: float = 0) -> float:
+        """计算财务自由度 (与 FreedomCalculator 相同的公式)"""
+        return financial_formula(passive_income, active_income, monthly_expenses, emergency_fund)['score']
+    
+    def calculate_overall_freedom(self, metrics: Dict[str, float]) -> float:
+        """计算综合自由度 (按config.json中的freedom_weights加权)"""
+        return self.kernel.overall({self.METRIC_DIMENSIONS[name]: value for name, value in metrics.items()})
 
 class BaseAgent:
     """AI智能体基类"""
     
-    def __init__(self, agent_type: AgentType, name: str):
+    def __init__(self, agent_type: AgentType, name: str, llm_pool: Optional[LLMClientPool] = None):
         self.agent_type = agent_type
         self.name = name
         self.context = {}
+        self.llm_pool = llm_pool
         
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """处理输入数据并返回结果"""
         raise NotImplementedError
+    
+    async def ask_llm(self, prompt: str, priority: RequestPriority = RequestPriority.INTERACTIVE, **kwargs) -> Optional[str]:
+        """通过共享连接池调用LLM，未配置连接池时返回None"""
+        if self.llm_pool is None:
+            return None
+        return await self.llm_pool.chat(prompt, system=f"你是Freedom.AI的{self.name}", priority=priority, **kwargs)
 
 class DecisionSupportAgent(BaseAgent):
     """决策支持智能体"""
     
-    def __init__(self):
-        super().__init__(AgentType.DECISION_SUPPORT, "决策顾问")
+    def __init__(self, llm_pool: Optional[LLMClientPool] = None):
+        super().__init__(AgentType.DECISION_SUPPORT, "决策顾问", llm_pool)
     
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """分析决策选项并提供建议"""
@@ -157,8 +217,8 @@ class DecisionSupportAgent(BaseAgent):
 class ExecutionAssistantAgent(BaseAgent):
     """执行助手智能体"""
     
-    def __init__(self):
-        super().__init__(AgentType.EXECUTION_ASSISTANT, "执行助手")
+    def __init__(self, llm_pool: Optional[LLMClientPool] = None):
+        super().__init__(AgentType.EXECUTION_ASSISTANT, "执行助手", llm_pool)
     
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """协助执行任务"""
@@ -215,8 +275,8 @@ class ExecutionAssistantAgent(BaseAgent):
 class LearningPartnerAgent(BaseAgent):
     """学习伙伴智能体"""
     
-    def __init__(self):
-        super().__init__(AgentType.LEARNING_PARTNER, "学习伙伴")
+    def __init__(self, llm_pool: Optional[LLMClientPool] = None):
+        super().__init__(AgentType.LEARNING_PARTNER, "学习伙伴", llm_pool)
     
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """提供学习建议和路径"""
@@ -292,8 +352,14 @@ class LearningPartnerAgent(BaseAgent):
 class OpportunityScoutAgent(BaseAgent):
     """机会探索智能体"""
     
-    def __init__(self):
-        super().__init__(AgentType.OPPORTUNITY_SCOUT, "机会探索者")
+    def __init__(self, llm_pool: Optional[LLMClientPool] = None, catalog: Optional[OpportunityCatalog] = None):
+        super().__init__(AgentType.OPPORTUNITY_SCOUT, "机会探索者", llm_pool)
+        # 未指定目录时每次查询都取共享的默认目录 (会定期重建)
+        self._catalog = catalog
+    
+    @property
+    def catalog(self) -> OpportunityCatalog:
+        return self._catalog if self._catalog is not None else get_default_catalog()
     
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """发现和分析机会"""
@@ -313,31 +379,9 @@ class OpportunityScoutAgent(BaseAgent):
         }
     
     async def _discover_opportunities(self, profile: Dict, trends: List) -> List[Opportunity]:
-        """发现机会"""
-        # 模拟机会发现
-        opportunities = [
-            Opportunity(
-                title="AI内容创作服务",
-                description="为企业提供AI辅助的内容创作服务",
-                potential_income=5000.0,
-                time_investment=20,
-                risk_level=4,
-                skills_required=["AI工具使用", "内容策划", "客户沟通"],
-                deadline=datetime.now() + timedelta(days=30),
-                source="市场趋势分析"
-            ),
-            Opportunity(
-                title="在线技能培训课程",
-                description="创建和销售专业技能培训课程",
-                potential_income=3000.0,
-                time_investment=40,
-                risk_level=3,
-                skills_required=["教学能力", "视频制作", "营销推广"],
-                deadline=datetime.now() + timedelta(days=60),
-                source="技能变现分析"
-            )
-        ]
-        return opportunities
+        """发现机会 (从预建索引的机会目录中取前K个)"""
+        limit = profile.get('limit', 5)
+        return [opp for _, opp in self.catalog.top_k(profile, k=limit)]
     
     def _analyze_trends(self, trends: List) -> Dict[str, Any]:
         """分析市场趋势"""
@@ -361,12 +405,14 @@ class OpportunityScoutAgent(BaseAgent):
 class FreedomAIOrchestrator:
     """AI智能体编排器"""
     
-    def __init__(self):
+    def __init__(self, api_key: Optional[str] = None):
+        # 所有智能体共享一个连接池，统一限流
+        self.llm_pool = get_shared_pool(api_key) if api_key else None
         self.agents = {
-            AgentType.DECISION_SUPPORT: DecisionSupportAgent(),
-            AgentType.EXECUTION_ASSISTANT: ExecutionAssistantAgent(),
-            AgentType.LEARNING_PARTNER: LearningPartnerAgent(),
-            AgentType.OPPORTUNITY_SCOUT: OpportunityScoutAgent()
+            AgentType.DECISION_SUPPORT: DecisionSupportAgent(self.llm_pool),
+            AgentType.EXECUTION_ASSISTANT: ExecutionAssistantAgent(self.llm_pool),
+            AgentType.LEARNING_PARTNER: LearningPartnerAgent(self.llm_pool),
+            AgentType.OPPORTUNITY_SCOUT: OpportunityScoutAgent(self.llm_pool)
         }
         self.freedom_metrics = FreedomMetrics()
     
@@ -385,20 +431,26 @@ class FreedomAIOrchestrator:
     
     def calculate_freedom_score(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """计算自由度评分"""
-        # 更新各项自由度指标
-        self.freedom_metrics.metrics['time_freedom'] = self.freedom_metrics.calculate_time_freedom(
-            user_data.get('flexible_hours', 40)
+        # 指标只保存在本次调用的局部变量中，并发请求互不影响
+        metrics = self.freedom_metrics.empty_metrics()
+        metrics['time_freedom'] = self.freedom_metrics.calculate_time_freedom(
+            user_data.get('flexible_hours', 40),
+            work_hours_per_week=user_data.get('work_hours_per_week', 40),
+            vacation_days=user_data.get('vacation_days', 0),
+            can_work_remotely=user_data.get('can_work_remotely', False)
         )
-        self.freedom_metrics.metrics['financial_freedom'] = self.freedom_metrics.calculate_financial_freedom(
+        metrics['financial_freedom'] = self.freedom_metrics.calculate_financial_freedom(
             user_data.get('passive_income', 0),
-            user_data.get('monthly_expenses', 3000)
+            user_data.get('monthly_expenses', 3000),
+            active_income=user_data.get('active_income', 0),
+            emergency_fund=user_data.get('emergency_fund', 0)
         )
         
-        overall_score = self.freedom_metrics.calculate_overall_freedom()
+        overall_score = self.freedom_metrics.calculate_overall_freedom(metrics)
         
         return {
             'overall_freedom_score': overall_score,
-            'detailed_metrics': self.freedom_metrics.metrics,
+            'detailed_metrics': metrics,
             'recommendations': self._get_freedom_recommendations(overall_score)
         }
     
@@ -454,7 +506,8 @@ async def main():
     
     # 示例：计算自由度
     user_data = {
-        'flexible_hours': 60,
+        'work_hours_per_week': 45,
+        'flexible_hours': 15,
         'passive_income': 2000,
         'monthly_expenses': 4000
     }
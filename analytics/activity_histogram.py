@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+用户活跃时段直方图
+Activity Histogram - online per-user weekday x hour activity counts with decay
+
+每个用户一个 7×24 的 uint16 计数矩阵 (星期 × 小时)，行为写入时在线更新，
+不再从原始行为记录重新统计。衰减按半衰期整步进行：用户的计数矩阵记录自己
+所处的衰减周期，下次访问时按经过的周期数右移 (减半)，单元格接近 uint16 上限时
+整行减半，比例保持不变。每个用户的查询和更新都是 O(1)。
+"""
+
+import os
+import sys
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.action_scan import scan_actions
+from database.string_dictionary import USER_IDS
+
+DAYS_PER_WEEK = 7
+HOURS_PER_DAY = 24
+_SATURATION = np.iinfo(np.uint16).max
+
+class ActivityHistogram:
+    """按用户的 星期×小时 活跃度直方图"""
+
+    def __init__(self, half_life_days: Optional[float] = 28, initial_users: int = 1024):
+        """
+        Args:
+            half_life_days: 衰减半衰期 (天)，None表示不衰减
+            initial_users: 预分配的用户行数，不足时按倍数扩容
+        """
+        self.half_life_days = half_life_days
+        self._counts = np.zeros((initial_users, DAYS_PER_WEEK, HOURS_PER_DAY), dtype=np.uint16)
+        # 每个用户计数所处的衰减周期编号
+        self._periods = np.zeros(initial_users, dtype=np.int32)
+        # 用户编号 (共享字典) -> 行号
+        self._rows: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def _period(self, ts: float) -> int:
+        if self.half_life_days is None:
+            return 0
+        return int(ts // (self.half_life_days * 86400))
+
+    def _row(self, user_id: str, create: bool) -> Optional[int]:
+        user_code = USER_IDS.encode(user_id) if create else USER_IDS.get(user_id)
+        if user_code is None:
+            return None
+        row = self._rows.get(user_code)
+        if row is None and create:
+            row = len(self._rows)
+            if row >= len(self._counts):
+                grow = len(self._counts)
+                self._counts = np.concatenate([self._counts, np.zeros_like(self._counts[:grow])])
+                self._periods = np.concatenate([self._periods, np.zeros_like(self._periods[:grow])])
+            self._rows[user_code] = row
+        return row
+
+    def _age(self, row: int, period: int) -> np.ndarray:
+        """把该行衰减到 period 周期 (只向前衰减)，返回该行"""
+        counts = self._counts[row]
+        elapsed = period - int(self._periods[row])
+        if elapsed > 0:
+            if elapsed >= 16:
+                counts[...] = 0
+            else:
+                counts >>= elapsed
+            self._periods[row] = period
+        return counts
+
+    def record(self, user_id: str, timestamp: Optional[datetime] = None, weight: int = 1):
+        """记录一次活动"""
+        timestamp = timestamp or datetime.now()
+        period = self._period(timestamp.timestamp())
+        weekday, hour = timestamp.weekday(), timestamp.hour
+        with self._lock:
+            row = self._row(user_id, create=True)
+            if not self._counts[row].any():
+                self._periods[row] = period
+            counts = self._age(row, period)
+            if int(counts[weekday, hour]) + weight > _SATURATION:
+                counts >>= 1
+            counts[weekday, hour] += weight
+
+    def record_action(self, action: Any):
+        """记录一条行为 (UserAction、ActionRecord 或 user_actions.json 中的字典)"""
+        if isinstance(action, dict):
+            user_id, timestamp = action.get('user_id'), action.get('timestamp')
+        else:
+            user_id, timestamp = action.user_id, action.timestamp
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        self.record(user_id, timestamp)
+
+    def observe_batch(self, records: List[Dict[str, Any]]):
+        """行为日志的监听接口：每批写入成功后调用"""
+        for record in records:
+            self.record_action(record)
+
+    def load_history(self, db: Any, since: Optional[datetime] = None) -> int:
+        """从历史行为构建直方图 (只扫描一次)，返回读取的行为数"""
+        count = 0
+        for action in sorted(scan_actions(db, since=since, columns=('user_id', 'timestamp')),
+                             key=lambda a: a['timestamp']):
+            self.record(action['user_id'], action['timestamp'])
+            count += 1
+        return count
+
+    def histogram(self, user_id: str, now: Optional[datetime] = None) -> Optional[np.ndarray]:
+        """用户的 7×24 计数矩阵 (副本，已衰减到 now)；没有记录时返回None"""
+        with self._lock:
+            row = self._row(user_id, create=False)
+            if row is None:
+                return None
+            return self._age(row, self._period((now or datetime.now()).timestamp())).copy()
+
+    def hour_distribution(self, user_id: str) -> Dict[int, int]:
+        """按小时汇总 {小时: 计数}，只包含有活动的小时"""
+        counts = self.histogram(user_id)
+        if counts is None:
+            return {}
+        by_hour = counts.sum(axis=0, dtype=np.int64)
+        return {hour: int(n) for hour, n in enumerate(by_hour) if n}
+
+    def most_active_hour(self, user_id: str) -> Optional[int]:
+        distribution = self.hour_distribution(user_id)
+        return max(distribution, key=distribution.get) if distribution else None
+
+    def most_active_slot(self, user_id: str) -> Optional[Tuple[int, int]]:
+        """最活跃的 (星期, 小时)，星期一为0"""
+        counts = self.histogram(user_id)
+        if counts is None or not counts.any():
+            return None
+        weekday, hour = np.unravel_index(int(np.argmax(counts)), counts.shape)
+        return int(weekday), int(hour)
+
+    def best_send_hour(self, user_id: str, weekday: Optional[int] = None,
+                       default: int = 9) -> int:
+        """通知发送时间：用户在该星期 (未指定时为全周) 最活跃的小时，没有数据时返回 default"""
+        counts = self.histogram(user_id)
+        if counts is None:
+            return default
+        by_hour = counts[weekday] if weekday is not None else counts.sum(axis=0, dtype=np.int64)
+        return int(np.argmax(by_hour)) if by_hour.any() else default
+
+    def activity_hours(self, user_id: str) -> Dict[str, Any]:
+        """与 analyze_user_behavior 中 activity_hours 相同形式的结果"""
+        distribution = self.hour_distribution(user_id)
+        return {
+            'distribution': distribution,
+            'most_active_hour': max(distribution, key=distribution.get) if distribution else None
+        }
+
+    def save(self, path: str):
+        """保存为 .npz (计数矩阵、衰减周期和对应的用户ID)"""
+        with self._lock:
+            n = len(self._rows)
+            user_ids = [None] * n
+            for user_code, row in self._rows.items():
+                user_ids[row] = USER_IDS.decode(user_code)
+            counts = self._counts[:n].copy()
+            periods = self._periods[:n].copy()
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, counts=counts, periods=periods, user_ids=np.array(user_ids, dtype=str),
+                            half_life_days=np.array(-1.0 if self.half_life_days is None else self.half_life_days))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'ActivityHistogram':
+        with np.load(path) as data:
+            half_life = float(data['half_life_days'])
+            histogram = cls(half_life_days=None if half_life < 0 else half_life,
+                            initial_users=max(len(data['user_ids']), 1))
+            n = len(data['user_ids'])
+            histogram._counts[:n] = data['counts']
+            histogram._periods[:n] = data['periods']
+            histogram._rows = {USER_IDS.encode(str(user_id)): row for row, user_id in enumerate(data['user_ids'])}
+        return histogram
+
+    def __len__(self) -> int:
+        return len(self._rows)
@@ -14,14 +14,40 @@ import statistics
 
 # 导入相关模块
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from database.action_codec import ACTION_TYPES, code_of
+from database.action_scan import scan_actions
+from database.string_dictionary import USER_IDS
+from analytics.activity_histogram import ActivityHistogram
+from analytics.path_analysis import PathAnalyzer
+from analytics.search_trends import SearchTrends
+from analytics.sessionization import SessionTable
+from analytics.window_cache import ActionWindow, WindowCache
 from database.user_db import UserDatabase
 from user_system.models import ActionType, UserAction
 
 class BehaviorAnalytics:
     """用户行为分析系统"""
     
-    def __init__(self, db: UserDatabase):
+    def __init__(self, db: UserDatabase, search_trends: Optional[SearchTrends] = None,
+                 activity_histogram: Optional[ActivityHistogram] = None,
+                 window_cache: Optional[WindowCache] = None,
+                 path_analyzer: Optional[PathAnalyzer] = None,
+                 session_table: Optional[SessionTable] = None):
         self.db = db
+        self.search_trends = search_trends
+        self.activity_histogram = activity_histogram
+        # 设置后全站统计 (功能采用、分群、漏斗) 由按时间桶缓存的聚合结果得到，窗口起点对齐到桶边界
+        self.window_cache = window_cache
+        self.path_analyzer = path_analyzer
+        self.session_table = session_table
+    
+    def action_listeners(self) -> List[Any]:
+        """已配置的增量统计组件的 observe_batch 列表
+
+        用法: db.start_action_logger(listeners=analytics.action_listeners())，新行为每批写入后立即计入
+        """
+        components = (self.search_trends, self.activity_histogram, self.window_cache, self.path_analyzer)
+        return [component.observe_batch for component in components if component is not None]
     
     def analyze_user_journey(self, user_id: str, days: int = 30) -> Dict[str, Any]:
         """分析用户旅程"""
@@ -47,50 +73,60 @@ class BehaviorAnalytics:
         # 生成洞察
         insights = self._generate_journey_insights(actions)
         
-        return {
+        result = {
             'user_id': user_id,
             'analysis_period': f'{days} days',
             'total_actions': len(actions),
             'journey': journey,
             'insights': insights
         }
+        
+        # 同一分群的用户在相同路径上接下来最常做什么
+        if self.path_analyzer is not None:
+            result['predicted_next_actions'] = self.path_analyzer.predict_next(
+                user_id, history=[action.action_type for action in actions[-2:]]
+            )
+        
+        return result
     
     def analyze_feature_adoption(self, user_id: str = None, days: int = 30) -> Dict[str, Any]:
         """分析功能采用情况"""
         start_date = datetime.now() - timedelta(days=days)
         
-        if user_id:
-            actions = self.db.get_user_actions(user_id, limit=1000, start_date=start_date)
-            scope = f"user_{user_id}"
+        scope = f"user_{user_id}" if user_id else "all_users"
+        
+        if self.window_cache is not None and not user_id:
+            window = self.window_cache.window(days)
+            feature_stats = {
+                ACTION_TYPES[code].value: n for code, n in enumerate(window.counts.sum(axis=0).tolist()) if n
+            }
+            feature_users = {
+                ACTION_TYPES[code].value: n for code, n in enumerate((window.counts > 0).sum(axis=0).tolist()) if n
+            }
+            total_actions = window.total_actions
+            total_users = len(window) or 1
         else:
-            # 分析所有用户
-            actions_data = self.db._load_data(self.db.actions_file)
-            all_actions = actions_data.get('actions', [])
+            # 只读取时间窗口内的 user_code / action_type 两个字段，用户按整数编号统计
+            users = [user_id] if user_id else None
+            actions = list(scan_actions(self.db, since=start_date, users=users, columns=('user_code', 'action_type')))
             
-            actions = []
-            for action_data in all_actions:
-                timestamp = datetime.fromisoformat(action_data['timestamp'])
-                if timestamp >= start_date:
-                    action_data['timestamp'] = timestamp
-                    action_data['action_type'] = ActionType(action_data['action_type'])
-                    actions.append(UserAction(**action_data))
+            # 功能使用统计
+            feature_stats = defaultdict(int)
+            user_feature_usage = defaultdict(set)
             
-            scope = "all_users"
-        
-        # 功能使用统计
-        feature_stats = defaultdict(int)
-        user_feature_usage = defaultdict(set)
-        
-        for action in actions:
-            feature = action.action_type.value
-            feature_stats[feature] += 1
-            user_feature_usage[feature].add(action.user_id)
+            for action in actions:
+                feature = action['action_type'].value
+                feature_stats[feature] += 1
+                user_feature_usage[feature].add(action['user_code'])
+            
+            feature_users = {feature: len(users) for feature, users in user_feature_usage.items()}
+            total_actions = len(actions)
+            total_users = len(set(action['user_code'] for action in actions)) if actions else 1
         
         # 计算采用率
-        total_users = len(set(action.user_id for action in actions)) if actions else 1
         adoption_rates = {
-            feature: len(users) / total_users 
-            for feature, users in user_feature_usage.items()
+            feature: users / total_users 
+            for feature, users in feature_users.items()
         }
         
         # 功能流行度排序
@@ -100,7 +136,7 @@ class BehaviorAnalytics:
             'scope': scope,
             'analysis_period': f'{days} days',
             'total_users': total_users,
-            'total_actions': len(actions),
+            'total_actions': total_actions,
             'feature_usage': dict(feature_stats),
             'adoption_rates': adoption_rates,
             'popular_features': popular_features[:10],
@@ -111,45 +147,11 @@ class BehaviorAnalytics:
         """用户分群分析"""
         start_date = datetime.now() - timedelta(days=days)
         
-        # 获取所有用户行为
-        actions_data = self.db._load_data(self.db.actions_file)
-        all_actions = actions_data.get('actions', [])
-        
-        user_metrics = defaultdict(lambda: {
-            'total_actions': 0,
-            'unique_features': set(),
-            'assessment_count': 0,
-            'opportunity_views': 0,
-            'learning_plans': 0,
-            'last_activity': None,
-            'first_activity': None
-        })
-        
         # 计算用户指标
-        for action_data in all_actions:
-            timestamp = datetime.fromisoformat(action_data['timestamp'])
-            if timestamp < start_date:
-                continue
-            
-            user_id = action_data['user_id']
-            action_type = ActionType(action_data['action_type'])
-            
-            metrics = user_metrics[user_id]
-            metrics['total_actions'] += 1
-            metrics['unique_features'].add(action_type.value)
-            
-            if not metrics['first_activity'] or timestamp < metrics['first_activity']:
-                metrics['first_activity'] = timestamp
-            if not metrics['last_activity'] or timestamp > metrics['last_activity']:
-                metrics['last_activity'] = timestamp
-            
-            # 特定行为计数
-            if action_type == ActionType.ASSESSMENT:
-                metrics['assessment_count'] += 1
-            elif action_type == ActionType.OPPORTUNITY_VIEW:
-                metrics['opportunity_views'] += 1
-            elif action_type == ActionType.LEARNING_PLAN:
-                metrics['learning_plans'] += 1
+        if self.window_cache is not None:
+            user_metrics = self._window_user_metrics(self.window_cache.window(days))
+        else:
+            user_metrics = self._scan_user_metrics(start_date)
         
         # 用户分群
         segments = {
@@ -159,18 +161,18 @@ class BehaviorAnalytics:
             'inactive_users': []    # 不活跃用户
         }
         
-        for user_id, metrics in user_metrics.items():
+        for user_code, metrics in user_metrics.items():
             total_actions = metrics['total_actions']
             unique_features = len(metrics['unique_features'])
             
             if total_actions >= 50 and unique_features >= 5:
-                segments['power_users'].append(user_id)
+                segments['power_users'].append(user_code)
             elif total_actions >= 20 and unique_features >= 3:
-                segments['regular_users'].append(user_id)
+                segments['regular_users'].append(user_code)
             elif total_actions >= 5:
-                segments['casual_users'].append(user_id)
+                segments['casual_users'].append(user_code)
             else:
-                segments['inactive_users'].append(user_id)
+                segments['inactive_users'].append(user_code)
         
         # 计算分群统计
         segment_stats = {}
@@ -197,7 +199,7 @@ class BehaviorAnalytics:
         return {
             'analysis_period': f'{days} days',
             'total_users': len(user_metrics),
-            'segments': segments,
+            'segments': {name: USER_IDS.decode_many(codes) for name, codes in segments.items()},
             'segment_stats': segment_stats,
             'insights': self._generate_segment_insights(segment_stats)
         }
@@ -215,24 +217,32 @@ class BehaviorAnalytics:
             ('job_application', ActionType.OPPORTUNITY_APPLY)
         ]
         
-        # 获取所有用户行为
-        actions_data = self.db._load_data(self.db.actions_file)
-        all_actions = actions_data.get('actions', [])
-        
-        user_progress = defaultdict(set)
-        
-        # 跟踪用户在漏斗中的进展
-        for action_data in all_actions:
-            timestamp = datetime.fromisoformat(action_data['timestamp'])
-            if timestamp < start_date:
-                continue
+        if self.window_cache is not None:
+            # 每个用户完成过的步骤即聚合结果中计数非零的行为类型
+            step_codes = [(step_name, code_of(step_action)) for step_name, step_action in funnel_steps]
+            user_progress = {}
+            window = self.window_cache.window(days)
+            for user_code, counts in zip(window.user_codes.tolist(), window.counts.tolist()):
+                steps = {step_name for step_name, code in step_codes if counts[code]}
+                if steps:
+                    user_progress[user_code] = steps
+        else:
+            # 只读取漏斗涉及的行为类型
+            actions = scan_actions(
+                self.db, since=start_date, types=[step_action for _, step_action in funnel_steps],
+                columns=('user_code', 'action_type')
+            )
             
-            user_id = action_data['user_id']
-            action_type = ActionType(action_data['action_type'])
+            user_progress = defaultdict(set)
             
-            for step_name, step_action in funnel_steps:
-                if action_type == step_action:
-                    user_progress[user_id].add(step_name)
+            # 跟踪用户在漏斗中的进展
+            for action in actions:
+                user_code = action['user_code']
+                action_type = action['action_type']
+                
+                for step_name, step_action in funnel_steps:
+                    if action_type == step_action:
+                        user_progress[user_code].add(step_name)
         
         # 计算每个步骤的用户数
         funnel_data = []
@@ -270,22 +280,20 @@ class BehaviorAnalytics:
         # 按周分析留存
         weekly_cohorts = {}
         
-        # 获取所有用户的首次活动时间
-        users_data = self.db._load_data(self.db.users_file)
-        actions_data = self.db._load_data(self.db.actions_file)
-        all_actions = actions_data.get('actions', [])
-        
-        # 找到每个用户的首次活动时间
+        # 一次扫描 user_code / timestamp：找到每个用户的首次活动时间，并记录分析期内每周是否活跃
         user_first_activity = {}
-        for action_data in all_actions:
-            user_id = action_data['user_id']
-            timestamp = datetime.fromisoformat(action_data['timestamp'])
+        user_active_weeks = defaultdict(set)
+        for action in scan_actions(self.db, columns=('user_code', 'timestamp')):
+            user_code = action['user_code']
+            timestamp = action['timestamp']
             
-            if user_id not in user_first_activity or timestamp < user_first_activity[user_id]:
-                user_first_activity[user_id] = timestamp
+            if user_code not in user_first_activity or timestamp < user_first_activity[user_code]:
+                user_first_activity[user_code] = timestamp
+            if timestamp >= start_date:
+                user_active_weeks[user_code].add((timestamp - start_date) // timedelta(weeks=1))
         
         # 按周分组用户
-        for user_id, first_activity in user_first_activity.items():
+        for user_code, first_activity in user_first_activity.items():
             if first_activity < start_date:
                 continue
             
@@ -293,11 +301,11 @@ class BehaviorAnalytics:
             week_number = (first_activity - start_date).days // 7
             if week_number not in weekly_cohorts:
                 weekly_cohorts[week_number] = set()
-            weekly_cohorts[week_number].add(user_id)
+            weekly_cohorts[week_number].add(user_code)
         
-        # 计算每周的留存率
+        # 计算每周的留存率 (按队列周排序，结果与扫描顺序、存储层无关)
         retention_data = []
-        for week, cohort_users in weekly_cohorts.items():
+        for week, cohort_users in sorted(weekly_cohorts.items()):
             cohort_size = len(cohort_users)
             week_start = start_date + timedelta(weeks=week)
             
@@ -305,17 +313,11 @@ class BehaviorAnalytics:
             weekly_retention = [100]  # 第0周留存率为100%
             
             for retention_week in range(1, min(5, (days // 7) - week)):  # 最多看4周留存
-                retention_start = week_start + timedelta(weeks=retention_week)
-                retention_end = retention_start + timedelta(weeks=1)
-                
                 # 统计在这一周有活动的用户
-                active_users = set()
-                for action_data in all_actions:
-                    timestamp = datetime.fromisoformat(action_data['timestamp'])
-                    if retention_start <= timestamp < retention_end:
-                        user_id = action_data['user_id']
-                        if user_id in cohort_users:
-                            active_users.add(user_id)
+                active_users = {
+                    user_code for user_code in cohort_users
+                    if week + retention_week in user_active_weeks[user_code]
+                }
                 
                 retention_rate = len(active_users) / cohort_size * 100 if cohort_size > 0 else 0
                 weekly_retention.append(round(retention_rate, 2))
@@ -333,6 +335,23 @@ class BehaviorAnalytics:
             'insights': self._generate_retention_insights(retention_data)
         }
     
+    def analyze_session_engagement(self, days: int = 30, user_id: str = None) -> Dict[str, Any]:
+        """会话参与度：会话时长、深度和跳出率 (由行为流重建的会话计算)"""
+        start_date = datetime.now() - timedelta(days=days)
+        
+        if self.session_table is not None:
+            table = self.session_table
+        else:
+            # 没有维护派生表时临时重建时间窗口内的会话
+            table = SessionTable(path=None)
+            table.build(self.db, since=start_date)
+        
+        return {
+            'scope': f"user_{user_id}" if user_id else "all_users",
+            'analysis_period': f'{days} days',
+            'engagement': table.engagement(since=start_date, user_id=user_id)
+        }
+    
     def generate_personalized_insights(self, user_id: str) -> Dict[str, Any]:
         """生成个性化洞察"""
         # 获取用户基本信息
@@ -349,14 +368,16 @@ class BehaviorAnalytics:
         # 生成个性化建议
         recommendations = []
         
-        # 基于活跃时间的建议
-        if 'activity_hours' in behavior_analysis:
-            most_active_hour = behavior_analysis['activity_hours'].get('most_active_hour')
-            if most_active_hour:
-                if 6 <= most_active_hour <= 11:
-                    recommendations.append("您是晨型人，建议在上午安排重要的学习和规划活动")
-                elif 18 <= most_active_hour <= 23:
-                    recommendations.append("您习惯在晚上活跃，可以利用晚间时间进行技能提升")
+        # 基于活跃时间的建议 (有在线直方图时直接查询，不再从行为记录重新统计)
+        if self.activity_histogram is not None:
+            most_active_hour = self.activity_histogram.most_active_hour(user_id)
+        else:
+            most_active_hour = behavior_analysis.get('activity_hours', {}).get('most_active_hour')
+        if most_active_hour:
+            if 6 <= most_active_hour <= 11:
+                recommendations.append("您是晨型人，建议在上午安排重要的学习和规划活动")
+            elif 18 <= most_active_hour <= 23:
+                recommendations.append("您习惯在晚上活跃，可以利用晚间时间进行技能提升")
         
         # 基于功能使用的建议
         if 'feature_usage' in behavior_analysis:
@@ -370,12 +391,14 @@ class BehaviorAnalytics:
             elif most_used == 'learning_plan':
                 recommendations.append("您很注重学习成长，建议设置学习目标和进度跟踪")
         
-        # 基于搜索模式的建议
-        if 'search_patterns' in behavior_analysis:
-            popular_keywords = behavior_analysis['search_patterns'].get('popular_keywords', {})
-            if popular_keywords:
-                top_keyword = max(popular_keywords, key=popular_keywords.get)
-                recommendations.append(f"您经常搜索'{top_keyword}'相关内容，建议深入学习这个领域")
+        # 基于搜索模式的建议 (有搜索趋势计数器时直接取用户的top关键词)
+        if self.search_trends is not None:
+            popular_keywords = self.search_trends.popular_keywords(user_id, k=1)
+        else:
+            popular_keywords = behavior_analysis.get('search_patterns', {}).get('popular_keywords', {})
+        if popular_keywords:
+            top_keyword = max(popular_keywords, key=popular_keywords.get)
+            recommendations.append(f"您经常搜索'{top_keyword}'相关内容，建议深入学习这个领域")
         
         # 基于职位偏好的建议
         if 'job_preferences' in behavior_analysis:
@@ -392,6 +415,64 @@ class BehaviorAnalytics:
             'next_actions': self._suggest_next_actions(behavior_analysis)
         }
     
+    def _scan_user_metrics(self, start_date: datetime) -> Dict[int, Dict[str, Any]]:
+        """扫描行为记录，计算 start_date 以来每个用户的分群指标"""
+        # 获取时间窗口内所有用户的行为
+        actions = scan_actions(self.db, since=start_date, columns=('user_code', 'action_type', 'timestamp'))
+        
+        user_metrics = defaultdict(lambda: {
+            'total_actions': 0,
+            'unique_features': set(),
+            'assessment_count': 0,
+            'opportunity_views': 0,
+            'learning_plans': 0,
+            'last_activity': None,
+            'first_activity': None
+        })
+        
+        for action in actions:
+            timestamp = action['timestamp']
+            user_code = action['user_code']
+            action_type = action['action_type']
+            
+            metrics = user_metrics[user_code]
+            metrics['total_actions'] += 1
+            metrics['unique_features'].add(action_type.value)
+            
+            if not metrics['first_activity'] or timestamp < metrics['first_activity']:
+                metrics['first_activity'] = timestamp
+            if not metrics['last_activity'] or timestamp > metrics['last_activity']:
+                metrics['last_activity'] = timestamp
+            
+            # 特定行为计数
+            if action_type == ActionType.ASSESSMENT:
+                metrics['assessment_count'] += 1
+            elif action_type == ActionType.OPPORTUNITY_VIEW:
+                metrics['opportunity_views'] += 1
+            elif action_type == ActionType.LEARNING_PLAN:
+                metrics['learning_plans'] += 1
+        
+        return user_metrics
+    
+    def _window_user_metrics(self, window: ActionWindow) -> Dict[int, Dict[str, Any]]:
+        """由时间桶聚合结果得到与 _scan_user_metrics 相同结构的分群指标"""
+        assessment = code_of(ActionType.ASSESSMENT)
+        opportunity_view = code_of(ActionType.OPPORTUNITY_VIEW)
+        learning_plan = code_of(ActionType.LEARNING_PLAN)
+        
+        user_metrics = {}
+        for row, (user_code, counts) in enumerate(zip(window.user_codes.tolist(), window.counts.tolist())):
+            user_metrics[user_code] = {
+                'total_actions': sum(counts),
+                'unique_features': {ACTION_TYPES[code].value for code, n in enumerate(counts) if n},
+                'assessment_count': counts[assessment],
+                'opportunity_views': counts[opportunity_view],
+                'learning_plans': counts[learning_plan],
+                'last_activity': window.last_activity(row),
+                'first_activity': window.first_activity(row)
+            }
+        return user_metrics
+    
     def _generate_journey_insights(self, actions: List[UserAction]) -> List[str]:
         """生成用户旅程洞察"""
         insights = []
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+个性化洞察预计算
+Insight Scheduler - background refresh of personalized insights
+
+后台线程定期找出上次运行以来有过行为、更新过资料或偏好、或文档已超过
+max_age 的用户，在线程池中重新计算他们的个性化洞察，并带版本号保存结果。
+页面请求直接读取预计算的文档，只有缓存未命中或文档过期时才同步计算一次，
+请求路径上不再做30天的行为扫描。
+"""
+
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.action_scan import scan_actions
+
+class InsightScheduler:
+    """个性化洞察的后台刷新与缓存"""
+
+    def __init__(self, analytics: Any, workers: int = 4, interval: float = 300.0,
+                 store_path: Optional[str] = "data/user_insights.json",
+                 max_age: Optional[float] = 6 * 3600.0, scan_overlap: float = 60.0):
+        """
+        Args:
+            analytics: BehaviorAnalytics 实例
+            workers: 计算洞察的线程数
+            interval: 后台刷新间隔 (秒)
+            store_path: 预计算结果的持久化文件，None表示只保存在内存中
+            max_age: 文档的最长有效期 (秒)，超过后重新计算；None表示不过期
+            scan_overlap: 每轮扫描活跃用户时向前多看的秒数，覆盖上一轮之前发生、
+                          之后才由异步行为日志写入的行为 (至少取行为日志的 flush_interval 的两倍)
+        """
+        self.analytics = analytics
+        self.workers = workers
+        self.interval = interval
+        self.store_path = store_path
+        self.max_age = max_age
+        self.scan_overlap = scan_overlap
+
+        # user_id -> {'version', 'computed_at', 'insights'}
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        self._pending: set = set()
+        self._lock = threading.Lock()
+        self._version = 0
+        self._last_run: Optional[datetime] = None
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="insight")
+
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'refreshed': 0, 'errors': 0, 'runs': 0}
+
+        if store_path and os.path.exists(store_path):
+            self._load()
+
+        # 资料或偏好更新后在下一轮刷新 (数据库支持更新监听时)
+        update_listeners = getattr(analytics.db, 'update_listeners', None)
+        if update_listeners is not None:
+            update_listeners.append(self.observe_update)
+
+    # 读取
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """返回带版本的洞察文档 {'version', 'computed_at', 'insights'}；未命中或过期时同步计算"""
+        document = self._documents.get(user_id)
+        if document is not None and not self._expired(document, datetime.now()):
+            self._count('hits')
+            return document
+
+        if document is None:
+            self._count('misses')
+            return self._compute(user_id)
+
+        # 过期文档重新计算失败时仍返回旧结果
+        self._count('expired')
+        return self._compute(user_id) or document
+
+    def get_insights(self, user_id: str) -> Dict[str, Any]:
+        """与 generate_personalized_insights 相同的返回结构"""
+        document = self.get(user_id)
+        return document['insights'] if document else {'error': '用户不存在'}
+
+    # 刷新
+
+    def mark_active(self, user_id: str):
+        """标记用户需要在下一轮刷新 (如资料或偏好更新后)"""
+        with self._lock:
+            self._pending.add(user_id)
+
+    def observe_update(self, table: str, user_id: str):
+        """数据库更新监听接口：资料或偏好变化后标记用户"""
+        self.mark_active(user_id)
+
+    def _expired(self, document: Dict[str, Any], now: datetime) -> bool:
+        if self.max_age is None:
+            return False
+        return now - datetime.fromisoformat(document['computed_at']) > timedelta(seconds=self.max_age)
+
+    def expired_users(self) -> List[str]:
+        """文档已超过 max_age 的用户"""
+        now = datetime.now()
+        with self._lock:
+            documents = list(self._documents.items())
+        return [user_id for user_id, document in documents if self._expired(document, now)]
+
+    def invalidate(self, user_id: Optional[str] = None):
+        """丢弃缓存的文档，None表示全部"""
+        with self._lock:
+            if user_id is None:
+                self._documents.clear()
+            else:
+                self._documents.pop(user_id, None)
+
+    def _compute(self, user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            insights = self.analytics.generate_personalized_insights(user_id)
+        except Exception as e:
+            self._count('errors')
+            print(f"计算用户 {user_id} 的洞察失败: {e}", file=sys.stderr)
+            return None
+        if 'error' in insights:
+            return None
+
+        with self._lock:
+            self._version += 1
+            document = {
+                'version': self._version,
+                'computed_at': datetime.now().isoformat(),
+                'insights': insights
+            }
+            self._documents[user_id] = document
+        return document
+
+    def active_users(self, since: Optional[datetime]) -> List[str]:
+        """since 以来有行为的用户 (since为None时为所有有行为的用户)"""
+        return list({action['user_id'] for action in scan_actions(self.analytics.db, since=since, columns=('user_id',))})
+
+    def _overlap(self) -> timedelta:
+        """扫描窗口的重叠时长：异步行为日志约在一个 flush_interval 内写入，取两倍留出余量"""
+        overlap = self.scan_overlap
+        logger = getattr(self.analytics.db, 'action_logger', None)
+        if logger is not None:
+            overlap = max(overlap, 2 * logger.flush_interval)
+        return timedelta(seconds=overlap)
+
+    def _count(self, name: str, amount: int = 1):
+        """统计计数 (请求线程、线程池和后台线程都会更新)"""
+        with self._lock:
+            self.stats[name] += amount
+
+    def run_once(self) -> int:
+        """刷新一轮，返回重新计算的用户数"""
+        started = datetime.now()
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        since = self._last_run - self._overlap() if self._last_run is not None else None
+        users = set(self.active_users(since)) | pending | set(self.expired_users())
+
+        refreshed = sum(1 for document in self._pool.map(self._compute, users) if document is not None)
+        self._last_run = started
+        self._count('refreshed', refreshed)
+        self._count('runs')
+        self.save()
+        return refreshed
+
+    def start(self):
+        """启动后台刷新线程 (立即执行第一轮)"""
+        if self._worker is not None:
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._refresh_loop, name="insight-scheduler", daemon=True)
+        self._worker.start()
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                self._count('errors')
+                print(f"洞察刷新失败: {e}", file=sys.stderr)
+            if self._stop.wait(self.interval):
+                return
+
+    def close(self):
+        """停止后台线程并保存结果"""
+        if self._worker is not None:
+            self._stop.set()
+            self._worker.join()
+            self._worker = None
+        self._pool.shutdown(wait=True)
+        self.save()
+
+    # 持久化
+
+    def _load(self):
+        with open(self.store_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self._documents = data.get('documents', {})
+        self._version = data.get('version', 0)
+        last_run = data.get('last_run')
+        self._last_run = datetime.fromisoformat(last_run) if last_run else None
+
+    def save(self):
+        """原子地写出预计算结果"""
+        if not self.store_path:
+            return
+        with self._lock:
+            data = {
+                'version': self._version,
+                'last_run': self._last_run.isoformat() if self._last_run else None,
+                'documents': dict(self._documents)
+            }
+
+        directory = os.path.dirname(self.store_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.store_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self.store_path)
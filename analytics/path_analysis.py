@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+用户路径分析
+Path Analysis - action transition matrices, top paths and next-action prediction
+
+按用户把时间排序的行为流切分为路径 (相邻行为间隔超过 session_gap 即视为新路径)，
+一次遍历同时统计：一阶转移 (上一个行为 -> 下一个行为)、可选的二阶转移
+(前两个行为 -> 下一个行为)、以 <end> 结尾的流失次数，以及完整路径的频次
+(Space-Saving，内存有界)。所有统计都按用户分群各保存一份，另有 'all' 汇总。
+
+每晚用 build() 在全量行为上重建；白天通过 observe_batch (行为日志监听)
+在每个用户未结束的路径上增量更新，predict_next 只查一次计数表，
+可以直接用于"和你相似的用户接下来会做什么"。
+"""
+
+import os
+import sys
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analytics.search_trends import SpaceSaving
+from database.action_codec import ACTION_TYPES, code_of, to_timestamp
+from database.action_scan import scan_actions
+from database.string_dictionary import USER_IDS
+
+START = -1    # 路径开始
+END = -2      # 路径结束 (流失)
+ALL_USERS = 'all'
+
+def state_label(code: int) -> str:
+    if code == START:
+        return '<start>'
+    if code == END:
+        return '<end>'
+    return ACTION_TYPES[code].value
+
+class _OpenPath:
+    """用户当前未结束的路径"""
+
+    __slots__ = ('prev2', 'prev1', 'last_ts', 'steps')
+
+    def __init__(self):
+        self.prev2 = START
+        self.prev1 = START
+        self.last_ts = 0
+        self.steps: List[int] = []
+
+class PathAnalyzer:
+    """行为路径分析引擎"""
+
+    def __init__(self, session_gap: timedelta = timedelta(minutes=30), second_order: bool = True,
+                 max_path_length: int = 6, path_capacity: int = 1000, min_support: int = 20):
+        """
+        Args:
+            session_gap: 相邻行为间隔超过该值时切分为新路径
+            second_order: 是否统计二阶转移
+            max_path_length: 路径频次统计只取路径的前几步
+            path_capacity: 每个分群最多跟踪的不同路径数
+            min_support: 预测时上下文出现次数低于该值则退回到低阶/全体用户的统计
+        """
+        self.session_gap = session_gap // timedelta(microseconds=1)
+        self.second_order = second_order
+        self.max_path_length = max_path_length
+        self.path_capacity = path_capacity
+        self.min_support = min_support
+
+        self._segment_of: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # 分群 -> 上下文 -> Counter(下一个状态)；一阶上下文为 (prev1,)，二阶为 (prev2, prev1)
+        self._first: Dict[str, Dict[Tuple[int, ...], Counter]] = defaultdict(lambda: defaultdict(Counter))
+        self._second: Dict[str, Dict[Tuple[int, ...], Counter]] = defaultdict(lambda: defaultdict(Counter))
+        self._paths: Dict[str, SpaceSaving] = defaultdict(lambda: SpaceSaving(self.path_capacity))
+        self._open: Dict[int, _OpenPath] = {}
+        self.total_paths = 0
+
+    def set_segments(self, segments: Dict[str, Iterable[str]]):
+        """设置用户分群 {分群名: [user_id]}，如 analyze_user_segments()['segments']；只影响之后的统计"""
+        with self._lock:
+            self._segment_of = {
+                USER_IDS.encode(user_id): name for name, user_ids in segments.items() for user_id in user_ids
+            }
+
+    def _segments(self, user_code: int) -> Tuple[str, ...]:
+        segment = self._segment_of.get(user_code)
+        return (ALL_USERS, segment) if segment else (ALL_USERS,)
+
+    # 统计
+
+    def _count(self, user_code: int, path: _OpenPath, code: int):
+        for segment in self._segments(user_code):
+            self._first[segment][(path.prev1,)][code] += 1
+            if self.second_order:
+                self._second[segment][(path.prev2, path.prev1)][code] += 1
+
+    def _close(self, user_code: int, path: _OpenPath):
+        self._count(user_code, path, END)
+        key = ' > '.join(state_label(code) for code in path.steps)
+        for segment in self._segments(user_code):
+            self._paths[segment].update(key)
+        self.total_paths += 1
+
+    def _advance(self, user_code: int, code: int, ts: int):
+        """在用户的当前路径上追加一个行为 (时间早于上一个行为的迟到记录按顺序追加)"""
+        path = self._open.get(user_code)
+        if path is not None and ts - path.last_ts > self.session_gap:
+            self._close(user_code, path)
+            path = None
+        if path is None:
+            path = self._open[user_code] = _OpenPath()
+
+        self._count(user_code, path, code)
+        path.prev2, path.prev1 = path.prev1, code
+        path.last_ts = max(path.last_ts, ts)
+        if len(path.steps) < self.max_path_length:
+            path.steps.append(code)
+
+    def close_idle(self, now: Optional[datetime] = None) -> int:
+        """结束空闲超过 session_gap 的路径，返回结束的路径数"""
+        now_ts = to_timestamp(now or datetime.now())
+        with self._lock:
+            idle = [(user_code, path) for user_code, path in self._open.items()
+                    if now_ts - path.last_ts > self.session_gap]
+            for user_code, path in idle:
+                self._close(user_code, path)
+                del self._open[user_code]
+        return len(idle)
+
+    def build(self, db: Any, since: Optional[datetime] = None, now: Optional[datetime] = None) -> int:
+        """全量重建 (每晚运行)：一次扫描，按 (用户, 时间) 排序后顺序统计，返回处理的行为数"""
+        user_codes, codes, timestamps = [], [], []
+        for action in scan_actions(db, since=since, columns=('user_code', 'action_type', 'timestamp')):
+            user_codes.append(action['user_code'])
+            codes.append(code_of(action['action_type']))
+            timestamps.append(to_timestamp(action['timestamp']))
+
+        user_codes = np.array(user_codes, np.int64)
+        timestamps = np.array(timestamps, np.int64)
+        order = np.lexsort((timestamps, user_codes))
+
+        with self._lock:
+            self._reset()
+            advance = self._advance
+            for i in order.tolist():
+                advance(user_codes[i].item(), codes[i], timestamps[i].item())
+        self.close_idle(now)
+        return len(order)
+
+    def record_action(self, action: Any):
+        """增量记录一条行为 (UserAction、ActionRecord 或 user_actions.json 中的字典)"""
+        if isinstance(action, dict):
+            user_id, action_type, timestamp = action['user_id'], action['action_type'], action['timestamp']
+        else:
+            user_id, action_type, timestamp = action.user_id, action.action_type, action.timestamp
+        with self._lock:
+            self._advance(USER_IDS.encode(user_id), code_of(action_type), to_timestamp(timestamp))
+
+    def observe_batch(self, records: List[Dict[str, Any]]):
+        """行为日志的监听接口：每批写入成功后调用"""
+        for record in records:
+            self.record_action(record)
+
+    # 查询
+
+    def predict_next(self, user_id: Optional[str] = None, history: Optional[Sequence[Any]] = None,
+                     segment: Optional[str] = None, k: int = 3) -> List[Tuple[str, float]]:
+        """
+        预测下一个行为
+
+        Args:
+            user_id: 用户ID，未给出 history 时使用该用户当前路径的最近两个行为
+            history: 最近的行为 (ActionType或其字符串值)，按时间顺序
+            segment: 使用哪个分群的统计，默认为用户所在的分群
+            k: 返回前几个
+
+        Returns:
+            [(行为类型, 概率)]，不含路径结束
+        """
+        user_code = USER_IDS.get(user_id) if user_id is not None else None
+        with self._lock:
+            if history is not None:
+                recent = [code_of(a) for a in history][-2:]
+                prev2, prev1 = ([START, START] + recent)[-2:]
+            elif user_code is not None and user_code in self._open:
+                path = self._open[user_code]
+                prev2, prev1 = path.prev2, path.prev1
+            else:
+                prev2, prev1 = START, START
+
+            if segment is None:
+                segment = self._segment_of.get(user_code, ALL_USERS) if user_code is not None else ALL_USERS
+            candidates = []
+            for name in dict.fromkeys((segment, ALL_USERS)):
+                if self.second_order:
+                    candidates.append(self._second.get(name, {}).get((prev2, prev1)))
+                candidates.append(self._first.get(name, {}).get((prev1,)))
+
+            # 只看后续行为 (不含 <end>)，支持度不足时依次退回到低阶、全体用户的统计
+            actions, fallback = [], []
+            for counts in candidates:
+                if not counts:
+                    continue
+                actions = [(code, n) for code, n in counts.items() if code != END]
+                fallback = fallback or actions
+                if sum(n for _, n in actions) >= self.min_support:
+                    break
+            else:
+                actions = fallback
+            if not actions:
+                return []
+
+        total = sum(n for _, n in actions)
+        actions.sort(key=lambda item: item[1], reverse=True)
+        return [(state_label(code), n / total) for code, n in actions[:k]]
+
+    def top_paths(self, segment: str = ALL_USERS, k: int = 10) -> List[Tuple[str, int]]:
+        """最常见的路径 (只统计已结束的路径的前 max_path_length 步)"""
+        with self._lock:
+            counter = self._paths.get(segment)
+            return [(path, int(n)) for path, n in counter.top(k)] if counter else []
+
+    def drop_off_points(self, segment: str = ALL_USERS, min_support: Optional[int] = None) -> List[Dict[str, Any]]:
+        """每个行为之后结束路径的比例，按流失率从高到低"""
+        min_support = self.min_support if min_support is None else min_support
+        with self._lock:
+            transitions = self._first.get(segment, {})
+            points = []
+            for (state,), counts in transitions.items():
+                total = sum(counts.values())
+                if state == START or total < min_support:
+                    continue
+                points.append({
+                    'action_type': state_label(state),
+                    'occurrences': total,
+                    'drop_off_rate': round(counts.get(END, 0) / total, 4)
+                })
+        points.sort(key=lambda p: p['drop_off_rate'], reverse=True)
+        return points
+
+    def transition_matrix(self, segment: str = ALL_USERS) -> Tuple[List[str], List[str], np.ndarray]:
+        """一阶转移概率矩阵，返回 (行标签, 列标签, 矩阵)：行为 <start> 和各行为，列为各行为和 <end>"""
+        rows = [START] + list(range(len(ACTION_TYPES)))
+        columns = list(range(len(ACTION_TYPES))) + [END]
+        matrix = np.zeros((len(rows), len(columns)))
+        with self._lock:
+            transitions = self._first.get(segment, {})
+            for i, state in enumerate(rows):
+                counts = transitions.get((state,))
+                if counts:
+                    total = sum(counts.values())
+                    for j, code in enumerate(columns):
+                        matrix[i, j] = counts.get(code, 0) / total
+        return [state_label(code) for code in rows], [state_label(code) for code in columns], matrix
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'total_paths': self.total_paths,
+                'open_paths': len(self._open),
+                'segments': sorted(self._first),
+            }
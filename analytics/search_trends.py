@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+搜索趋势分析
+Search Trends - streaming top-k heavy hitters over search actions
+
+每条搜索行为到达时更新 Space-Saving 计数器：全局保留 capacity 个关键词，
+每个用户保留 user_capacity 个，内存有界且与历史长度无关。计数带时间衰减
+(前向衰减：新记录按到达时间放大权重，查询时统一折算)，热门搜索和用户常搜
+关键词的查询只在有界的计数器上进行，不需要扫描历史行为。
+"""
+
+import heapq
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.action_scan import scan_actions
+from database.string_dictionary import USER_IDS
+from user_system.models import ActionType
+
+# 前向衰减的权重指数超过该值时重新归一化，避免浮点溢出
+_RENORMALIZE_EXPONENT = 64.0
+
+def extract_keywords(details: Optional[Dict[str, Any]]) -> List[str]:
+    """从搜索行为的详情中取出规范化的关键词 (keywords 列表或 query 字符串)"""
+    if not details:
+        return []
+    keywords = details.get('keywords')
+    if keywords is None:
+        query = details.get('query')
+        keywords = query.split() if isinstance(query, str) else []
+    elif isinstance(keywords, str):
+        keywords = [keywords]
+    return [k.strip().lower() for k in keywords if isinstance(k, str) and k.strip()]
+
+class SpaceSaving:
+    """Space-Saving 频繁项计数器
+
+    最多监控 capacity 个键；新键到达且计数器已满时替换计数最小的键，
+    新键继承其计数作为误差上界。任何真实频率超过 总量/capacity 的键都会被保留。
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, float] = {}
+        self.errors: Dict[str, float] = {}
+        # (计数, 键) 最小堆；计数增加时不更新旧条目，出堆时再核对
+        self._heap: List[Tuple[float, str]] = []
+
+    def update(self, key: str, weight: float = 1.0):
+        counts = self.counts
+        if key in counts:
+            counts[key] += weight
+        elif len(counts) < self.capacity:
+            counts[key] = weight
+            self.errors[key] = 0.0
+        else:
+            floor, victim = self._pop_min()
+            del counts[victim]
+            del self.errors[victim]
+            counts[key] = floor + weight
+            self.errors[key] = floor
+        heapq.heappush(self._heap, (counts[key], key))
+
+        if len(self._heap) > 4 * self.capacity + 64:
+            self._rebuild_heap()
+
+    def _pop_min(self) -> Tuple[float, str]:
+        heap = self._heap
+        while True:
+            count, key = heapq.heappop(heap)
+            if self.counts.get(key) == count:
+                return count, key
+
+    def _rebuild_heap(self):
+        self._heap = [(count, key) for key, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def scale(self, factor: float):
+        """所有计数乘以 factor (用于衰减归一化)"""
+        for key in self.counts:
+            self.counts[key] *= factor
+            self.errors[key] *= factor
+        self._rebuild_heap()
+
+    def top(self, k: int) -> List[Tuple[str, float]]:
+        return heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])
+
+    def estimate(self, key: str) -> float:
+        """计数估计；未被监控的键返回可能的最大值 (当前最小计数)"""
+        if key in self.counts:
+            return self.counts[key]
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0.0
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+class SearchTrends:
+    """全局和按用户的搜索关键词 top-k"""
+
+    def __init__(self, capacity: int = 1000, user_capacity: int = 20,
+                 half_life: Optional[float] = 7 * 24 * 3600):
+        """
+        Args:
+            capacity: 全局监控的关键词数
+            user_capacity: 每个用户监控的关键词数
+            half_life: 衰减半衰期 (秒)，None表示不衰减
+        """
+        self.capacity = capacity
+        self.user_capacity = user_capacity
+        self.half_life = half_life
+
+        self._global = SpaceSaving(capacity)
+        self._users: Dict[int, SpaceSaving] = {}
+        self._landmark: Optional[float] = None
+        self._lock = threading.Lock()
+        self.total_searches = 0
+
+    def _weight(self, ts: float) -> float:
+        """前向衰减权重 2^((t - landmark) / half_life)"""
+        if self.half_life is None:
+            return 1.0
+        if self._landmark is None:
+            self._landmark = ts
+        exponent = (ts - self._landmark) / self.half_life
+        if exponent > _RENORMALIZE_EXPONENT:
+            self._renormalize(ts)
+            exponent = 0.0
+        return 2.0 ** exponent
+
+    def _renormalize(self, ts: float):
+        factor = 2.0 ** (-(ts - self._landmark) / self.half_life)
+        self._global.scale(factor)
+        for counter in self._users.values():
+            counter.scale(factor)
+        self._landmark = ts
+
+    def _decay(self, now: Optional[float]) -> float:
+        """把存储的计数折算到 now 时刻的系数"""
+        if self.half_life is None or self._landmark is None:
+            return 1.0
+        now = time.time() if now is None else now
+        return 2.0 ** (-(now - self._landmark) / self.half_life)
+
+    def record(self, user_id: str, keywords: Iterable[str], timestamp: Optional[datetime] = None):
+        """记录一次搜索"""
+        keywords = [k.strip().lower() for k in keywords if k and k.strip()]
+        if not keywords:
+            return
+        ts = (timestamp or datetime.now()).timestamp()
+        user_code = USER_IDS.encode(user_id)
+        with self._lock:
+            weight = self._weight(ts)
+            counter = self._users.get(user_code)
+            if counter is None:
+                counter = self._users[user_code] = SpaceSaving(self.user_capacity)
+            for keyword in keywords:
+                self._global.update(keyword, weight)
+                counter.update(keyword, weight)
+            self.total_searches += 1
+
+    def record_action(self, action: Any):
+        """记录一条行为 (UserAction、ActionRecord 或 user_actions.json 中的字典)，非搜索行为忽略"""
+        if isinstance(action, dict):
+            action_type, user_id = action.get('action_type'), action.get('user_id')
+            details, timestamp = action.get('details'), action.get('timestamp')
+        else:
+            action_type, user_id = action.action_type, action.user_id
+            details, timestamp = action.details, action.timestamp
+
+        if action_type not in (ActionType.SEARCH, ActionType.SEARCH.value):
+            return
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        self.record(user_id, extract_keywords(details), timestamp)
+
+    def observe_batch(self, records: List[Dict[str, Any]]):
+        """行为日志的监听接口：每批写入成功后调用"""
+        for record in records:
+            self.record_action(record)
+
+    def load_history(self, db: Any, since: Optional[datetime] = None) -> int:
+        """启动时从历史搜索行为构建计数器 (只扫描一次)，返回读取的搜索次数"""
+        count = 0
+        for action in sorted(
+            scan_actions(db, since=since, types=[ActionType.SEARCH], columns=('user_id', 'timestamp', 'details')),
+            key=lambda a: a['timestamp']
+        ):
+            self.record(action['user_id'], extract_keywords(action['details']), action['timestamp'])
+            count += 1
+        return count
+
+    def trending(self, k: int = 10, now: Optional[float] = None) -> List[Tuple[str, float]]:
+        """全局热门搜索 [(关键词, 衰减后的计数)]"""
+        with self._lock:
+            factor = self._decay(now)
+            return [(keyword, count * factor) for keyword, count in self._global.top(k)]
+
+    def user_top(self, user_id: str, k: int = 5, now: Optional[float] = None) -> List[Tuple[str, float]]:
+        """用户最常搜索的关键词"""
+        user_code = USER_IDS.get(user_id)
+        with self._lock:
+            counter = self._users.get(user_code) if user_code is not None else None
+            if counter is None:
+                return []
+            factor = self._decay(now)
+            return [(keyword, count * factor) for keyword, count in counter.top(k)]
+
+    def popular_keywords(self, user_id: str, k: int = 10) -> Dict[str, float]:
+        """与 analyze_user_behavior 中 search_patterns.popular_keywords 相同形式的 {关键词: 计数}"""
+        return {keyword: round(count, 2) for keyword, count in self.user_top(user_id, k)}
+
+    def estimate(self, keyword: str, now: Optional[float] = None) -> float:
+        """单个关键词的全局计数估计 (上界)"""
+        with self._lock:
+            return self._global.estimate(keyword.strip().lower()) * self._decay(now)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'total_searches': self.total_searches,
+                'tracked_keywords': len(self._global),
+                'tracked_users': len(self._users),
+                'half_life': self.half_life
+            }
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+会话重建
+Sessionization - reconstruct sessions from the action stream
+
+很多行为 (如注册) 没有 session_id，user_sessions.json 中的会话也不反映实际活动。
+这里按用户把时间排序的行为流切分为会话：相邻行为间隔超过 gap，或两条行为
+带有不同的 session_id 时开始新会话。每个会话记录起止时间、深度 (行为数)、
+入口和出口行为以及原始 session_id，作为派生表按列保存 (.npz)；
+会话时长、深度、跳出率等参与度指标直接在派生表上向量化计算，
+不再每次查询时从行为记录重新推导。
+
+build() 全量重建；update() 只读取上次处理位置之后的行为，接在各用户
+未结束的会话后面继续切分。早于处理位置的迟到行为由下一次 build() 纳入。
+"""
+
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.action_codec import ACTION_TYPES, code_of, to_datetime, to_timestamp
+from database.action_scan import scan_actions
+from database.string_dictionary import USER_IDS
+
+_SECOND = 1000000
+
+class SessionTable:
+    """由行为流重建的会话派生表"""
+
+    def __init__(self, gap: timedelta = timedelta(minutes=30),
+                 path: Optional[str] = "data/derived_sessions.npz"):
+        """
+        Args:
+            gap: 相邻行为间隔超过该值时切分会话
+            path: 派生表文件，None表示只保存在内存中
+        """
+        self.gap = gap // timedelta(microseconds=1)
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _reset(self):
+        self._user = []         # 共享字典中的用户编号
+        self._session_id = []   # 会话内第一个非空的原始 session_id
+        self._start = []        # 微秒
+        self._end = []
+        self._depth = []
+        self._entry = []        # 入口行为编码
+        self._exit = []         # 出口行为编码
+        self._closed = []
+        self._open: Dict[int, int] = {}   # 用户编号 -> 未结束会话的行号
+        self.watermark: Optional[int] = None
+        self._arrays: Optional[Dict[str, np.ndarray]] = None   # 查询用的列数组，表变化时重建
+
+    def __len__(self) -> int:
+        return len(self._start)
+
+    # 构建
+
+    def _add(self, user_code: int, code: int, ts: int, session_id: Optional[str]):
+        row = self._open.get(user_code)
+        if row is not None:
+            known = self._session_id[row]
+            if ts - self._end[row] > self.gap or (session_id and known and session_id != known):
+                self._closed[row] = True
+                row = None
+
+        if row is None:
+            self._open[user_code] = len(self._start)
+            self._user.append(user_code)
+            self._session_id.append(session_id)
+            self._start.append(ts)
+            self._end.append(ts)
+            self._depth.append(1)
+            self._entry.append(code)
+            self._exit.append(code)
+            self._closed.append(False)
+            return
+
+        self._depth[row] += 1
+        if ts >= self._end[row]:
+            self._end[row] = ts
+            self._exit[row] = code
+        if self._session_id[row] is None:
+            self._session_id[row] = session_id
+
+    def _consume(self, db: Any, since: Optional[datetime]) -> int:
+        """读取行为并按 (用户, 时间) 顺序切分，返回处理的行为数"""
+        user_codes, codes, timestamps, session_ids = [], [], [], []
+        for action in scan_actions(db, since=since, columns=('user_code', 'action_type', 'timestamp', 'session_id')):
+            user_codes.append(action['user_code'])
+            codes.append(code_of(action['action_type']))
+            timestamps.append(to_timestamp(action['timestamp']))
+            session_ids.append(action['session_id'])
+        if not timestamps:
+            return 0
+
+        ts_array = np.array(timestamps, np.int64)
+        order = np.lexsort((ts_array, np.array(user_codes, np.int64)))
+        with self._lock:
+            add = self._add
+            for i in order.tolist():
+                add(user_codes[i], int(codes[i]), timestamps[i], session_ids[i])
+            self.watermark = max(self.watermark or 0, int(ts_array.max()))
+            self._arrays = None
+        return len(order)
+
+    def build(self, db: Any, since: Optional[datetime] = None, now: Optional[datetime] = None) -> int:
+        """全量重建派生表"""
+        with self._lock:
+            self._reset()
+        count = self._consume(db, since)
+        self.close_idle(now)
+        self.save()
+        return count
+
+    def update(self, db: Any, now: Optional[datetime] = None) -> int:
+        """增量处理上次处理位置之后的行为"""
+        if self.watermark is None:
+            return self.build(db, now=now)
+        count = self._consume(db, to_datetime(self.watermark + 1))
+        self.close_idle(now)
+        self.save()
+        return count
+
+    def close_idle(self, now: Optional[datetime] = None) -> int:
+        """结束空闲超过 gap 的会话"""
+        now_ts = to_timestamp(now or datetime.now())
+        with self._lock:
+            idle = [user_code for user_code, row in self._open.items() if now_ts - self._end[row] > self.gap]
+            for user_code in idle:
+                self._closed[self._open.pop(user_code)] = True
+            if idle:
+                self._arrays = None
+        return len(idle)
+
+    # 查询
+
+    def _columns(self) -> Dict[str, np.ndarray]:
+        with self._lock:
+            if self._arrays is None:
+                self._arrays = {
+                    'user': np.array(self._user, np.int64),
+                    'start': np.array(self._start, np.int64),
+                    'end': np.array(self._end, np.int64),
+                    'depth': np.array(self._depth, np.int64),
+                    'entry': np.array(self._entry, np.int64),
+                    'exit': np.array(self._exit, np.int64),
+                    'closed': np.array(self._closed, bool),
+                }
+            return self._arrays
+
+    def _select(self, columns: Dict[str, np.ndarray], since: Optional[datetime],
+                until: Optional[datetime], user_id: Optional[str]) -> np.ndarray:
+        mask = np.ones(len(columns['start']), bool)
+        if since is not None:
+            mask &= columns['start'] >= to_timestamp(since)
+        if until is not None:
+            mask &= columns['start'] < to_timestamp(until)
+        if user_id is not None:
+            user_code = USER_IDS.get(user_id)
+            mask &= columns['user'] == (-1 if user_code is None else user_code)
+        return mask
+
+    def sessions(self, user_id: Optional[str] = None, since: Optional[datetime] = None,
+                 until: Optional[datetime] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按开始时间倒序返回会话"""
+        columns = self._columns()
+        rows = np.flatnonzero(self._select(columns, since, until, user_id))
+        rows = rows[np.argsort(-columns['start'][rows], kind='stable')][:limit]
+        with self._lock:
+            session_ids = [self._session_id[row] for row in rows.tolist()]
+        return [
+            {
+                'user_id': USER_IDS.decode(int(columns['user'][row])),
+                'session_id': session_id,
+                'start': to_datetime(int(columns['start'][row])).isoformat(),
+                'end': to_datetime(int(columns['end'][row])).isoformat(),
+                'duration_seconds': (int(columns['end'][row]) - int(columns['start'][row])) / _SECOND,
+                'depth': int(columns['depth'][row]),
+                'entry_action': ACTION_TYPES[columns['entry'][row]].value,
+                'exit_action': ACTION_TYPES[columns['exit'][row]].value,
+                'bounce': bool(columns['depth'][row] == 1),
+                'closed': bool(columns['closed'][row])
+            }
+            for row, session_id in zip(rows.tolist(), session_ids)
+        ]
+
+    def engagement(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   user_id: Optional[str] = None) -> Dict[str, Any]:
+        """参与度指标：会话数、时长、深度、跳出率、人均会话数、常见入口/出口行为"""
+        columns = self._columns()
+        mask = self._select(columns, since, until, user_id)
+        if not mask.any():
+            return {'sessions': 0, 'users': 0}
+
+        duration = (columns['end'][mask] - columns['start'][mask]) / _SECOND
+        depth = columns['depth'][mask]
+        users = len(np.unique(columns['user'][mask]))
+        entry_counts = np.bincount(columns['entry'][mask], minlength=len(ACTION_TYPES))
+        exit_counts = np.bincount(columns['exit'][mask], minlength=len(ACTION_TYPES))
+        # 跳出会话没有后续行为，出口统计只看多于一个行为的会话
+        exit_counts_deep = np.bincount(columns['exit'][mask][depth > 1], minlength=len(ACTION_TYPES))
+
+        def top(counts: np.ndarray, k: int = 3) -> List[Dict[str, Any]]:
+            return [{'action_type': ACTION_TYPES[code].value, 'sessions': int(counts[code])}
+                    for code in np.argsort(-counts, kind='stable')[:k] if counts[code]]
+
+        return {
+            'sessions': int(mask.sum()),
+            'users': users,
+            'sessions_per_user': round(float(mask.sum()) / users, 2),
+            'avg_duration_seconds': round(float(duration.mean()), 2),
+            'median_duration_seconds': round(float(np.median(duration)), 2),
+            'avg_depth': round(float(depth.mean()), 2),
+            'bounce_rate': round(float((depth == 1).mean()), 4),
+            'top_entry_actions': top(entry_counts),
+            'top_exit_actions': top(exit_counts_deep if exit_counts_deep.any() else exit_counts),
+        }
+
+    # 持久化
+
+    def save(self):
+        """原子地写出派生表"""
+        if not self.path:
+            return
+        columns = self._columns()
+        with self._lock:
+            user_ids = np.array(USER_IDS.decode_many(self._user), dtype=str)
+            session_ids = np.array(['' if s is None else s for s in self._session_id], dtype=str)
+            watermark = -1 if self.watermark is None else self.watermark
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp.npz'
+        np.savez_compressed(tmp_path, user_ids=user_ids, session_ids=session_ids, start=columns['start'],
+                            end=columns['end'], depth=columns['depth'], entry=columns['entry'],
+                            exit=columns['exit'], closed=columns['closed'], watermark=np.array(watermark))
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        with np.load(self.path) as data:
+            self._user = USER_IDS.encode_many(data['user_ids'].tolist())
+            self._session_id = [s or None for s in data['session_ids'].tolist()]
+            self._start = data['start'].tolist()
+            self._end = data['end'].tolist()
+            self._depth = data['depth'].tolist()
+            self._entry = data['entry'].tolist()
+            self._exit = data['exit'].tolist()
+            self._closed = data['closed'].tolist()
+            watermark = int(data['watermark'])
+        self.watermark = None if watermark < 0 else watermark
+        self._open = {user_code: row for row, (user_code, closed) in enumerate(zip(self._user, self._closed))
+                      if not closed}
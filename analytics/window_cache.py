@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+分析时间窗口缓存
+Window Cache - bucket-aligned, reusable aggregates for analytics queries
+
+把行为按固定宽度的时间桶 (小时或天) 聚合为每个用户的各类行为计数和
+首次/最后活动时间。已经结束的桶只计算一次并一直复用，只有当前未结束的桶
+每次重新计算；任意 days=N 的查询由覆盖该窗口的桶合并得到，窗口起点
+向下对齐到桶边界。
+
+迟到的行为：桶结束后再等待 grace 才视为关闭，在此之前按未结束的桶处理；
+超过 grace 才写入的行为通过 observe_batch (行为日志监听) 或 invalidate(since)
+使对应的桶失效，下次查询时重新计算。
+"""
+
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.action_codec import ACTION_TYPES, code_of, to_datetime, to_timestamp
+from database.action_scan import scan_actions
+from database.string_dictionary import USER_IDS
+
+BUCKET_WIDTHS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+_MICROSECOND = timedelta(microseconds=1)
+_TS_MAX = np.iinfo(np.int64).max
+_TS_MIN = np.iinfo(np.int64).min
+
+class ActionWindow:
+    """一段时间内按用户聚合的行为：每个用户各类行为的次数和首次/最后活动时间"""
+
+    __slots__ = ('user_codes', 'counts', 'first_ts', 'last_ts')
+
+    def __init__(self, user_codes: np.ndarray, counts: np.ndarray, first_ts: np.ndarray, last_ts: np.ndarray):
+        self.user_codes = user_codes    # (n,) 共享字典中的用户编号，升序
+        self.counts = counts            # (n, 行为类型数)
+        self.first_ts = first_ts        # (n,) 微秒
+        self.last_ts = last_ts
+
+    @classmethod
+    def empty(cls) -> 'ActionWindow':
+        return cls(np.zeros(0, np.int64), np.zeros((0, len(ACTION_TYPES)), np.int64),
+                   np.zeros(0, np.int64), np.zeros(0, np.int64))
+
+    @classmethod
+    def from_rows(cls, user_codes: np.ndarray, codes: np.ndarray, timestamps: np.ndarray) -> 'ActionWindow':
+        if len(user_codes) == 0:
+            return cls.empty()
+        users, inverse = np.unique(user_codes, return_inverse=True)
+        counts = np.zeros((len(users), len(ACTION_TYPES)), np.int64)
+        np.add.at(counts, (inverse, codes), 1)
+        first_ts = np.full(len(users), _TS_MAX, np.int64)
+        np.minimum.at(first_ts, inverse, timestamps)
+        last_ts = np.full(len(users), _TS_MIN, np.int64)
+        np.maximum.at(last_ts, inverse, timestamps)
+        return cls(users, counts, first_ts, last_ts)
+
+    @classmethod
+    def merge(cls, windows: List['ActionWindow']) -> 'ActionWindow':
+        windows = [w for w in windows if len(w)]
+        if not windows:
+            return cls.empty()
+        if len(windows) == 1:
+            return windows[0]
+        users, inverse = np.unique(np.concatenate([w.user_codes for w in windows]), return_inverse=True)
+        counts = np.zeros((len(users), len(ACTION_TYPES)), np.int64)
+        np.add.at(counts, inverse, np.concatenate([w.counts for w in windows]))
+        first_ts = np.full(len(users), _TS_MAX, np.int64)
+        np.minimum.at(first_ts, inverse, np.concatenate([w.first_ts for w in windows]))
+        last_ts = np.full(len(users), _TS_MIN, np.int64)
+        np.maximum.at(last_ts, inverse, np.concatenate([w.last_ts for w in windows]))
+        return cls(users, counts, first_ts, last_ts)
+
+    def __len__(self) -> int:
+        return len(self.user_codes)
+
+    @property
+    def total_actions(self) -> int:
+        return int(self.counts.sum())
+
+    def user_ids(self) -> List[str]:
+        return USER_IDS.decode_many(self.user_codes.tolist())
+
+    def first_activity(self, row: int) -> datetime:
+        return to_datetime(int(self.first_ts[row]))
+
+    def last_activity(self, row: int) -> datetime:
+        return to_datetime(int(self.last_ts[row]))
+
+class WindowCache:
+    """按时间桶缓存的行为聚合"""
+
+    def __init__(self, db: Any, bucket: str = 'hour', grace: timedelta = timedelta(minutes=5),
+                 max_buckets: int = 24 * 400):
+        """
+        Args:
+            db: 存储层对象 (通过 scan_actions 读取)
+            bucket: 桶宽度，'hour' 或 'day'
+            grace: 桶结束后再等待多久视为关闭
+            max_buckets: 最多缓存的桶数，超出时丢弃最早的桶
+        """
+        if bucket not in BUCKET_WIDTHS:
+            raise ValueError(f"未知的桶宽度: {bucket}")
+        self.db = db
+        self.bucket = bucket
+        self.width = BUCKET_WIDTHS[bucket] // _MICROSECOND
+        self.grace = grace // _MICROSECOND
+        self.max_buckets = max_buckets
+
+        # 桶编号 (时间戳 // 桶宽度) -> 聚合结果
+        self._buckets: Dict[int, ActionWindow] = {}
+        self._lock = threading.Lock()
+        # 扫描在锁外进行：填充期间失效的桶记下失效时的代数，填充完成后不再缓存这些桶
+        self._generation = 0
+        self._bucket_generations: Dict[int, int] = {}       # 桶编号 -> 最近一次失效的代数
+        self._range_generations: List[Tuple[int, int]] = []  # (代数, 起始桶编号)：该桶及之后全部失效
+        self._fills_in_flight = 0
+        self.stats = {'bucket_hits': 0, 'bucket_misses': 0, 'invalidated': 0}
+
+    def _scan(self, since: int, until: Optional[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """读取 [since, until) 内的行为，返回 (用户编号, 行为编码, 时间戳) 数组"""
+        user_codes, codes, timestamps = [], [], []
+        for action in scan_actions(self.db, since=to_datetime(since),
+                                   until=to_datetime(until) if until is not None else None,
+                                   columns=('user_code', 'action_type', 'timestamp')):
+            user_codes.append(action['user_code'])
+            codes.append(code_of(action['action_type']))
+            timestamps.append(to_timestamp(action['timestamp']))
+        return (np.array(user_codes, np.int64), np.array(codes, np.int64), np.array(timestamps, np.int64))
+
+    def _fill(self, first: int, last: int) -> Dict[int, ActionWindow]:
+        """一次扫描计算 [first, last] 范围内的桶并缓存 (包括没有行为的桶)，返回计算出的桶
+
+        扫描期间被 observe_batch / invalidate 标记失效的桶只用于本次返回，不写入缓存。
+        """
+        with self._lock:
+            started = self._generation
+            self._fills_in_flight += 1
+        try:
+            user_codes, codes, timestamps = self._scan(first * self.width, (last + 1) * self.width)
+        except BaseException:
+            with self._lock:
+                self._finish_fill()
+            raise
+        buckets = timestamps // self.width
+        order = np.argsort(buckets, kind='stable')
+        user_codes, codes, timestamps, buckets = user_codes[order], codes[order], timestamps[order], buckets[order]
+        bounds = np.searchsorted(buckets, np.arange(first, last + 2))
+
+        filled = {
+            index: ActionWindow.from_rows(user_codes[lo:hi], codes[lo:hi], timestamps[lo:hi])
+            for index, lo, hi in zip(range(first, last + 1), bounds[:-1], bounds[1:])
+        }
+        with self._lock:
+            self._buckets.update(
+                (index, window) for index, window in filled.items() if not self._invalidated_since(index, started)
+            )
+            self._finish_fill()
+            if len(self._buckets) > self.max_buckets:
+                for index in sorted(self._buckets)[:len(self._buckets) - self.max_buckets]:
+                    del self._buckets[index]
+        return filled
+
+    def _invalidated_since(self, index: int, generation: int) -> bool:
+        if self._bucket_generations.get(index, -1) > generation:
+            return True
+        return any(g > generation and index >= first for g, first in self._range_generations)
+
+    def _finish_fill(self):
+        """调用方持有锁；没有进行中的填充时清空失效记录"""
+        self._fills_in_flight -= 1
+        if not self._fills_in_flight:
+            self._bucket_generations.clear()
+            self._range_generations.clear()
+
+    def _mark_invalidated(self, indices: Iterable[int] = (), first: Optional[int] = None):
+        """调用方持有锁；只在有进行中的填充时记录"""
+        if not self._fills_in_flight:
+            return
+        self._generation += 1
+        for index in indices:
+            self._bucket_generations[index] = self._generation
+        if first is not None:
+            self._range_generations.append((self._generation, first))
+
+    def window(self, days: int, now: Optional[datetime] = None) -> ActionWindow:
+        """最近 days 天的聚合：起点向下对齐到桶边界，已关闭的桶取缓存，其余部分实时计算"""
+        now_ts = to_timestamp(now or datetime.now())
+        start = (now_ts - days * 86400 * 1000000) // self.width
+        open_from = max((now_ts - self.grace) // self.width, start)
+
+        # 先取出已缓存的桶再填充：窗口超过 max_buckets 时填充会淘汰本次查询要用的桶
+        with self._lock:
+            cached = {index: self._buckets[index] for index in range(start, open_from) if index in self._buckets}
+        missing = [index for index in range(start, open_from) if index not in cached]
+        self.stats['bucket_hits'] += len(cached)
+        self.stats['bucket_misses'] += len(missing)
+        # 每段连续缺失的桶各扫描一次，不重扫中间已缓存的桶
+        filled: Dict[int, ActionWindow] = {}
+        run_start = 0
+        for i in range(1, len(missing) + 1):
+            if i == len(missing) or missing[i] != missing[i - 1] + 1:
+                filled.update(self._fill(missing[run_start], missing[i - 1]))
+                run_start = i
+
+        closed = [filled[index] if index in filled else cached[index] for index in range(start, open_from)]
+        open_window = ActionWindow.from_rows(*self._scan(open_from * self.width, None))
+        return ActionWindow.merge(closed + [open_window])
+
+    def invalidate(self, since: Optional[datetime] = None):
+        """使 since 及之后的桶失效，None表示全部"""
+        with self._lock:
+            if since is None:
+                dropped = len(self._buckets)
+                self._buckets.clear()
+                self._mark_invalidated(first=-(1 << 62))
+            else:
+                first = to_timestamp(since) // self.width
+                self._mark_invalidated(first=first)
+                stale = [index for index in self._buckets if index >= first]
+                for index in stale:
+                    del self._buckets[index]
+                dropped = len(stale)
+        self.stats['invalidated'] += dropped
+
+    def observe_batch(self, records: Iterable[Dict[str, Any]]):
+        """行为日志的监听接口：迟到行为所在的已缓存桶失效"""
+        indices = set()
+        for record in records:
+            timestamp = record.get('timestamp')
+            if timestamp is not None:
+                indices.add(to_timestamp(timestamp) // self.width)
+        with self._lock:
+            self._mark_invalidated(indices)
+            stale = [index for index in indices if index in self._buckets]
+            for index in stale:
+                del self._buckets[index]
+        self.stats['invalidated'] += len(stale)
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+性能基准测试
+Benchmark Runner - timing cases for analytics, job matching, freedom scoring and decisions
+
+在合成数据 (benchmarks/synthetic_data.py) 上运行基准用例：BehaviorAnalytics 的
+每个分析方法 (及启用缓存/在线统计时的版本)、JobLeadsAPI.get_job_recommendations、
+FreedomCalculator 和 DecisionSupportAI.compare_opportunities。每个用例先预热，
+再重复计时，结果 (最小/中位/平均耗时、吞吐量、环境信息和数据参数) 以JSON输出；
+给出 --baseline 时与上一次的结果比较，中位耗时变慢超过阈值即视为退化；有用例出错或退化时退出码为1。
+
+    python benchmarks/run_benchmarks.py --scale 100k --output results.json
+    python benchmarks/run_benchmarks.py --scale 100k --cases 'analytics.*' --baseline results.json
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from analytics.activity_histogram import ActivityHistogram
+from analytics.behavior_analytics import BehaviorAnalytics
+from analytics.path_analysis import PathAnalyzer
+from analytics.search_trends import SearchTrends
+from analytics.sessionization import SessionTable
+from analytics.window_cache import WindowCache
+from benchmarks.synthetic_data import SyntheticDataGenerator, load_jobs, load_manifest, scale_events
+from database.action_scan import scan_actions
+from database.sqlite_db import SQLiteUserDatabase
+from database.user_db import UserDatabase
+from decision_support_ai import DecisionSupportAI
+from integrations.jobleads_api import JobLeadsAPI
+from tools.freedom_calculator import FreedomCalculator
+
+RESULTS_SCHEMA = 1
+SQLITE_FILE = "bench.db"
+
+# 用例名 -> (分组, 准备函数)；准备函数返回 (被计时的函数, 每次调用处理的条目数)
+CASES: Dict[str, Tuple[str, Callable[['BenchmarkContext'], Tuple[Callable[[], Any], int]]]] = {}
+
+def case(name: str):
+    """注册基准用例"""
+    def register(setup: Callable[['BenchmarkContext'], Tuple[Callable[[], Any], int]]):
+        CASES[name] = (name.split('.')[0], setup)
+        return setup
+    return register
+
+class BenchmarkContext:
+    """用例共享的数据集和存储层对象 (按需创建)"""
+
+    def __init__(self, data_dir: str, generator: SyntheticDataGenerator, backend: str, sample: int):
+        self.data_dir = data_dir
+        self.generator = generator
+        self.backend = backend
+        self.sample = sample
+        self._db = None
+        self._sample_users: Optional[List[str]] = None
+        self._profiles: Optional[Dict[str, Dict[str, Any]]] = None
+        self._jobs: Optional[List[Dict[str, Any]]] = None
+
+    @property
+    def db(self) -> Any:
+        if self._db is None:
+            if self.backend == 'sqlite':
+                self._db = SQLiteUserDatabase(self.data_dir, SQLITE_FILE)
+            else:
+                self._db = UserDatabase(self.data_dir)
+        return self._db
+
+    @property
+    def sample_users(self) -> List[str]:
+        """有行为记录的用户中固定抽取的 sample 个"""
+        if self._sample_users is None:
+            users = sorted({action['user_id'] for action in scan_actions(self.db, columns=('user_id',))})
+            self._sample_users = random.Random(self.generator.seed).sample(users, min(self.sample, len(users)))
+        return self._sample_users
+
+    @property
+    def profiles(self) -> Dict[str, Dict[str, Any]]:
+        if self._profiles is None:
+            with open(os.path.join(self.data_dir, "user_profiles.json"), 'r', encoding='utf-8') as f:
+                self._profiles = json.load(f)
+        return self._profiles
+
+    @property
+    def jobs(self) -> List[Dict[str, Any]]:
+        if self._jobs is None:
+            self._jobs = load_jobs(self.data_dir)
+        return self._jobs
+
+    def analytics(self, **engines: Any) -> BehaviorAnalytics:
+        return BehaviorAnalytics(self.db, **engines)
+
+    def close(self):
+        if self.backend == 'sqlite' and self._db is not None:
+            self._db.close()
+
+def prepare_dataset(data_dir: str, generator: SyntheticDataGenerator, backend: str) -> SyntheticDataGenerator:
+    """生成数据 (参数相同的已有数据直接复用)，返回与磁盘上数据一致的生成器"""
+    manifest = load_manifest(data_dir)
+    wanted = generator.manifest()
+    if manifest and all(manifest.get(key) == wanted[key] for key in ('seed', 'events', 'users', 'days', 'jobs')):
+        # 复用时沿用原数据的截止时间，SQLite数据才能与JSON数据一致
+        generator = SyntheticDataGenerator(seed=generator.seed, events=generator.events, users=generator.users,
+                                           days=generator.days, end=datetime.fromisoformat(manifest['end']),
+                                           jobs=generator.jobs)
+        print(f"复用数据: {data_dir}", file=sys.stderr)
+    else:
+        sqlite_path = os.path.join(data_dir, SQLITE_FILE)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(sqlite_path + suffix):
+                os.remove(sqlite_path + suffix)
+        started = time.perf_counter()
+        counts = generator.write_json(data_dir)
+        print(f"生成数据: {data_dir} {counts} ({time.perf_counter() - started:.1f}s)", file=sys.stderr)
+
+    if backend == 'sqlite' and not os.path.exists(os.path.join(data_dir, SQLITE_FILE)):
+        started = time.perf_counter()
+        db = SQLiteUserDatabase(data_dir, SQLITE_FILE + '.tmp')
+        count = generator.write_sqlite(db)
+        db.close()
+        os.replace(os.path.join(data_dir, SQLITE_FILE + '.tmp'), os.path.join(data_dir, SQLITE_FILE))
+        print(f"写入SQLite: {count} 条行为 ({time.perf_counter() - started:.1f}s)", file=sys.stderr)
+    return generator
+
+# 行为分析
+
+@case('analytics.user_journey')
+def _user_journey(ctx: BenchmarkContext):
+    analytics, users = ctx.analytics(), ctx.sample_users
+    return (lambda: [analytics.analyze_user_journey(user_id) for user_id in users]), len(users)
+
+@case('analytics.user_journey.path_analyzer')
+def _user_journey_paths(ctx: BenchmarkContext):
+    analyzer = PathAnalyzer()
+    analyzer.build(ctx.db)
+    analytics, users = ctx.analytics(path_analyzer=analyzer), ctx.sample_users
+    return (lambda: [analytics.analyze_user_journey(user_id) for user_id in users]), len(users)
+
+@case('analytics.feature_adoption')
+def _feature_adoption(ctx: BenchmarkContext):
+    analytics = ctx.analytics()
+    return analytics.analyze_feature_adoption, 1
+
+@case('analytics.feature_adoption.user')
+def _feature_adoption_user(ctx: BenchmarkContext):
+    analytics, users = ctx.analytics(), ctx.sample_users
+    return (lambda: [analytics.analyze_feature_adoption(user_id) for user_id in users]), len(users)
+
+@case('analytics.feature_adoption.window_cache')
+def _feature_adoption_cached(ctx: BenchmarkContext):
+    analytics = ctx.analytics(window_cache=WindowCache(ctx.db))
+    return analytics.analyze_feature_adoption, 1
+
+@case('analytics.user_segments')
+def _user_segments(ctx: BenchmarkContext):
+    analytics = ctx.analytics()
+    return analytics.analyze_user_segments, 1
+
+@case('analytics.user_segments.window_cache')
+def _user_segments_cached(ctx: BenchmarkContext):
+    analytics = ctx.analytics(window_cache=WindowCache(ctx.db))
+    return analytics.analyze_user_segments, 1
+
+@case('analytics.conversion_funnel')
+def _conversion_funnel(ctx: BenchmarkContext):
+    analytics = ctx.analytics()
+    return analytics.analyze_conversion_funnel, 1
+
+@case('analytics.conversion_funnel.window_cache')
+def _conversion_funnel_cached(ctx: BenchmarkContext):
+    analytics = ctx.analytics(window_cache=WindowCache(ctx.db))
+    return analytics.analyze_conversion_funnel, 1
+
+@case('analytics.user_retention')
+def _user_retention(ctx: BenchmarkContext):
+    analytics = ctx.analytics()
+    return analytics.analyze_user_retention, 1
+
+@case('analytics.session_engagement')
+def _session_engagement(ctx: BenchmarkContext):
+    analytics = ctx.analytics()
+    return analytics.analyze_session_engagement, 1
+
+@case('analytics.session_engagement.session_table')
+def _session_engagement_table(ctx: BenchmarkContext):
+    table = SessionTable(path=None)
+    table.build(ctx.db)
+    analytics = ctx.analytics(session_table=table)
+    return analytics.analyze_session_engagement, 1
+
+@case('analytics.personalized_insights')
+def _personalized_insights(ctx: BenchmarkContext):
+    analytics, users = ctx.analytics(), ctx.sample_users
+    return (lambda: [analytics.generate_personalized_insights(user_id) for user_id in users]), len(users)
+
+@case('analytics.personalized_insights.online')
+def _personalized_insights_online(ctx: BenchmarkContext):
+    trends, histogram = SearchTrends(), ActivityHistogram()
+    trends.load_history(ctx.db)
+    histogram.load_history(ctx.db)
+    analytics, users = ctx.analytics(search_trends=trends, activity_histogram=histogram), ctx.sample_users
+    return (lambda: [analytics.generate_personalized_insights(user_id) for user_id in users]), len(users)
+
+# 职位匹配
+
+def _skill_sets(ctx: BenchmarkContext) -> List[Tuple[List[str], Dict[str, Any]]]:
+    """抽样用户的 (技能, 搜索偏好)"""
+    skill_sets = []
+    for user_id in ctx.sample_users:
+        profile = ctx.profiles.get(user_id) or {}
+        skill_sets.append((profile.get('skills') or ['Python编程'], {'remote': True, 'limit': 20}))
+    return skill_sets
+
+@case('jobs.recommendations')
+def _job_recommendations(ctx: BenchmarkContext):
+    api, skill_sets = JobLeadsAPI(jobs=ctx.jobs), _skill_sets(ctx)
+
+    def run():
+        # 每轮清空搜索缓存，测量完整的检索和打分
+        api.clear_cache()
+        return [api.get_job_recommendations(skills, preferences) for skills, preferences in skill_sets]
+    return run, len(skill_sets)
+
+@case('jobs.recommendations.cached')
+def _job_recommendations_cached(ctx: BenchmarkContext):
+    api, skill_sets = JobLeadsAPI(jobs=ctx.jobs), _skill_sets(ctx)
+    return (lambda: [api.get_job_recommendations(skills, preferences) for skills, preferences in skill_sets]), len(skill_sets)
+
+@case('jobs.match_score')
+def _job_match_score(ctx: BenchmarkContext):
+    api, jobs = JobLeadsAPI(jobs=ctx.jobs), ctx.jobs
+    skills = _skill_sets(ctx)[0][0]
+    return (lambda: [api.calculate_job_match_score(job, skills) for job in jobs]), len(jobs)
+
+# 自由度计算
+
+@case('freedom.assessment')
+def _freedom_assessment(ctx: BenchmarkContext):
+    calculator, inputs = FreedomCalculator(), ctx.generator.assessment_inputs(1000)
+    return (lambda: [calculator.calculate_assessment(input_data) for input_data in inputs]), len(inputs)
+
+@case('freedom.assessment.incremental')
+def _freedom_assessment_incremental(ctx: BenchmarkContext):
+    calculator, inputs = FreedomCalculator(), ctx.generator.assessment_inputs(1000)
+    for i, input_data in enumerate(inputs):
+        calculator.calculate_assessment(input_data, user_id=f"bench_{i}")
+    rng = random.Random(ctx.generator.seed)
+    changes = [{'vacation_days': rng.randrange(0, 40)} for _ in inputs]
+    return (lambda: [calculator.update_assessment(f"bench_{i}", change) for i, change in enumerate(changes)]), len(changes)
+
+@case('freedom.batch')
+def _freedom_batch(ctx: BenchmarkContext):
+    calculator = FreedomCalculator()
+    columns = ctx.generator.assessment_columns(min(ctx.generator.events, 1000000))
+    return (lambda: calculator.calculate_batch(columns)), len(columns['passive_income'])
+
+@case('freedom.sweep')
+def _freedom_sweep(ctx: BenchmarkContext):
+    calculator, baseline = FreedomCalculator(), ctx.generator.assessment_inputs(1)[0]
+    variables = {'passive_income': np.linspace(0, 50000, 200), 'work_hours_per_week': np.linspace(10, 70, 200)}
+    return (lambda: calculator.sweep(baseline, variables, grid=True)), 200 * 200
+
+# 决策支持
+
+@case('decision.compare_opportunities')
+def _compare_opportunities(ctx: BenchmarkContext):
+    ai = DecisionSupportAI()
+    groups = [ctx.generator.opportunities(10, stream=i) for i in range(20)]
+    return (lambda: [ai.compare_opportunities(opportunities) for opportunities in groups]), len(groups)
+
+@case('decision.compare_opportunities.large')
+def _compare_opportunities_large(ctx: BenchmarkContext):
+    ai, opportunities = DecisionSupportAI(), ctx.generator.opportunities(1000)
+    return (lambda: ai.compare_opportunities(opportunities, fields=['recommended_option', 'confidence_score'])), 1
+
+@case('decision.compare_opportunities.simulate')
+def _compare_opportunities_simulate(ctx: BenchmarkContext):
+    ai, opportunities = DecisionSupportAI(), ctx.generator.opportunities(10)
+    return (lambda: ai.compare_opportunities(opportunities, simulate=True, simulation_draws=20000,
+                                             simulation_workers=1)), 1
+
+# 运行与比较
+
+def run_case(name: str, ctx: BenchmarkContext, repeat: int, warmup: int) -> Dict[str, Any]:
+    """准备、预热并重复计时一个用例"""
+    group, setup = CASES[name]
+    started = time.perf_counter()
+    try:
+        fn, items = setup(ctx)
+        setup_seconds = time.perf_counter() - started
+        for _ in range(warmup):
+            fn()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+    except Exception as e:
+        return {'group': group, 'error': f"{type(e).__name__}: {e}"}
+
+    median = statistics.median(timings)
+    return {
+        'group': group,
+        'items': items,
+        'repeat': repeat,
+        'setup_seconds': round(setup_seconds, 6),
+        'min': min(timings),
+        'median': median,
+        'mean': statistics.fmean(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'max': max(timings),
+        'items_per_second': items / median if median > 0 else None
+    }
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], threshold: float,
+            min_delta: float, results_meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """与基线结果比较中位耗时：变慢超过 threshold (比例) 且超过 min_delta 秒视为退化，出错的用例记为失败"""
+    regressions, improvements = [], []
+    failures = [{'case': name, 'error': result['error']} for name, result in results.items() if 'error' in result]
+    baseline_results = baseline.get('results', {})
+    for name, result in results.items():
+        before = baseline_results.get(name, {})
+        if 'median' not in result or not before.get('median'):
+            continue
+        # 每次调用处理的条目数不同时 (如数据规模变化) 按单条耗时比较
+        after_time = result['median'] / result['items']
+        before_time = before['median'] / before.get('items', result['items'])
+        ratio = after_time / before_time
+        entry = {'case': name, 'baseline_median': before['median'], 'median': result['median'],
+                 'ratio': round(ratio, 4)}
+        delta = (after_time - before_time) * result['items']
+        if ratio > 1 + threshold and delta > min_delta:
+            regressions.append(entry)
+        elif ratio < 1 / (1 + threshold) and -delta > min_delta:
+            improvements.append(entry)
+
+    # 存储层或数据参数不同的结果之间的比较只作参考
+    meta, baseline_meta = results_meta or {}, baseline.get('meta', {})
+    mismatched = [key for key in ('backend', 'dataset') if meta.get(key) != baseline_meta.get(key)]
+
+    return {
+        'baseline_meta': baseline_meta,
+        'mismatched': mismatched,
+        'threshold': threshold,
+        'min_delta': min_delta,
+        'failures': failures,
+        'regressions': sorted(regressions, key=lambda e: e['ratio'], reverse=True),
+        'improvements': sorted(improvements, key=lambda e: e['ratio'])
+    }
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__
+    }
+
+def select_cases(patterns: Optional[List[str]]) -> List[str]:
+    if not patterns:
+        return list(CASES)
+    selected = [name for name in CASES if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+    if not selected:
+        raise ValueError(f"没有匹配的用例: {patterns}")
+    return selected
+
+def main():
+    """命令行工具主函数"""
+    parser = argparse.ArgumentParser(description='性能基准测试')
+    parser.add_argument('--scale', default='1k', help='行为条数：1k, 10k, 100k, 1m, 10m 或数字')
+    parser.add_argument('--seed', type=int, default=42, help='合成数据的随机种子')
+    parser.add_argument('--users', type=int, help='用户数，默认每20条行为一个用户')
+    parser.add_argument('--days', type=int, default=90, help='行为覆盖的天数')
+    parser.add_argument('--data-dir', type=str, help='合成数据目录，默认 benchmarks/data/<规模>-<种子>')
+    parser.add_argument('--backend', choices=['sqlite', 'json'], default='sqlite', help='存储层')
+    parser.add_argument('--cases', nargs='+', help='要运行的用例 (支持通配符，如 "analytics.*")')
+    parser.add_argument('--list', action='store_true', help='列出所有用例')
+    parser.add_argument('--repeat', type=int, default=5, help='每个用例计时的次数')
+    parser.add_argument('--warmup', type=int, default=1, help='计时前的预热次数')
+    parser.add_argument('--sample', type=int, default=20, help='按用户运行的用例抽样的用户数')
+    parser.add_argument('--output', type=str, default='-', help='结果JSON文件，默认标准输出')
+    parser.add_argument('--baseline', type=str, help='用于比较的上一次结果JSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='中位耗时变慢超过该比例视为退化')
+    parser.add_argument('--min-delta', type=float, default=0.001, help='变化小于该秒数时不视为退化')
+
+    args = parser.parse_args()
+
+    if args.list:
+        for name, (group, _) in CASES.items():
+            print(f"{group:10s} {name}")
+        return
+
+    names = select_cases(args.cases)
+    events = scale_events(args.scale)
+    data_dir = args.data_dir or os.path.join(ROOT, 'benchmarks', 'data', f"{args.scale.lower()}-{args.seed}")
+    generator = prepare_dataset(data_dir, SyntheticDataGenerator(seed=args.seed, events=events, users=args.users,
+                                                                 days=args.days), args.backend)
+
+    ctx = BenchmarkContext(data_dir, generator, args.backend, args.sample)
+    started_at = datetime.now()
+    results = {}
+    try:
+        for name in names:
+            result = results[name] = run_case(name, ctx, args.repeat, args.warmup)
+            if 'error' in result:
+                print(f"{name}: 失败 {result['error']}", file=sys.stderr)
+            else:
+                print(f"{name}: 中位 {result['median'] * 1000:.2f} ms ({result['items']} 条)", file=sys.stderr)
+    finally:
+        ctx.close()
+
+    report = {
+        'schema': RESULTS_SCHEMA,
+        'meta': {
+            'started_at': started_at.isoformat(),
+            'duration_seconds': round((datetime.now() - started_at).total_seconds(), 3),
+            'scale': args.scale,
+            'backend': args.backend,
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+            'sample': args.sample,
+            'dataset': generator.manifest(),
+            'environment': environment()
+        },
+        'results': results
+    }
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            report['comparison'] = compare(results, json.load(f), args.threshold, args.min_delta, report['meta'])
+        if report['comparison']['mismatched']:
+            print(f"注意: 与基线的 {', '.join(report['comparison']['mismatched'])} 不同", file=sys.stderr)
+        for entry in report['comparison']['regressions']:
+            print(f"退化: {entry['case']} {entry['ratio']:.2f}x", file=sys.stderr)
+
+    failed = [name for name, result in results.items() if 'error' in result]
+    if failed:
+        print(f"失败的用例: {', '.join(failed)}", file=sys.stderr)
+
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == '-':
+        print(payload)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload + '\n')
+
+    # 出错的用例与退化同样视为失败，避免坏掉的用例在CI中被静默跳过
+    if failed or report.get('comparison', {}).get('regressions'):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+基准测试数据生成器
+Synthetic Data - seeded generator for users, sessions, actions, jobs and decision inputs
+
+按给定的随机种子和规模 (1k ~ 10M 条行为) 生成与 data/ 目录下格式相同的
+users / user_profiles / user_preferences / user_sessions / user_actions 文件，
+以及职位库、机会列表和自由度评估输入。相同的种子和参数总是生成相同的数据。
+
+行为按天生成：用户在各自的加入日之后才开始活跃，活跃度服从长尾分布；
+每个会话从登录开始，按转移权重依次产生搜索、浏览、申请等行为，
+会话开始时间服从日内活跃曲线。行为和会话都是流式写出的，
+10M 规模时内存中只保留一天的数据。
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCALES = {
+    '1k': 1000,
+    '10k': 10000,
+    '100k': 100000,
+    '1m': 1000000,
+    '10m': 10000000,
+}
+
+# 会话内下一个行为的转移权重 (未列出的行为不会出现在会话中)
+ACTION_FLOW = {
+    'login': {'search': 4, 'assessment': 2, 'opportunity_view': 2, 'learning_plan': 1, 'preference_update': 0.5, 'logout': 0.5},
+    'search': {'opportunity_view': 5, 'search': 2, 'learning_plan': 0.5, 'logout': 1},
+    'opportunity_view': {'opportunity_view': 2, 'opportunity_apply': 1, 'search': 2, 'learning_plan': 1, 'logout': 1},
+    'opportunity_apply': {'opportunity_view': 2, 'search': 1, 'logout': 1},
+    'assessment': {'learning_plan': 2, 'opportunity_view': 1, 'export': 0.3, 'logout': 1},
+    'learning_plan': {'learning_plan': 1, 'assessment': 1, 'search': 0.5, 'logout': 1},
+    'preference_update': {'search': 1, 'opportunity_view': 1, 'logout': 1},
+    'export': {'assessment': 1, 'logout': 1},
+}
+
+# 0~23点的会话开始权重 (上午和晚间两个高峰)
+HOURLY_WEIGHTS = [1, 0.5, 0.3, 0.2, 0.2, 0.4, 1, 2, 4, 6, 7, 6, 4, 5, 6, 6, 5, 4, 4, 5, 7, 8, 6, 3]
+
+SKILLS = [
+    'Python编程', '数据分析', '项目管理', 'AI工具使用', '产品管理经验', 'AI/ML基础知识', '机器学习',
+    '技术写作经验', '编程基础', '英语能力', '文档工具', 'UI设计', '用户研究', '内容创作', '视频剪辑',
+    '社交媒体运营', 'SEO优化', '数字营销', '前端开发', 'React', '后端开发', '数据库设计', '云计算',
+    '区块链开发', '智能合约', '在线教学', '课程设计', '沟通能力', '客户服务', '财务分析',
+]
+KEYWORDS = [
+    'python', '数据分析', '远程', 'ai', '产品经理', '设计', '运营', '写作', '前端', '兼职',
+    '自由职业', '机器学习', '营销', '教育', '区块链', '视频', '翻译', '咨询', '开发', '管理',
+]
+JOB_TITLES = [
+    'AI产品经理', '数据分析师', '全栈开发工程师', '内容创作者', '数字营销专家', '在线课程讲师',
+    '区块链开发者', 'UI/UX设计师', '技术文档工程师', '增长运营', '机器学习工程师', '远程客服',
+]
+COMPANIES = ['TechCorp', 'DataTech Solutions', 'RemoteFirst Tech', 'ContentAI', 'Growth Marketing Co',
+             'EduTech Online', 'BlockTech', 'DesignStudio']
+LOCATIONS = ['北京', '上海', '深圳', '杭州', '成都', '远程']
+JOB_TYPES = ['full-time', 'part-time', 'contract', 'freelance']
+BENEFITS = ['弹性工作时间', '远程工作', '股权激励', '学习津贴', '时间自主', '全球远程', '项目制工作',
+            '五险一金', '年度旅游', '技术学习']
+INDUSTRIES = ['科技', 'AI', '教育', '金融', '电商', '媒体', '咨询']
+USER_AGENTS = ['Mozilla/5.0 (Windows NT 10.0; Win64; x64)', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_0)',
+               'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X)', 'API Client v1.0']
+
+def scale_events(scale: str) -> int:
+    """'1k' / '10m' 等规模名或数字字符串 -> 行为条数"""
+    key = scale.lower()
+    if key in SCALES:
+        return SCALES[key]
+    try:
+        return int(float(key))
+    except ValueError:
+        raise ValueError(f"未知的规模: {scale}，可选 {', '.join(SCALES)} 或数字")
+
+class SyntheticDataGenerator:
+    """带随机种子的合成数据生成器"""
+
+    def __init__(self, seed: int = 42, events: int = 1000, users: Optional[int] = None,
+                 days: int = 90, end: Optional[datetime] = None, jobs: Optional[int] = None):
+        """
+        Args:
+            seed: 随机种子
+            events: 行为条数
+            users: 用户数，默认每20条行为一个用户
+            days: 行为覆盖的天数 (截止到 end)
+            end: 数据的截止时间，默认为今天零点；分析方法按当前时间取窗口，数据需要贴近当前时间
+            jobs: 职位库大小，默认为行为数的1/10 (100 ~ 50000)
+        """
+        self.seed = seed
+        self.events = events
+        self.users = users or max(20, events // 20)
+        self.days = days
+        self.end = end or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.start = self.end - timedelta(days=days)
+        self.jobs = jobs or min(max(100, events // 10), 50000)
+
+        self._flow = {
+            action: (list(targets), np.cumsum(list(targets.values())) / sum(targets.values()))
+            for action, targets in ACTION_FLOW.items()
+        }
+
+    def manifest(self) -> Dict[str, Any]:
+        """生成参数，与数据一起保存以便复用"""
+        return {
+            'seed': self.seed,
+            'events': self.events,
+            'users': self.users,
+            'days': self.days,
+            'jobs': self.jobs,
+            'end': self.end.isoformat(),
+        }
+
+    def _rng(self, stream: int) -> Tuple[random.Random, np.random.Generator]:
+        """每类数据独立的随机流，改变一类数据的规模不影响其他数据"""
+        return random.Random(self.seed * 1000 + stream), np.random.default_rng([self.seed, stream])
+
+    @staticmethod
+    def user_id(index: int) -> str:
+        return f"user_{index:012x}"
+
+    # 用户
+
+    def _join_days(self) -> np.ndarray:
+        """每个用户的加入日 (相对 start)，约三成用户在数据开始前就已加入"""
+        _, rng = self._rng(1)
+        join = rng.integers(-self.days // 2, self.days, self.users)
+        return np.maximum(join, 0)
+
+    def iter_users(self) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]]:
+        """逐个生成 (user, profile, preferences) 文档"""
+        py_rng, _ = self._rng(2)
+        join_days = self._join_days()
+        for index in range(self.users):
+            user_id = self.user_id(index)
+            created_at = (self.start + timedelta(days=int(join_days[index]), seconds=py_rng.randrange(86400))).isoformat()
+            user = {
+                'user_id': user_id,
+                'username': f"user{index}",
+                'email': f"user{index}@example.com",
+                'password_hash': f"{py_rng.getrandbits(64):016x}${py_rng.getrandbits(128):032x}",
+                'created_at': created_at,
+                'last_login': None,
+                'is_active': True
+            }
+            profile = {
+                'user_id': user_id,
+                'full_name': None,
+                'avatar_url': None,
+                'bio': None,
+                'location': py_rng.choice(LOCATIONS),
+                'industry': py_rng.choice(INDUSTRIES),
+                'experience_years': py_rng.randrange(0, 20),
+                'education_level': None,
+                'current_role': py_rng.choice(JOB_TITLES),
+                'career_goals': [],
+                'skills': py_rng.sample(SKILLS, py_rng.randrange(1, 7)),
+                'interests': py_rng.sample(KEYWORDS, py_rng.randrange(0, 4)),
+                'social_links': {},
+                'last_assessment_score': round(py_rng.random(), 2),
+                'last_assessment_date': created_at,
+                'assessment_history': [],
+                'updated_at': created_at
+            }
+            salary_min = py_rng.randrange(5, 40) * 1000
+            preferences = {
+                'user_id': user_id,
+                'preferred_work_type': py_rng.choice(['remote', 'hybrid', 'onsite']),
+                'preferred_job_types': py_rng.sample(JOB_TYPES, py_rng.randrange(0, 3)),
+                'salary_expectations': {'min': salary_min, 'max': salary_min * 2, 'currency': 'CNY'},
+                'location_preferences': py_rng.sample(LOCATIONS, 2),
+                'industry_preferences': py_rng.sample(INDUSTRIES, 2),
+                'company_size_preference': py_rng.choice(['startup', 'medium', 'large']),
+                'learning_style': None,
+                'preferred_learning_time': None,
+                'learning_pace': None,
+                'email_frequency': py_rng.choice(['daily', 'weekly', 'monthly']),
+                'notification_types': ['opportunities', 'learning', 'trends'],
+                'data_sharing_level': 'medium',
+                'profile_visibility': 'private',
+                'dashboard_widgets': ['freedom_score', 'opportunities', 'learning_progress'],
+                'chart_preferences': {'type': 'radar', 'theme': 'default'},
+                'updated_at': created_at
+            }
+            yield user, profile, preferences
+
+    # 会话与行为
+
+    def _details(self, action_type: str, rng: random.Random, session_id: str) -> Dict[str, Any]:
+        if action_type == 'search':
+            # 关键词按排名的长尾分布，少数关键词占多数搜索
+            count = rng.randrange(1, 4)
+            keywords = {KEYWORDS[min(int(rng.paretovariate(1.1)) - 1, len(KEYWORDS) - 1)] for _ in range(count)}
+            return {'keywords': sorted(keywords), 'remote_preferred': rng.random() < 0.7}
+        if action_type in ('opportunity_view', 'opportunity_apply'):
+            return {'job_id': f"syn_{rng.randrange(self.jobs):06d}", 'page_view': True}
+        if action_type == 'login':
+            return {'action': 'login', 'method': 'email'}
+        if action_type == 'logout':
+            return {'action': 'logout', 'session_id': session_id}
+        if action_type == 'assessment':
+            return {'overall_score': round(rng.random(), 3)}
+        if action_type == 'preference_update':
+            return {'updated_fields': rng.sample(['skills', 'interests', 'location', 'current_role', 'bio'], 2)}
+        if action_type == 'export':
+            return {'data_type': 'full_profile'}
+        return {'page_view': True}
+
+    def _session(self, rng: random.Random, user_id: str, start: datetime,
+                 max_depth: int) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        session_id = f"session_{rng.getrandbits(64):016x}"
+        ip_address = f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+        user_agent = rng.choice(USER_AGENTS)
+
+        actions = []
+        action_type, timestamp = 'login', start
+        while True:
+            actions.append({
+                'action_id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                'user_id': user_id,
+                'action_type': action_type,
+                'timestamp': timestamp.isoformat(),
+                'details': self._details(action_type, rng, session_id),
+                # 登录行为发生在会话创建之前，与真实数据一样没有 session_id
+                'session_id': session_id if actions else None,
+                'ip_address': ip_address,
+                'user_agent': user_agent
+            })
+            if action_type == 'logout' or len(actions) >= max_depth:
+                break
+            targets, cumulative = self._flow[action_type]
+            action_type = targets[int(np.searchsorted(cumulative, rng.random(), side='right'))]
+            timestamp += timedelta(seconds=5 + rng.expovariate(1 / 75))
+
+        session = {
+            'session_id': session_id,
+            'user_id': user_id,
+            'created_at': actions[0]['timestamp'],
+            'last_activity': actions[-1]['timestamp'],
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'is_active': self.end - timestamp < timedelta(days=1)
+        }
+        return session, actions
+
+    def iter_days(self) -> Iterator[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
+        """逐天生成 (会话列表, 按时间排序的行为列表)，行为总数恰好为 events"""
+        py_rng, rng = self._rng(3)
+        join_days = self._join_days()
+        # 用户按加入日排序，第d天可活跃的用户是前缀 [0, eligible[d])
+        order = np.argsort(join_days, kind='stable')
+        eligible = np.searchsorted(join_days[order], np.arange(self.days), side='right')
+        activity = rng.pareto(1.5, self.users) + 0.05
+        cumulative_activity = np.cumsum(activity[order])
+        hours = np.cumsum(HOURLY_WEIGHTS) / sum(HOURLY_WEIGHTS)
+
+        # 每天的行为数：平日多、周末少，合计为 events
+        weights = np.array([0.75 if (self.start + timedelta(days=d)).weekday() >= 5 else 1.0
+                            for d in range(self.days)])
+        weights *= rng.uniform(0.9, 1.1, self.days)
+        quotas = np.floor(weights / weights.sum() * self.events).astype(np.int64)
+        quotas[-1] += self.events - quotas.sum()
+
+        for day in range(self.days):
+            remaining = int(quotas[day])
+            day_start = self.start + timedelta(days=day)
+            pool = max(int(eligible[day]), 1)
+            sessions, actions = [], []
+            while remaining > 0:
+                pick = int(np.searchsorted(cumulative_activity[:pool], py_rng.random() * cumulative_activity[pool - 1]))
+                user_index = int(order[min(pick, pool - 1)])
+                hour = int(np.searchsorted(hours, py_rng.random(), side='right'))
+                start = day_start + timedelta(hours=hour, seconds=py_rng.randrange(3600))
+                max_depth = min(remaining, 1 + int(py_rng.expovariate(1 / 6)))
+                session, session_actions = self._session(py_rng, self.user_id(user_index), start, max_depth)
+                sessions.append(session)
+                actions.extend(session_actions)
+                remaining -= len(session_actions)
+            actions.sort(key=lambda a: a['timestamp'])
+            yield sessions, actions
+
+    # 职位与决策输入
+
+    def job_corpus(self) -> List[Dict[str, Any]]:
+        """与 JobLeadsAPI 模拟职位字段相同的职位库"""
+        rng, _ = self._rng(4)
+        jobs = []
+        for index in range(self.jobs):
+            low = rng.randrange(5, 50) * 1000
+            remote = rng.random() < 0.6
+            jobs.append({
+                'id': f"syn_{index:06d}",
+                'title': rng.choice(JOB_TITLES),
+                'company': rng.choice(COMPANIES),
+                'location': rng.choice(LOCATIONS) + ('/远程' if remote else ''),
+                'salary_range': f"{low}-{low + rng.randrange(5, 30) * 1000}",
+                'job_type': rng.choice(JOB_TYPES),
+                'remote_friendly': remote,
+                'description': '负责' + '、'.join(rng.sample(KEYWORDS, 3)) + '相关工作',
+                'requirements': rng.sample(SKILLS, rng.randrange(2, 6)),
+                'benefits': rng.sample(BENEFITS, rng.randrange(1, 5)),
+                'posted_date': (self.end - timedelta(days=rng.randrange(60))).date().isoformat(),
+                'application_url': f"https://jobleads.com/jobs/syn_{index:06d}",
+                'freedom_score': round(rng.uniform(0.3, 0.95), 2),
+                'match_score': 0.0
+            })
+        return jobs
+
+    def opportunities(self, count: int, stream: int = 0) -> List[Dict[str, Any]]:
+        """DecisionSupportAI.compare_opportunities 的输入"""
+        rng, _ = self._rng(100 + stream)
+        return [
+            {
+                'title': f"{rng.choice(JOB_TITLES)} #{index}",
+                'description': '、'.join(rng.sample(KEYWORDS, 3)),
+                'pros': rng.sample(['时间灵活', '收入高', '技能可积累', '市场需求大', '被动收入', '可扩展性强'], 3),
+                'cons': rng.sample(['收入不稳定', '竞争激烈', '前期投入大', '制作周期长', '需要持续营销'], 2),
+                'risk_level': rng.randrange(1, 11),
+                'potential_income': rng.randrange(10, 200) * 1000,
+                'time_investment': rng.randrange(50, 1000),
+                'skills_required': rng.sample(SKILLS, 3),
+                'success_probability': round(rng.uniform(0.1, 0.9), 2)
+            }
+            for index in range(count)
+        ]
+
+    def assessment_inputs(self, count: int) -> List[Dict[str, Any]]:
+        """FreedomCalculator.calculate_assessment 的输入"""
+        rng, _ = self._rng(5)
+        inputs = []
+        for _ in range(count):
+            expenses = rng.randrange(3, 30) * 1000
+            inputs.append({
+                'financial': {
+                    'passive_income': rng.randrange(0, 20) * 500,
+                    'active_income': rng.randrange(5, 60) * 1000,
+                    'monthly_expenses': expenses,
+                    'emergency_fund': expenses * rng.randrange(0, 24)
+                },
+                'time': {
+                    'work_hours_per_week': rng.randrange(10, 70),
+                    'flexible_hours': rng.randrange(0, 30),
+                    'vacation_days': rng.randrange(0, 40),
+                    'can_work_remotely': rng.random() < 0.5
+                },
+                'location': {
+                    'can_work_anywhere': rng.random() < 0.3,
+                    'travel_frequency': rng.randrange(0, 12),
+                    'location_constraints': rng.randrange(0, 5)
+                },
+                'skill': {
+                    'transferable_skills': rng.sample(SKILLS, rng.randrange(0, 10)),
+                    'learning_rate': rng.randrange(0, 8),
+                    'market_demand_skills': SKILLS[:12]
+                },
+                'relationship_score': round(rng.random(), 2)
+            })
+        return inputs
+
+    def assessment_columns(self, count: int) -> Dict[str, np.ndarray]:
+        """FreedomCalculator.calculate_batch 的列输入 (技能以计数给出)"""
+        _, rng = self._rng(6)
+        expenses = rng.integers(3, 30, count) * 1000.0
+        skill_count = rng.integers(0, 10, count).astype(float)
+        return {
+            'passive_income': rng.integers(0, 20, count) * 500.0,
+            'active_income': rng.integers(5, 60, count) * 1000.0,
+            'monthly_expenses': expenses,
+            'emergency_fund': expenses * rng.integers(0, 24, count),
+            'work_hours_per_week': rng.integers(10, 70, count).astype(float),
+            'flexible_hours': rng.integers(0, 30, count).astype(float),
+            'vacation_days': rng.integers(0, 40, count).astype(float),
+            'can_work_remotely': (rng.random(count) < 0.5).astype(float),
+            'can_work_anywhere': (rng.random(count) < 0.3).astype(float),
+            'travel_frequency': rng.integers(0, 12, count).astype(float),
+            'location_constraints': rng.integers(0, 5, count).astype(float),
+            'learning_rate': rng.integers(0, 8, count).astype(float),
+            'skill_count': skill_count,
+            'market_match_count': np.floor(skill_count * rng.random(count)),
+            'relationship_score': rng.random(count)
+        }
+
+    # 写出
+
+    def write_json(self, data_dir: str) -> Dict[str, int]:
+        """写出与 data/ 目录相同格式的JSON文件和 jobs.json、manifest.json，返回各文件的记录数"""
+        os.makedirs(data_dir, exist_ok=True)
+        counts = {'users': 0, 'user_profiles': 0, 'user_preferences': 0, 'user_sessions': 0, 'user_actions': 0}
+
+        writers = {name: _JsonObjectWriter(os.path.join(data_dir, f"{name}.json"))
+                   for name in ('users', 'user_profiles', 'user_preferences')}
+        for user, profile, preferences in self.iter_users():
+            writers['users'].write(user['user_id'], user)
+            writers['user_profiles'].write(profile['user_id'], profile)
+            writers['user_preferences'].write(preferences['user_id'], preferences)
+        for name, writer in writers.items():
+            counts[name] = writer.close()
+
+        sessions_writer = _JsonObjectWriter(os.path.join(data_dir, "user_sessions.json"))
+        actions_path = os.path.join(data_dir, "user_actions.json")
+        with open(actions_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write('{"actions": [')
+            separator = '\n'
+            for sessions, actions in self.iter_days():
+                for session in sessions:
+                    sessions_writer.write(session['session_id'], session)
+                for action in actions:
+                    f.write(separator)
+                    f.write(json.dumps(action, ensure_ascii=False))
+                    separator = ',\n'
+                counts['user_actions'] += len(actions)
+            f.write('\n]}\n')
+        os.replace(actions_path + '.tmp', actions_path)
+        counts['user_sessions'] = sessions_writer.close()
+
+        with open(os.path.join(data_dir, "jobs.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.job_corpus(), f, ensure_ascii=False)
+        counts['jobs'] = self.jobs
+
+        # manifest 最后写出，作为数据完整的标志
+        with open(os.path.join(data_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+            json.dump({**self.manifest(), 'counts': counts}, f, ensure_ascii=False, indent=2)
+        return counts
+
+    def write_sqlite(self, db: Any) -> int:
+        """把同一份数据直接写入 SQLiteUserDatabase (按天分批提交，不经过JSON文件)，返回行为数"""
+        with db._transaction() as conn:
+            for user, profile, preferences in self.iter_users():
+                db._put_document(conn, 'users', user)
+                db._put_document(conn, 'user_profiles', profile)
+                db._put_document(conn, 'user_preferences', preferences)
+
+        count = 0
+        for sessions, actions in self.iter_days():
+            with db._transaction() as conn:
+                for session in sessions:
+                    db._put_document(conn, 'user_sessions', session)
+            count += db.log_user_actions(actions)
+        return count
+
+class _JsonObjectWriter:
+    """流式写出 {key: document} 形式的JSON文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._file = open(path + '.tmp', 'w', encoding='utf-8')
+        self._file.write('{')
+
+    def write(self, key: str, document: Dict[str, Any]):
+        self._file.write(',\n' if self.count else '\n')
+        self._file.write(f"{json.dumps(key)}: {json.dumps(document, ensure_ascii=False)}")
+        self.count += 1
+
+    def close(self) -> int:
+        self._file.write('\n}\n')
+        self._file.close()
+        os.replace(self.path + '.tmp', self.path)
+        return self.count
+
+def load_manifest(data_dir: str) -> Optional[Dict[str, Any]]:
+    """已生成数据的 manifest，不存在或不完整时返回None"""
+    path = os.path.join(data_dir, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_jobs(data_dir: str) -> List[Dict[str, Any]]:
+    with open(os.path.join(data_dir, "jobs.json"), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def main():
+    """命令行：生成一份合成数据"""
+    parser = argparse.ArgumentParser(description='生成基准测试用的合成数据')
+    parser.add_argument('output', help='输出目录')
+    parser.add_argument('--scale', default='1k', help=f"行为条数：{', '.join(SCALES)} 或数字")
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--users', type=int, help='用户数，默认每20条行为一个用户')
+    parser.add_argument('--days', type=int, default=90, help='行为覆盖的天数')
+    parser.add_argument('--jobs', type=int, help='职位库大小')
+    args = parser.parse_args()
+
+    generator = SyntheticDataGenerator(seed=args.seed, events=scale_events(args.scale), users=args.users,
+                                       days=args.days, jobs=args.jobs)
+    counts = generator.write_json(args.output)
+    print(json.dumps(counts, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+行为记录解码
+Action Codec - fast decoding of user_actions.json into immutable records
+
+JSON解析器可插拔：安装了 orjson 时默认使用，否则回退到标准库 json。
+时间戳整体向量化解析为整数微秒，行为类型解码为小整数枚举，用户ID、会话ID等
+重复字符串经共享字典规范化 (相同内容只保留一个对象)，结果是不可变的
+ActionRecord 元组 (details 递归冻结：字典为只读映射，列表为元组)；按文件修改时间和
+大小缓存最近使用的几个文件，多个分析任务可以安全地共享同一份解码结果。
+"""
+
+import gc
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from enum import IntEnum
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.string_dictionary import IP_ADDRESSES, SESSION_IDS, USER_AGENTS, USER_IDS
+from user_system.models import ActionType
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSONLoads = Callable[[Union[bytes, str]], Any]
+
+_json_loads: JSONLoads = orjson.loads if orjson is not None else json.loads
+
+# 行为类型的紧凑编码，与 ActionType 的定义顺序一致
+ACTION_TYPES: Tuple[ActionType, ...] = tuple(ActionType)
+ActionCode = IntEnum('ActionCode', [(t.name, i) for i, t in enumerate(ACTION_TYPES)])
+_CODE_BY_VALUE: Dict[str, ActionCode] = {t.value: ActionCode(i) for i, t in enumerate(ACTION_TYPES)}
+
+EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+_EMPTY_DETAILS: Mapping[str, Any] = MappingProxyType({})
+
+# 最多缓存解码结果的文件数
+MAX_CACHED_FILES = 4
+
+def freeze(value: Any) -> Any:
+    """递归冻结：字典转为只读映射，列表转为元组"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+def thaw(value: Any) -> Any:
+    """freeze 的逆操作，得到可修改、可JSON序列化的副本"""
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+class ActionRecord(NamedTuple):
+    """不可变的行为记录，ts 为微秒整数 (本地时间，自1970-01-01起)"""
+    action_id: str
+    user_id: str
+    code: ActionCode
+    ts: int
+    details: Mapping[str, Any]
+    session_id: Optional[str]
+    ip_address: Optional[str]
+    user_agent: Optional[str]
+
+    @property
+    def action_type(self) -> ActionType:
+        return ACTION_TYPES[self.code]
+
+    @property
+    def timestamp(self) -> datetime:
+        return to_datetime(self.ts)
+
+    @property
+    def user_code(self) -> int:
+        """用户ID在共享字典中的整数编号"""
+        return USER_IDS.encode(self.user_id)
+
+    @property
+    def session_code(self) -> Optional[int]:
+        return None if self.session_id is None else SESSION_IDS.encode(self.session_id)
+
+def set_json_loads(loads: Optional[JSONLoads] = None):
+    """替换JSON解析函数；None表示恢复默认 (orjson优先，否则标准库)"""
+    global _json_loads
+    _json_loads = loads or (orjson.loads if orjson is not None else json.loads)
+
+def to_timestamp(value: Union[str, datetime]) -> int:
+    """ISO时间字符串或datetime转换为微秒整数"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (value.replace(tzinfo=None) - EPOCH) // _MICROSECOND
+
+def to_datetime(ts: int) -> datetime:
+    return EPOCH + timedelta(microseconds=ts)
+
+def _has_offset(value: str) -> bool:
+    """时间部分是否带有时区后缀 (Z 或 ±HH:MM)"""
+    tail = value[10:]
+    return tail.endswith('Z') or '+' in tail or '-' in tail
+
+def _parse_naive(values: List[str]) -> List[int]:
+    try:
+        return np.array(values, dtype='datetime64[us]').astype(np.int64).tolist()
+    except ValueError:
+        return [to_timestamp(v) for v in values]
+
+def _parse_timestamps(values: List[str]) -> List[int]:
+    """批量解析时间戳：不带时区的由NumPy一次性解析，NumPy不支持的格式逐条解析
+
+    NumPy遇到时区后缀只给出警告并换算为UTC，而 to_timestamp 保留本地时间 (丢弃时区)，
+    因此带时区的时间戳单独交给 to_timestamp，两条路径的结果保持一致。
+    """
+    aware = [i for i, v in enumerate(values) if _has_offset(v)]
+    if not aware:
+        return _parse_naive(values)
+    if len(aware) == len(values):
+        return [to_timestamp(v) for v in values]
+
+    skip = set(aware)
+    naive = iter(_parse_naive([v for i, v in enumerate(values) if i not in skip]))
+    return [to_timestamp(v) if i in skip else next(naive) for i, v in enumerate(values)]
+
+def code_of(action_type: Union[str, ActionType, int]) -> ActionCode:
+    """ActionType、其字符串值或编码统一转换为 ActionCode"""
+    if isinstance(action_type, ActionType):
+        return _CODE_BY_VALUE[action_type.value]
+    if isinstance(action_type, str):
+        return _CODE_BY_VALUE[action_type]
+    return ActionCode(action_type)
+
+def decode_actions(data: Union[bytes, str], loads: Optional[JSONLoads] = None) -> Tuple[ActionRecord, ...]:
+    """解码 user_actions.json 的内容，返回按文件顺序排列的不可变记录"""
+    # 解码期间会创建大量容器对象，暂停分代GC避免反复扫描
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        actions = (loads or _json_loads)(data).get('actions', [])
+        timestamps = _parse_timestamps([a['timestamp'] for a in actions])
+        codes = _CODE_BY_VALUE
+        new = tuple.__new__
+        user_id, session_id = USER_IDS.intern, SESSION_IDS.intern
+        ip_address, user_agent = IP_ADDRESSES.intern, USER_AGENTS.intern
+        return tuple(
+            new(ActionRecord, (
+                a['action_id'],
+                user_id(a['user_id']),
+                codes[a['action_type']],
+                ts,
+                freeze(a['details']) if a.get('details') else _EMPTY_DETAILS,
+                session_id(a.get('session_id')),
+                ip_address(a.get('ip_address')),
+                user_agent(a.get('user_agent'))
+            ))
+            for a, ts in zip(actions, timestamps)
+        )
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+def encode_record(record: ActionRecord) -> Dict[str, Any]:
+    """还原为 user_actions.json 中的字典结构"""
+    return {
+        'action_id': record.action_id,
+        'user_id': record.user_id,
+        'action_type': record.action_type.value,
+        'timestamp': record.timestamp.isoformat(),
+        'details': thaw(record.details),
+        'session_id': record.session_id,
+        'ip_address': record.ip_address,
+        'user_agent': record.user_agent
+    }
+
+_cache: 'OrderedDict[str, Tuple[Tuple[int, int], Tuple[ActionRecord, ...]]]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+def load_actions(path: str) -> Tuple[ActionRecord, ...]:
+    """读取并解码行为文件；文件未变化 (修改时间和大小相同) 时直接返回缓存的解码结果
+
+    只保留最近使用的 MAX_CACHED_FILES 个文件的解码结果，文件变化后旧结果立即被替换。
+    """
+    if not os.path.exists(path):
+        return ()
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == version:
+            _cache.move_to_end(path)
+            return cached[1]
+
+        # 先丢弃旧版本，解码期间不同时持有两份结果
+        _cache.pop(path, None)
+        with open(path, 'rb') as f:
+            records = decode_actions(f.read())
+        _cache[path] = (version, records)
+        while len(_cache) > MAX_CACHED_FILES:
+            _cache.popitem(last=False)
+        return records
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+行为日志异步批量写入
+Write-behind Action Logger - batched, non-blocking user action logging
+
+请求处理线程只把行为记录放入有界的内存缓冲区，后台线程按条数或时间间隔
+成批写入存储；落盘 (fsync) 的时机由持久化级别决定，缓冲区满时按配置短暂阻塞
+或丢弃，请求处理永远不会等待磁盘I/O。
+
+SQLiteUserDatabase.start_action_logger(listeners=[...]) 启用后，log_user_action
+经由本模块写入，并在每批写入后通知各分析模块的 observe_batch。
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from user_system.models import ActionType, UserAction
+
+try:
+    import fcntl
+except ImportError:     # Windows：没有fcntl时只依赖原子替换
+    fcntl = None
+
+# 持久化级别
+DURABILITY_NONE = 'none'        # 只写入操作系统缓存
+DURABILITY_BATCH = 'batch'      # 每批写入后fsync
+DURABILITY_LEVELS = (DURABILITY_NONE, DURABILITY_BATCH)
+
+def action_to_record(action: Any) -> Dict[str, Any]:
+    """UserAction 转换为与 user_actions.json 相同结构的字典"""
+    data = dict(action) if isinstance(action, dict) else dict(vars(action))
+    if isinstance(data.get('timestamp'), datetime):
+        data['timestamp'] = data['timestamp'].isoformat()
+    if isinstance(data.get('action_type'), ActionType):
+        data['action_type'] = data['action_type'].value
+    return data
+
+class JSONFileActionSink:
+    """写入 user_actions.json：每批只重写一次文件 (而不是每条记录一次)
+
+    每批都在文件锁内重新读取当前内容再追加，不缓存文件内容，
+    其他同样持有该锁的写入者 (包括其他进程中的本类实例) 写入的记录不会被覆盖；
+    写入失败时文件保持原样，该批记录不会混入下一批。
+    """
+
+    def __init__(self, actions_file: str):
+        self.actions_file = actions_file
+        self.lock_file = actions_file + '.lock'
+
+    @contextmanager
+    def _locked(self):
+        with open(self.lock_file, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def write_batch(self, records: List[Dict[str, Any]], fsync: bool):
+        with self._locked():
+            actions: List[Dict[str, Any]] = []
+            if os.path.exists(self.actions_file):
+                with open(self.actions_file, 'r', encoding='utf-8') as f:
+                    actions = json.load(f).get('actions', [])
+            actions.extend(records)
+
+            tmp_path = f"{self.actions_file}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'actions': actions}, f, ensure_ascii=False, indent=2)
+                    if fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                os.replace(tmp_path, self.actions_file)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+class SegmentActionSink:
+    """追加写入按大小轮转的NDJSON日志段 (segment-<序号>.ndjson)，供快照增量构建使用"""
+
+    def __init__(self, segment_dir: str, max_segment_bytes: int = 64 * 1024 * 1024):
+        self.segment_dir = segment_dir
+        self.max_segment_bytes = max_segment_bytes
+        os.makedirs(segment_dir, exist_ok=True)
+        existing = sorted(name for name in os.listdir(segment_dir) if name.endswith('.ndjson'))
+        self._sequence = int(existing[-1][len('segment-'):-len('.ndjson')]) if existing else 0
+
+    @property
+    def current_path(self) -> str:
+        return os.path.join(self.segment_dir, f"segment-{self._sequence:08d}.ndjson")
+
+    def write_batch(self, records: List[Dict[str, Any]], fsync: bool):
+        path = self.current_path
+        if os.path.exists(path) and os.path.getsize(path) >= self.max_segment_bytes:
+            self._sequence += 1
+            path = self.current_path
+
+        payload = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(payload)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+class DatabaseActionSink:
+    """写入实现了 log_user_actions 的数据库 (如 SQLiteUserDatabase)"""
+
+    def __init__(self, db: Any):
+        self.db = db
+
+    def write_batch(self, records: List[Dict[str, Any]], fsync: bool):
+        self.db.log_user_actions(records, durable=fsync)
+
+class WriteBehindActionLogger:
+    """异步批量行为日志"""
+
+    def __init__(self, sink: Any, capacity: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, durability: str = DURABILITY_BATCH,
+                 block_timeout: float = 0.01,
+                 listeners: Optional[List[Callable[[List[Dict[str, Any]]], None]]] = None):
+        """
+        Args:
+            sink: 存储目标，需提供 write_batch(records, fsync)
+            capacity: 缓冲区容量 (条)
+            batch_size: 缓冲区累计到这么多条时立即写入
+            flush_interval: 最长写入间隔 (秒)
+            durability: 持久化级别，'none' 或 'batch'
+            block_timeout: 缓冲区满时调用方最多等待的秒数，超时后丢弃该记录并计数
+            listeners: 每批写入成功后在后台线程中调用，参数为该批记录 (如 SearchTrends.observe_batch)
+        """
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"未知的持久化级别: {durability}")
+
+        self.sink = sink
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.block_timeout = block_timeout
+        self.listeners = list(listeners or [])
+
+        self._buffer: deque = deque()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._has_batch = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._closed = False
+
+        self.stats = {'logged': 0, 'written': 0, 'dropped': 0, 'batches': 0, 'errors': 0}
+
+        self._worker = threading.Thread(target=self._run, name="action-logger", daemon=True)
+        self._worker.start()
+
+    def log(self, user_id: str, action_type: ActionType, details: Optional[Dict[str, Any]] = None,
+            session_id: Optional[str] = None, ip_address: Optional[str] = None,
+            user_agent: Optional[str] = None) -> UserAction:
+        """记录用户行为 (只入队，不等待写盘)"""
+        action = UserAction(
+            action_id=str(uuid.uuid4()),
+            user_id=user_id,
+            action_type=action_type,
+            timestamp=datetime.now(),
+            details=details or {},
+            session_id=session_id,
+            ip_address=ip_address,
+            user_agent=user_agent
+        )
+        self.enqueue(action)
+        return action
+
+    def enqueue(self, action: Any) -> bool:
+        """放入缓冲区；缓冲区满且等待超时时丢弃，返回是否入队成功"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("行为日志已关闭")
+            if len(self._buffer) >= self.capacity:
+                # 背压：唤醒写入线程，并短暂等待空间
+                self._has_batch.notify()
+                self._not_full.wait_for(lambda: len(self._buffer) < self.capacity, self.block_timeout)
+                if len(self._buffer) >= self.capacity:
+                    self.stats['dropped'] += 1
+                    return False
+
+            self._buffer.append(action)
+            self.stats['logged'] += 1
+            if len(self._buffer) >= self.batch_size:
+                self._has_batch.notify()
+            return True
+
+    def _take_batch(self) -> List[Any]:
+        batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+        self._not_full.notify_all()
+        return batch
+
+    def _write(self, batch: List[Any]):
+        records = [action_to_record(a) for a in batch]
+        try:
+            self.sink.write_batch(records, self.durability == DURABILITY_BATCH)
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"行为日志写入失败，丢弃 {len(batch)} 条记录: {e}", file=sys.stderr)
+            return
+        self.stats['written'] += len(batch)
+        self.stats['batches'] += 1
+
+        for listener in self.listeners:
+            try:
+                listener(records)
+            except Exception as e:
+                print(f"行为日志监听器出错: {e}", file=sys.stderr)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and len(self._buffer) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._has_batch.wait(remaining)
+                if self._closed and not self._buffer:
+                    return
+            self._drain_once()
+
+    def _drain_once(self) -> bool:
+        """取出并写入一批，批次按入队顺序写出；返回是否写了记录"""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._take_batch()
+            if batch:
+                self._write(batch)
+        return bool(batch)
+
+    def flush(self):
+        """同步写出当前缓冲区中的全部记录 (用于测试和停机)"""
+        while self._drain_once():
+            pass
+
+    def close(self):
+        """停止接收新记录，写出剩余记录后退出后台线程"""
+        with self._lock:
+            self._closed = True
+            self._has_batch.notify()
+        self._worker.join()
+        self.flush()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+行为记录扫描接口
+Action Scan API - filter and projection pushdown for user actions
+
+scan_actions 把时间范围、行为类型、用户和字段投影交给存储层处理，返回迭代器；
+存储层自身实现了 scan_actions (如 SQLiteUserDatabase) 时直接调用，
+否则在 action_codec 解码出的不可变记录上按同样的语义过滤。
+user_code / session_code 是字典编码的虚拟字段，由存储层返回的字符串映射为
+共享字典中的整数ID，分析代码可以直接在整数上做集合和分组运算。
+"""
+
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.action_codec import ActionRecord, code_of, load_actions, to_timestamp
+from database.string_dictionary import DICTIONARIES, SESSION_IDS, USER_IDS, StringDictionary
+from user_system.models import ActionType
+
+ACTION_FIELDS = ('action_id', 'user_id', 'action_type', 'timestamp', 'details', 'session_id', 'ip_address', 'user_agent')
+
+# 字典编码的虚拟字段：字段名 -> (源字段, 共享字典)
+ENCODED_FIELDS: Dict[str, Tuple[str, StringDictionary]] = {
+    'user_code': ('user_id', USER_IDS),
+    'session_code': ('session_id', SESSION_IDS),
+}
+
+def validate_columns(columns: Optional[Sequence[str]], encoded: bool = False) -> Sequence[str]:
+    """检查投影字段，未指定时返回全部字段；encoded 表示允许虚拟字段"""
+    if columns is None:
+        return ACTION_FIELDS
+    unknown = [c for c in columns if c not in ACTION_FIELDS and not (encoded and c in ENCODED_FIELDS)]
+    if unknown:
+        raise ValueError(f"未知的行为字段: {unknown}")
+    return tuple(columns)
+
+def type_values(types: Optional[Iterable[Any]]) -> Optional[set]:
+    """行为类型统一为字符串值集合"""
+    if types is None:
+        return None
+    return {t.value if isinstance(t, ActionType) else t for t in types}
+
+def convert_field(column: str, value: Any) -> Any:
+    """存储值转换为模型中的类型：timestamp -> datetime，action_type -> ActionType，
+    用户ID等重复字符串经共享字典规范化"""
+    if column == 'timestamp' and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if column == 'action_type' and isinstance(value, str):
+        return ActionType(value)
+    if column in DICTIONARIES:
+        return DICTIONARIES[column].intern(value)
+    return value
+
+def _split_columns(columns: Optional[Sequence[str]]) -> Tuple[Optional[Sequence[str]], Sequence[str]]:
+    """拆出虚拟字段，返回 (需要存储层返回的字段, 虚拟字段)"""
+    if columns is None:
+        return None, ()
+    encoded = [c for c in columns if c in ENCODED_FIELDS]
+    if not encoded:
+        return columns, ()
+    storage = [ENCODED_FIELDS[c][0] if c in ENCODED_FIELDS else c for c in columns]
+    return tuple(dict.fromkeys(storage)), encoded
+
+def _encode_rows(rows: Iterator[Dict[str, Any]], columns: Sequence[str]) -> Iterator[Dict[str, Any]]:
+    encoders = [(c, ENCODED_FIELDS[c][0], ENCODED_FIELDS[c][1].encode) if c in ENCODED_FIELDS else (c, c, None)
+                for c in columns]
+    for row in rows:
+        record = {}
+        for column, source, encode in encoders:
+            value = row[source]
+            record[column] = value if encode is None or value is None else encode(value)
+        yield record
+
+def filter_action_records(records: Iterable[ActionRecord], since: Optional[datetime] = None,
+                          until: Optional[datetime] = None, types: Optional[Iterable[Any]] = None,
+                          users: Optional[Iterable[str]] = None,
+                          columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+    """在解码后的不可变行为记录上过滤和投影 (时间比较在整数微秒上进行)"""
+    columns = validate_columns(columns, encoded=True)
+    codes = {code_of(t) for t in types} if types is not None else None
+    users = set(users) if users is not None else None
+    since_ts = to_timestamp(since) if since is not None else None
+    until_ts = to_timestamp(until) if until is not None else None
+
+    for record in records:
+        if codes is not None and record.code not in codes:
+            continue
+        if users is not None and record.user_id not in users:
+            continue
+        if since_ts is not None and record.ts < since_ts:
+            continue
+        if until_ts is not None and record.ts >= until_ts:
+            continue
+        yield {column: getattr(record, column) for column in columns}
+
+def scan_actions(db: Any, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 types: Optional[Iterable[Any]] = None, users: Optional[Iterable[str]] = None,
+                 columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+    """扫描行为记录
+
+    Args:
+        db: 存储层对象
+        since / until: 时间范围 [since, until)
+        types: 行为类型 (ActionType或其字符串值)
+        users: 用户ID
+        columns: 需要返回的字段，默认全部字段；可包含虚拟字段 user_code / session_code
+
+    Returns:
+        {字段: 值} 的迭代器，不保证顺序
+    """
+    if hasattr(db, 'scan_actions'):
+        storage_columns, encoded = _split_columns(columns)
+        rows = db.scan_actions(since=since, until=until, types=types, users=users, columns=storage_columns)
+        return _encode_rows(rows, columns) if encoded else rows
+
+    # JSON文件存储：使用按文件版本缓存的解码结果，不再每次重新解析整个文件
+    return filter_action_records(load_actions(db.actions_file), since, until, types, users, columns)
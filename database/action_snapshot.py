@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+行为日志二进制快照
+Action Snapshot - memory-mapped columnar snapshot of the action log
+
+快照文件由定长列和字符串表组成：
+    timestamps     int64   每行的时间戳 (微秒，与 action_codec 一致)
+    user_index     uint32  用户在用户表中的下标
+    action_code    uint8   ActionCode
+    session_index  uint32  会话在会话表中的下标，无会话时为 NO_SESSION
+    details        行为详情的JSON字节串，details_offsets 给出每行的起止位置
+    users / sessions 字符串表 (UTF-8字节串 + 偏移数组)
+    meta           JSON元数据，记录已经并入快照的日志段及其读取位置
+
+读取时用 mmap 映射整个文件，各列直接作为 NumPy 视图使用，不做任何拷贝；
+多个分析进程映射同一个文件时共享操作系统的页缓存。快照只追加新日志段中的
+记录，旧的列数据按块复制，不再重新解析历史日志。
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.action_codec import ACTION_TYPES, ActionRecord, code_of, thaw, to_datetime, to_timestamp
+from database.string_dictionary import SESSION_IDS, USER_IDS
+
+MAGIC = b'FACT'
+VERSION = 1
+NO_SESSION = np.uint32(0xFFFFFFFF)
+
+# (节名, dtype)；dtype为None的节是原始字节串
+SECTIONS: Tuple[Tuple[str, Optional[str]], ...] = (
+    ('timestamps', '<i8'),
+    ('user_index', '<u4'),
+    ('action_code', 'u1'),
+    ('session_index', '<u4'),
+    ('details_offsets', '<u8'),
+    ('details', None),
+    ('user_offsets', '<u8'),
+    ('users', None),
+    ('session_offsets', '<u8'),
+    ('sessions', None),
+    ('meta', None),
+)
+_HEADER = struct.Struct('<4sIQQQ' + 'QQ' * len(SECTIONS))   # magic, version, 行数, 用户数, 会话数, 各节(偏移, 长度)
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+def _pack(items: Sequence[bytes]) -> Tuple[np.ndarray, bytes]:
+    """字节串列表打包为 (偏移数组, 拼接后的字节串)"""
+    offsets = np.zeros(len(items) + 1, dtype='<u8')
+    np.cumsum([len(b) for b in items], out=offsets[1:])
+    return offsets, b''.join(items)
+
+def _string_table(strings: Sequence[str]) -> Tuple[np.ndarray, bytes]:
+    return _pack([s.encode('utf-8') for s in strings])
+
+def write_snapshot(path: str, columns: Dict[str, np.ndarray], details: Tuple[np.ndarray, bytes],
+                   users: Sequence[str], sessions: Sequence[str], meta: Dict[str, Any]):
+    """写出快照 (先写临时文件再原子替换，已映射旧文件的读者不受影响)
+
+    details 为 (偏移数组, 详情字节串)，见 _pack。
+    """
+    details_offsets, details_blob = details
+    user_offsets, user_blob = _string_table(users)
+    session_offsets, session_blob = _string_table(sessions)
+
+    payloads = {
+        'timestamps': np.ascontiguousarray(columns['timestamps'], dtype='<i8'),
+        'user_index': np.ascontiguousarray(columns['user_index'], dtype='<u4'),
+        'action_code': np.ascontiguousarray(columns['action_code'], dtype='u1'),
+        'session_index': np.ascontiguousarray(columns['session_index'], dtype='<u4'),
+        'details_offsets': np.ascontiguousarray(details_offsets, dtype='<u8'),
+        'details': details_blob,
+        'user_offsets': user_offsets,
+        'users': user_blob,
+        'session_offsets': session_offsets,
+        'sessions': session_blob,
+        'meta': json.dumps(meta, ensure_ascii=False).encode('utf-8'),
+    }
+
+    layout = []
+    offset = _align(_HEADER.size)
+    for name, _ in SECTIONS:
+        data = payloads[name]
+        length = data.nbytes if isinstance(data, np.ndarray) else len(data)
+        layout.append((offset, length))
+        offset = _align(offset + length)
+
+    header = _HEADER.pack(MAGIC, VERSION, len(payloads['timestamps']), len(users), len(sessions),
+                          *[value for pair in layout for value in pair])
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        for (name, _), (section_offset, _) in zip(SECTIONS, layout):
+            f.seek(section_offset)
+            data = payloads[name]
+            f.write(data.tobytes() if isinstance(data, np.ndarray) else data)
+        f.truncate(offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class ActionSnapshot:
+    """只读快照，所有列都是 mmap 上的 NumPy 视图"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        fields = _HEADER.unpack_from(self._mmap, 0)
+        magic, version, self.n_rows, self.n_users, self.n_sessions = fields[:5]
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"不是有效的行为快照文件: {path}")
+
+        buffer = memoryview(self._mmap)
+        self._sections = {}
+        for i, (name, dtype) in enumerate(SECTIONS):
+            offset, length = fields[5 + 2 * i], fields[6 + 2 * i]
+            view = buffer[offset:offset + length]
+            self._sections[name] = np.frombuffer(view, dtype=dtype) if dtype else view
+
+        self.timestamps: np.ndarray = self._sections['timestamps']
+        self.user_index: np.ndarray = self._sections['user_index']
+        self.action_code: np.ndarray = self._sections['action_code']
+        self.session_index: np.ndarray = self._sections['session_index']
+        self.meta: Dict[str, Any] = json.loads(bytes(self._sections['meta']) or b'{}')
+        self._users: Optional[List[str]] = None
+        self._user_lookup: Optional[Dict[str, int]] = None
+        self._user_codes: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def _string(self, table: str, index: int) -> str:
+        offsets = self._sections[f'{table[:-1]}_offsets']
+        return bytes(self._sections[table][offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+    @property
+    def users(self) -> List[str]:
+        """用户表 (首次访问时解码)"""
+        if self._users is None:
+            self._users = [USER_IDS.intern(user) for user in self._strings('users')]
+        return self._users
+
+    @property
+    def user_codes(self) -> np.ndarray:
+        """快照内的用户下标 -> 共享字典中的用户编号，self.user_codes[self.user_index] 即每行的 user_code"""
+        if self._user_codes is None:
+            self._user_codes = np.array(USER_IDS.encode_many(self.users), dtype=np.int64)
+        return self._user_codes
+
+    @property
+    def sessions(self) -> List[str]:
+        return self._strings('sessions')
+
+    def _strings(self, table: str) -> List[str]:
+        blob = bytes(self._sections[table])
+        offsets = self._sections[f'{table[:-1]}_offsets'].tolist()
+        return [blob[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+
+    def user_id(self, index: int) -> str:
+        return self.users[index]
+
+    def user_code(self, user_id: str) -> Optional[int]:
+        if self._user_lookup is None:
+            self._user_lookup = {user: i for i, user in enumerate(self.users)}
+        return self._user_lookup.get(user_id)
+
+    def session_id(self, index: int) -> Optional[str]:
+        return None if index == NO_SESSION else SESSION_IDS.intern(self._string('sessions', int(index)))
+
+    def details(self, row: int) -> Dict[str, Any]:
+        offsets = self._sections['details_offsets']
+        raw = bytes(self._sections['details'][offsets[row]:offsets[row + 1]])
+        return json.loads(raw) if raw else {}
+
+    def record(self, row: int) -> ActionRecord:
+        """还原单行 (action_id / ip_address / user_agent 不在快照中，为None)"""
+        return ActionRecord(None, self.user_id(self.user_index[row]), code_of(int(self.action_code[row])),
+                            int(self.timestamps[row]), self.details(row),
+                            self.session_id(self.session_index[row]), None, None)
+
+    def select(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+               types: Optional[Iterable[Any]] = None, users: Optional[Iterable[str]] = None) -> np.ndarray:
+        """按条件返回行号数组 (向量化过滤)"""
+        mask = np.ones(self.n_rows, dtype=bool)
+        if since is not None:
+            mask &= self.timestamps >= to_timestamp(since)
+        if until is not None:
+            mask &= self.timestamps < to_timestamp(until)
+        if types is not None:
+            mask &= np.isin(self.action_code, [int(code_of(t)) for t in types])
+        if users is not None:
+            codes = [code for code in (self.user_code(u) for u in users) if code is not None]
+            mask &= np.isin(self.user_index, codes)
+        return np.flatnonzero(mask)
+
+    def scan_actions(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                     types: Optional[Iterable[Any]] = None, users: Optional[Iterable[str]] = None,
+                     columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        """与 scan_actions 接口一致的逐行迭代 (只支持快照中存在的字段)"""
+        columns = tuple(columns or ('user_id', 'action_type', 'timestamp', 'details', 'session_id'))
+        getters = {
+            'user_id': lambda row: self.user_id(self.user_index[row]),
+            'user_code': lambda row: int(self.user_codes[self.user_index[row]]),
+            'action_type': lambda row: ACTION_TYPES[self.action_code[row]],
+            'timestamp': lambda row: to_datetime(int(self.timestamps[row])),
+            'details': self.details,
+            'session_id': lambda row: self.session_id(self.session_index[row]),
+        }
+        unknown = [c for c in columns if c not in getters]
+        if unknown:
+            raise ValueError(f"快照中没有这些字段: {unknown}")
+
+        selected = [getters[c] for c in columns]
+        for row in self.select(since, until, types, users).tolist():
+            yield {column: getter(row) for column, getter in zip(columns, selected)}
+
+    def close(self):
+        self._sections.clear()
+        self.timestamps = self.user_index = self.action_code = self.session_index = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # 仍有外部持有的视图，交给垃圾回收释放
+            pass
+
+def _encode_rows(records: Iterable[Any], users: Dict[str, int], sessions: Dict[str, int],
+                 columns: Dict[str, List[int]], details: List[bytes]):
+    """把记录 (ActionRecord 或 user_actions.json 中的字典) 追加到列缓冲区"""
+    for record in records:
+        if isinstance(record, dict):
+            user_id, session_id = record['user_id'], record.get('session_id')
+            code, ts = code_of(record['action_type']), to_timestamp(record['timestamp'])
+            record_details = record.get('details')
+        else:
+            user_id, session_id, code, ts, record_details = (
+                record.user_id, record.session_id, record.code, record.ts, record.details)
+
+        columns['timestamps'].append(ts)
+        columns['user_index'].append(users.setdefault(user_id, len(users)))
+        columns['action_code'].append(int(code))
+        columns['session_index'].append(
+            int(NO_SESSION) if session_id is None else sessions.setdefault(session_id, len(sessions)))
+        details.append(json.dumps(thaw(record_details), ensure_ascii=False).encode('utf-8')
+                       if record_details else b'')
+
+def build_snapshot(path: str, records: Iterable[Any], meta: Optional[Dict[str, Any]] = None):
+    """由完整的行为记录构建快照"""
+    users: Dict[str, int] = {}
+    sessions: Dict[str, int] = {}
+    columns = {name: [] for name in ('timestamps', 'user_index', 'action_code', 'session_index')}
+    details: List[bytes] = []
+    _encode_rows(records, users, sessions, columns, details)
+    write_snapshot(path, {k: np.asarray(v) for k, v in columns.items()}, _pack(details),
+                   list(users), list(sessions), meta or {'segments': {}})
+
+def _read_segments(segment_dir: str, consumed: Dict[str, int]) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """读取日志段中尚未并入快照的完整行，返回 (记录, 新的读取位置)"""
+    positions = dict(consumed)
+    records = []
+    for name in sorted(os.listdir(segment_dir)):
+        if not name.endswith('.ndjson'):
+            continue
+        path = os.path.join(segment_dir, name)
+        start = consumed.get(name, 0)
+        if os.path.getsize(path) <= start:
+            continue
+        with open(path, 'rb') as f:
+            f.seek(start)
+            data = f.read()
+        complete = data.rfind(b'\n') + 1        # 正在写入的最后一行留到下次
+        for line in data[:complete].splitlines():
+            if line.strip():
+                records.append(json.loads(line))
+        positions[name] = start + complete
+    return records, positions
+
+def update_snapshot(path: str, segment_dir: str) -> int:
+    """把日志段中的新记录增量并入快照，返回新增的行数
+
+    已有的列按块复制，字符串表在原有基础上扩展，历史记录不会被重新解析。
+    快照不存在时从全部日志段构建。
+    """
+    if os.path.exists(path):
+        snapshot = ActionSnapshot(path)
+        consumed = snapshot.meta.get('segments', {})
+    else:
+        snapshot, consumed = None, {}
+
+    new_records, positions = _read_segments(segment_dir, consumed)
+    if not new_records:
+        if snapshot is not None:
+            snapshot.close()
+        else:
+            build_snapshot(path, [], {'segments': positions})
+        return 0
+
+    users = {user: i for i, user in enumerate(snapshot.users)} if snapshot else {}
+    sessions = {session: i for i, session in enumerate(snapshot.sessions)} if snapshot else {}
+    columns = {name: [] for name in ('timestamps', 'user_index', 'action_code', 'session_index')}
+    details: List[bytes] = []
+    _encode_rows(new_records, users, sessions, columns, details)
+
+    new_offsets, new_blob = _pack(details)
+    if snapshot is not None:
+        merged = {}
+        for name, values in columns.items():
+            existing = getattr(snapshot, name)
+            merged[name] = np.concatenate([existing, np.asarray(values, dtype=existing.dtype)])
+        old_offsets = snapshot._sections['details_offsets']
+        packed = (np.concatenate([old_offsets, new_offsets[1:] + old_offsets[-1]]),
+                  bytes(snapshot._sections['details']) + new_blob)
+        meta = dict(snapshot.meta)
+    else:
+        merged = {name: np.asarray(values) for name, values in columns.items()}
+        packed = (new_offsets, new_blob)
+        meta = {}
+
+    meta['segments'] = positions
+    write_snapshot(path, merged, packed, list(users), list(sessions), meta)
+    if snapshot is not None:
+        snapshot.close()
+    return len(new_records)
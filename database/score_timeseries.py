@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+自由度评分时间序列存储
+Freedom Score Time-Series Store - append-only per-user series with downsampling
+
+每个用户一个只追加的NDJSON文件，近期保留原始评估点，较早的点自动降采样为
+按天、按周的 min/max/avg 聚合桶。三个层级的时间范围互不重叠且各自有序，
+区间查询通过二分定位，耗时与返回的点数成正比。降采样之后再追加的较早的点
+直接计入对应的日桶或周桶，不会破坏层级之间的顺序。
+
+评估历史从用户档案中移出后，user_profiles.json 只保留 last_assessment_score /
+last_assessment_date 和最近一次评估，档案文档保持小而快。原始点保存评估输入
+(input_data)，降采样时被聚合的原始点转存到 inputs/ 下的归档文件，输入不会丢失，
+迁移时也能据此去重。
+"""
+
+import json
+import os
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from hashlib import sha1
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 聚合层级及其桶宽
+RESOLUTIONS = ('day', 'week')
+
+@dataclass
+class ScorePoint:
+    """原始评估点"""
+    timestamp: datetime
+    score: float
+    individual_scores: Optional[Dict[str, float]] = None
+    input_data: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            'timestamp': self.timestamp.isoformat(),
+            'resolution': 'raw',
+            'score': self.score,
+            'individual_scores': self.individual_scores
+        }
+        if self.input_data is not None:
+            result['input_data'] = self.input_data
+        return result
+
+    def to_record(self) -> Dict[str, Any]:
+        """文件中的紧凑记录"""
+        record = {'t': self.timestamp.isoformat(), 's': self.score}
+        if self.individual_scores:
+            record['d'] = self.individual_scores
+        if self.input_data is not None:
+            record['i'] = self.input_data
+        return record
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> 'ScorePoint':
+        return cls(datetime.fromisoformat(record['t']), record['s'], record.get('d'), record.get('i'))
+
+@dataclass
+class ScoreBucket:
+    """降采样后的聚合桶"""
+    start: datetime
+    count: int
+    min: float
+    max: float
+    total: float
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def add(self, score: float):
+        self.count += 1
+        self.total += score
+        self.min = min(self.min, score)
+        self.max = max(self.max, score)
+
+    def merge(self, other: 'ScoreBucket'):
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def to_dict(self, resolution: str) -> Dict[str, Any]:
+        return {
+            'timestamp': self.start.isoformat(),
+            'resolution': resolution,
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'avg': self.avg
+        }
+
+def _bucket_start(timestamp: datetime, resolution: str) -> datetime:
+    day = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == 'day':
+        return day
+    return day - timedelta(days=day.weekday())   # 周一为一周的开始
+
+@dataclass
+class _UserSeries:
+    """单个用户的三层序列，每层都按时间有序，并保留时间戳列表供二分查找"""
+    raw: List[ScorePoint] = field(default_factory=list)
+    raw_times: List[datetime] = field(default_factory=list)
+    buckets: Dict[str, List[ScoreBucket]] = field(default_factory=lambda: {r: [] for r in RESOLUTIONS})
+    bucket_times: Dict[str, List[datetime]] = field(default_factory=lambda: {r: [] for r in RESOLUTIONS})
+    appended_since_compact: int = 0
+
+    def add_point(self, point: ScorePoint):
+        if not self.raw_times or point.timestamp >= self.raw_times[-1]:
+            self.raw.append(point)
+            self.raw_times.append(point.timestamp)
+        else:
+            index = bisect_right(self.raw_times, point.timestamp)
+            self.raw.insert(index, point)
+            self.raw_times.insert(index, point.timestamp)
+
+    def set_buckets(self, resolution: str, buckets: Iterable[ScoreBucket]):
+        ordered = sorted(buckets, key=lambda b: b.start)
+        self.buckets[resolution] = ordered
+        self.bucket_times[resolution] = [b.start for b in ordered]
+
+    def floor(self, resolution: str) -> Optional[datetime]:
+        """该层级及更粗层级覆盖到的时间 (不含)，更细层级的点必须不早于它"""
+        floors = []
+        if self.bucket_times['week']:
+            floors.append(self.bucket_times['week'][-1] + timedelta(days=7))
+        if resolution == 'day' and self.bucket_times['day']:
+            floors.append(self.bucket_times['day'][-1] + timedelta(days=1))
+        return max(floors) if floors else None
+
+    def tier_of(self, timestamp: datetime) -> str:
+        """时间戳所属的层级：早于日桶/周桶覆盖范围的点归入对应的聚合层"""
+        week_floor = self.floor('week')
+        if week_floor is not None and timestamp < week_floor:
+            return 'week'
+        day_floor = self.floor('day')
+        if day_floor is not None and timestamp < day_floor:
+            return 'day'
+        return 'raw'
+
+    def add_to_bucket(self, resolution: str, bucket: ScoreBucket):
+        times = self.bucket_times[resolution]
+        index = bisect_left(times, bucket.start)
+        if index < len(times) and times[index] == bucket.start:
+            self.buckets[resolution][index].merge(bucket)
+        else:
+            self.buckets[resolution].insert(index, bucket)
+            times.insert(index, bucket.start)
+
+class ScoreTimeSeries:
+    """评分时间序列存储"""
+
+    def __init__(self, data_dir: str = "data/score_timeseries", raw_retention_days: int = 30,
+                 daily_retention_days: int = 180, compact_every: int = 256, max_cached_users: int = 1024):
+        """
+        Args:
+            data_dir: 序列文件目录，每个用户一个文件
+            raw_retention_days: 原始点保留天数，更早的点聚合为日桶
+            daily_retention_days: 日桶保留天数，更早的日桶聚合为周桶
+            compact_every: 每追加多少个点检查一次是否需要降采样
+            max_cached_users: 内存中最多缓存的用户序列数 (最近最少使用的先淘汰)
+        """
+        self.data_dir = data_dir
+        self.inputs_dir = os.path.join(data_dir, "inputs")
+        self.raw_retention = timedelta(days=raw_retention_days)
+        self.daily_retention = timedelta(days=daily_retention_days)
+        self.compact_every = compact_every
+        self.max_cached_users = max_cached_users
+        self._series: 'OrderedDict[str, _UserSeries]' = OrderedDict()
+        self._lock = threading.RLock()
+        os.makedirs(data_dir, exist_ok=True)
+
+    def _path(self, user_id: str) -> str:
+        if re.fullmatch(r'[A-Za-z0-9_.-]{1,128}', user_id) and not user_id.startswith('.'):
+            name = user_id
+        else:
+            name = 'u_' + sha1(user_id.encode('utf-8')).hexdigest()
+        return os.path.join(self.data_dir, f"{name}.ndjson")
+
+    def _inputs_path(self, user_id: str) -> str:
+        """降采样时转存评估输入的归档文件"""
+        return os.path.join(self.inputs_dir, os.path.basename(self._path(user_id)))
+
+    def _load(self, user_id: str) -> _UserSeries:
+        series = self._series.get(user_id)
+        if series is not None:
+            self._series.move_to_end(user_id)
+            return series
+
+        series = _UserSeries()
+        buckets: Dict[str, Dict[datetime, ScoreBucket]] = {r: {} for r in RESOLUTIONS}
+        path = self._path(user_id)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    resolution = record.get('r')
+                    if resolution is None:
+                        series.add_point(ScorePoint.from_record(record))
+                    else:
+                        timestamp = datetime.fromisoformat(record['t'])
+                        bucket = ScoreBucket(timestamp, record['n'], record['min'], record['max'], record['sum'])
+                        if timestamp in buckets[resolution]:
+                            buckets[resolution][timestamp].merge(bucket)
+                        else:
+                            buckets[resolution][timestamp] = bucket
+        for resolution in RESOLUTIONS:
+            series.set_buckets(resolution, buckets[resolution].values())
+
+        self._series[user_id] = series
+        while len(self._series) > self.max_cached_users:
+            self._series.popitem(last=False)
+        return series
+
+    def append(self, user_id: str, score: float, timestamp: Optional[datetime] = None,
+               individual_scores: Optional[Dict[str, float]] = None,
+               input_data: Optional[Dict[str, Any]] = None):
+        """追加一个评估点 (只在文件末尾追加一行)
+
+        早于日桶/周桶覆盖范围的点 (如降采样之后补录的历史评估) 直接计入对应的聚合桶，
+        原始记录转存到归档文件。
+        """
+        point = ScorePoint(timestamp or datetime.now(), float(score), individual_scores, input_data)
+
+        with self._lock:
+            series = self._load(user_id)
+            resolution = series.tier_of(point.timestamp)
+            if resolution == 'raw':
+                series.add_point(point)
+                record = point.to_record()
+            else:
+                self._archive(user_id, [point.to_record()])
+                bucket = ScoreBucket(_bucket_start(point.timestamp, resolution), 1, point.score, point.score,
+                                     point.score)
+                series.add_to_bucket(resolution, bucket)
+                record = self._bucket_record(resolution, bucket)
+            series.appended_since_compact += 1
+            with open(self._path(user_id), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+            if series.appended_since_compact >= self.compact_every:
+                self.compact(user_id)
+
+    def compact(self, user_id: str, now: Optional[datetime] = None) -> bool:
+        """把超出保留期的原始点降为日桶、日桶降为周桶，并重写该用户的文件
+
+        截止时间对齐到自然日，保证每个桶只来自同一层级。返回是否发生了降采样。
+        """
+        now = now or datetime.now()
+        raw_cutoff = _bucket_start(now - self.raw_retention, 'day')
+        daily_cutoff = _bucket_start(now - self.daily_retention, 'week')
+
+        with self._lock:
+            series = self._load(user_id)
+            series.appended_since_compact = 0
+
+            expired_raw = bisect_left(series.raw_times, raw_cutoff)
+            expired_daily = bisect_left(series.bucket_times['day'], daily_cutoff)
+            if not expired_raw and not expired_daily:
+                return False
+
+            # 聚合前先把原始点转存到归档文件；重写前中断时会重复归档，读取时按时间戳去重
+            self._archive(user_id, [point.to_record() for point in series.raw[:expired_raw]])
+
+            daily = {b.start: b for b in series.buckets['day']}
+            for point in series.raw[:expired_raw]:
+                start = _bucket_start(point.timestamp, 'day')
+                if start in daily:
+                    daily[start].add(point.score)
+                else:
+                    daily[start] = ScoreBucket(start, 1, point.score, point.score, point.score)
+            del series.raw[:expired_raw]
+            del series.raw_times[:expired_raw]
+
+            weekly = {b.start: b for b in series.buckets['week']}
+            for start in [s for s in daily if s < daily_cutoff]:
+                bucket = daily.pop(start)
+                week = _bucket_start(start, 'week')
+                if week in weekly:
+                    weekly[week].merge(bucket)
+                else:
+                    weekly[week] = ScoreBucket(week, bucket.count, bucket.min, bucket.max, bucket.total)
+
+            series.set_buckets('day', daily.values())
+            series.set_buckets('week', weekly.values())
+            self._rewrite(user_id, series)
+            return True
+
+    def _archive(self, user_id: str, records: List[Dict[str, Any]]):
+        if not records:
+            return
+        os.makedirs(self.inputs_dir, exist_ok=True)
+        with open(self._inputs_path(user_id), 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+
+    @staticmethod
+    def _bucket_record(resolution: str, bucket: ScoreBucket) -> Dict[str, Any]:
+        return {'r': resolution, 't': bucket.start.isoformat(), 'n': bucket.count,
+                'min': bucket.min, 'max': bucket.max, 'sum': bucket.total}
+
+    def _rewrite(self, user_id: str, series: _UserSeries):
+        path = self._path(user_id)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for resolution in reversed(RESOLUTIONS):
+                for b in series.buckets[resolution]:
+                    f.write(json.dumps(self._bucket_record(resolution, b)) + '\n')
+            for point in series.raw:
+                f.write(json.dumps(point.to_record(), ensure_ascii=False) + '\n')
+        os.replace(tmp_path, path)
+
+    def query(self, user_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按时间顺序返回 [start, end) 内的点：较早的周桶、日桶在前，近期原始点在后
+
+        limit 给出时只返回最近的 limit 个点。
+        """
+        with self._lock:
+            series = self._load(user_id)
+            layers: List[Tuple[str, List[Any], List[datetime]]] = [
+                ('week', series.buckets['week'], series.bucket_times['week']),
+                ('day', series.buckets['day'], series.bucket_times['day']),
+                ('raw', series.raw, series.raw_times)
+            ]
+
+            slices = []
+            for resolution, items, times in layers:
+                lo = bisect_left(times, start) if start else 0
+                hi = bisect_left(times, end) if end else len(times)
+                slices.append((resolution, items, lo, hi))
+
+            if limit is not None:
+                # 从最近的层级往前截取，不遍历被丢弃的点
+                remaining = limit
+                trimmed = []
+                for resolution, items, lo, hi in reversed(slices):
+                    take = max(min(remaining, hi - lo), 0)
+                    trimmed.append((resolution, items, hi - take, hi))
+                    remaining -= take
+                slices = list(reversed(trimmed))
+
+            result = []
+            for resolution, items, lo, hi in slices:
+                if resolution == 'raw':
+                    result.extend(items[i].to_dict() for i in range(lo, hi))
+                else:
+                    result.extend(items[i].to_dict(resolution) for i in range(lo, hi))
+            return result
+
+    def _archived_points(self, user_id: str) -> List[ScorePoint]:
+        """归档的评估点，按时间戳去重 (同一时间戳以最后写入的为准)"""
+        path = self._inputs_path(user_id)
+        if not os.path.exists(path):
+            return []
+        points: Dict[datetime, ScorePoint] = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    point = ScorePoint.from_record(json.loads(line))
+                    points[point.timestamp] = point
+        return list(points.values())
+
+    def assessment_inputs(self, user_id: str, start: Optional[datetime] = None,
+                          end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """按时间顺序返回 [start, end) 内带评估输入的点 (包括已降采样、转存到归档的点)"""
+        with self._lock:
+            points = self._archived_points(user_id) + self._load(user_id).raw
+        return [
+            point.to_dict() for point in sorted(points, key=lambda p: p.timestamp)
+            if point.input_data is not None
+            and (start is None or point.timestamp >= start) and (end is None or point.timestamp < end)
+        ]
+
+    def timestamps(self, user_id: str) -> set:
+        """已保存的原始点时间戳 (含归档)，供迁移去重"""
+        with self._lock:
+            return {p.timestamp for p in self._archived_points(user_id)} | set(self._load(user_id).raw_times)
+
+    def latest(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """最近一个点"""
+        points = self.query(user_id, limit=1)
+        return points[0] if points else None
+
+    def progress(self, user_id: str, days: int = 30, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """最近days天的进步情况 (首尾点的分数变化)"""
+        now = now or datetime.now()
+        points = self.query(user_id, start=now - timedelta(days=days))
+        if not points:
+            return {'user_id': user_id, 'days': days, 'points': 0, 'change': 0.0}
+
+        first = points[0].get('score', points[0].get('avg'))
+        last = points[-1].get('score', points[-1].get('avg'))
+        return {
+            'user_id': user_id,
+            'days': days,
+            'points': len(points),
+            'start_score': first,
+            'end_score': last,
+            'change': last - first
+        }
+
+def migrate_profile_history(profiles_file: str, store: ScoreTimeSeries) -> int:
+    """把 user_profiles.json 中各档案的 assessment_history 迁入时间序列存储
+
+    每条评估连同 input_data 一起写入序列；档案中只保留最近一次评估
+    (完整记录) 以及 last_assessment_score / last_assessment_date。
+    按时间戳去重，中断后重新运行不会产生重复的点。返回新迁移的评估点数量。
+    """
+    with open(profiles_file, 'r', encoding='utf-8') as f:
+        profiles = json.load(f)
+
+    migrated = 0
+    changed = False
+    for user_id, profile in profiles.items():
+        history = profile.get('assessment_history') or []
+        if not history:
+            continue
+        existing = store.timestamps(user_id)
+        for entry in history:
+            timestamp = datetime.fromisoformat(entry['timestamp'])
+            if timestamp in existing:
+                continue
+            store.append(user_id, entry['overall_score'], timestamp, entry.get('individual_scores'),
+                         entry.get('input_data'))
+            existing.add(timestamp)
+            migrated += 1
+
+        latest = max(history, key=lambda e: e['timestamp'])
+        if len(history) > 1 or profile.get('last_assessment_date') != latest['timestamp']:
+            profile['last_assessment_score'] = latest['overall_score']
+            profile['last_assessment_date'] = latest['timestamp']
+            profile['assessment_history'] = [latest]
+            changed = True
+
+    if changed:
+        tmp_path = profiles_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(profiles, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, profiles_file)
+    return migrated
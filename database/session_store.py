@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+会话存储
+Session Store - in-memory session lookup with expiry heap and disk snapshots
+
+会话保存在内存哈希表中，每次鉴权只做一次字典查找和时间比较；
+过期由最小堆驱动 (空闲超时和绝对超时取较早者)，后台线程定期清理并把
+存活的会话以 user_sessions.json 相同的结构写出快照，重启时从快照恢复。
+每个用户的会话数有上限，超出时淘汰最早创建的会话，内存占用有界。
+"""
+
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.string_dictionary import USER_AGENTS, USER_IDS
+
+class Session:
+    """会话 (时间均为Unix时间戳)"""
+
+    __slots__ = ('session_id', 'user_id', 'created_at', 'last_activity', 'ip_address', 'user_agent')
+
+    def __init__(self, session_id: str, user_id: str, created_at: float, last_activity: float,
+                 ip_address: Optional[str] = None, user_agent: Optional[str] = None):
+        self.session_id = session_id
+        self.user_id = USER_IDS.intern(user_id)
+        self.created_at = created_at
+        self.last_activity = last_activity
+        self.ip_address = ip_address
+        self.user_agent = USER_AGENTS.intern(user_agent)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """与 user_sessions.json 中的记录结构一致"""
+        return {
+            'session_id': self.session_id,
+            'user_id': self.user_id,
+            'created_at': datetime.fromtimestamp(self.created_at).isoformat(),
+            'last_activity': datetime.fromtimestamp(self.last_activity).isoformat(),
+            'ip_address': self.ip_address,
+            'user_agent': self.user_agent,
+            'is_active': True
+        }
+
+class SessionStore:
+    """会话存储"""
+
+    def __init__(self, snapshot_path: Optional[str] = "data/user_sessions.json",
+                 idle_timeout: float = 7 * 24 * 3600, absolute_timeout: float = 30 * 24 * 3600,
+                 max_sessions_per_user: int = 5, snapshot_interval: float = 60.0):
+        """
+        Args:
+            snapshot_path: 快照文件，None表示只在内存中保存
+            idle_timeout: 空闲超时 (秒)，超过这段时间没有访问的会话失效
+            absolute_timeout: 绝对超时 (秒)，从创建起超过这段时间的会话失效
+            max_sessions_per_user: 每个用户的最大会话数
+            snapshot_interval: 后台清理和写快照的间隔 (秒)
+        """
+        self.snapshot_path = snapshot_path
+        self.idle_timeout = idle_timeout
+        self.absolute_timeout = absolute_timeout
+        self.max_sessions_per_user = max_sessions_per_user
+        self.snapshot_interval = snapshot_interval
+
+        self._sessions: Dict[str, Session] = {}
+        self._by_user: Dict[str, 'OrderedDict[str, None]'] = {}
+        # (预计过期时间, session_id)；访问会话时不更新堆，出堆时再按最新活动时间重新计算
+        self._expiry_heap: List[tuple] = []
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+        if snapshot_path and os.path.exists(snapshot_path):
+            self._load_snapshot()
+
+    def _deadline(self, session: Session) -> float:
+        return min(session.last_activity + self.idle_timeout, session.created_at + self.absolute_timeout)
+
+    def _add(self, session: Session) -> List[str]:
+        """加入会话，返回因超出用户上限而被淘汰的会话ID"""
+        self._sessions[session.session_id] = session
+        user_sessions = self._by_user.setdefault(session.user_id, OrderedDict())
+        user_sessions[session.session_id] = None
+        heapq.heappush(self._expiry_heap, (self._deadline(session), session.session_id))
+
+        evicted = []
+        while len(user_sessions) > self.max_sessions_per_user:
+            oldest, _ = user_sessions.popitem(last=False)
+            self._sessions.pop(oldest, None)
+            evicted.append(oldest)
+        return evicted
+
+    def _remove(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            user_sessions = self._by_user.get(session.user_id)
+            if user_sessions is not None:
+                user_sessions.pop(session_id, None)
+                if not user_sessions:
+                    del self._by_user[session.user_id]
+            self._dirty = True
+        return session
+
+    def create_session(self, user_id: str, ip_address: Optional[str] = None,
+                       user_agent: Optional[str] = None) -> Session:
+        """创建会话，用户会话数超出上限时淘汰最早的会话"""
+        now = time.time()
+        session = Session(f"session_{uuid.uuid4().hex[:16]}", user_id, now, now, ip_address, user_agent)
+        with self._lock:
+            self._add(session)
+            self._dirty = True
+        return session
+
+    def validate(self, session_id: str, touch: bool = True) -> Optional[Session]:
+        """校验会话：有效时返回会话 (并刷新最后活动时间)，无效或已过期返回None"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+
+        now = time.time()
+        if now >= session.last_activity + self.idle_timeout or now >= session.created_at + self.absolute_timeout:
+            with self._lock:
+                self._remove(session_id)
+            return None
+
+        if touch:
+            session.last_activity = now
+            self._dirty = True
+        return session
+
+    def get_user_sessions(self, user_id: str) -> List[Session]:
+        with self._lock:
+            return [self._sessions[sid] for sid in self._by_user.get(user_id, ())]
+
+    def revoke(self, session_id: str) -> bool:
+        with self._lock:
+            return self._remove(session_id) is not None
+
+    def revoke_user(self, user_id: str) -> int:
+        """注销用户的所有会话"""
+        with self._lock:
+            session_ids = list(self._by_user.get(user_id, ()))
+            for session_id in session_ids:
+                self._remove(session_id)
+            return len(session_ids)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """清理到期的会话，返回清理数量 (只处理堆顶已到期的条目)"""
+        now = now or time.time()
+        expired = 0
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now:
+                _, session_id = heapq.heappop(heap)
+                session = self._sessions.get(session_id)
+                if session is None:
+                    continue
+                deadline = self._deadline(session)
+                if deadline <= now:
+                    self._remove(session_id)
+                    expired += 1
+                else:
+                    # 期间有访问，按新的过期时间重新入堆
+                    heapq.heappush(heap, (deadline, session_id))
+
+            # 已删除会话留在堆中的条目过多时重建堆
+            if len(heap) > 2 * len(self._sessions) + 64:
+                self._expiry_heap = [(self._deadline(s), sid) for sid, s in self._sessions.items()]
+                heapq.heapify(self._expiry_heap)
+        return expired
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    # 快照
+
+    def _load_snapshot(self):
+        with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        now = time.time()
+        records = sorted(
+            (r for r in data.values() if r.get('is_active', True)),
+            key=lambda r: r.get('created_at') or ''
+        )
+        for record in records:
+            created_at = datetime.fromisoformat(record['created_at']).timestamp()
+            last_activity = datetime.fromisoformat(record.get('last_activity') or record['created_at']).timestamp()
+            session = Session(record['session_id'], record['user_id'], created_at, last_activity,
+                              record.get('ip_address'), record.get('user_agent'))
+            if self._deadline(session) > now:
+                self._add(session)
+        # 旧文件中可能包含大量失效会话，下一次快照时一并压缩掉
+        self._dirty = True
+
+    def snapshot(self, force: bool = False) -> bool:
+        """把存活的会话原子地写入快照文件，返回是否写出"""
+        if not self.snapshot_path:
+            return False
+        with self._lock:
+            if not (self._dirty or force):
+                return False
+            data = {sid: session.to_dict() for sid, session in self._sessions.items()}
+            self._dirty = False
+
+        directory = os.path.dirname(self.snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.snapshot_path)
+        return True
+
+    def start(self):
+        """启动后台线程：定期清理过期会话并写快照"""
+        if self._worker is not None:
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._maintenance_loop, name="session-store", daemon=True)
+        self._worker.start()
+
+    def _maintenance_loop(self):
+        while not self._stop.wait(self.snapshot_interval):
+            self.expire()
+            self.snapshot()
+
+    def close(self):
+        """停止后台线程并写出最终快照"""
+        if self._worker is not None:
+            self._stop.set()
+            self._worker.join()
+            self._worker = None
+        self.expire()
+        self.snapshot()
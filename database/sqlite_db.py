@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+SQLite用户数据库 (WAL模式)
+SQLite User Database - WAL-mode storage engine for user data
+
+与 UserDatabase 提供相同的查询接口，数据存放在单个SQLite文件中：
+行为记录按 (user_id, timestamp)、(action_type, timestamp)、session_id 建立索引，
+写入只影响对应的行，WAL模式下读写互不阻塞，不再整文件读取和重写JSON。
+"""
+
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import sys
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.action_logger import DatabaseActionSink, WriteBehindActionLogger
+from database.action_scan import convert_field, type_values, validate_columns
+from user_system.models import ActionType, User, UserAction, UserPreferences, UserProfile
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    username TEXT UNIQUE,
+    email TEXT UNIQUE,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_profiles (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_preferences (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_sessions (
+    session_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    created_at TEXT,
+    last_activity TEXT,
+    is_active INTEGER NOT NULL DEFAULT 1,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_actions (
+    action_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    action_type TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    session_id TEXT,
+    details TEXT,
+    ip_address TEXT,
+    user_agent TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_actions_user_time ON user_actions (user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_actions_type_time ON user_actions (action_type, timestamp);
+CREATE INDEX IF NOT EXISTS idx_actions_session ON user_actions (session_id);
+CREATE INDEX IF NOT EXISTS idx_sessions_user ON user_sessions (user_id, is_active);
+"""
+
+# 模型中以datetime表示、在JSON中以ISO字符串存储的字段
+DATETIME_FIELDS = ('timestamp', 'created_at', 'updated_at', 'last_login', 'last_activity', 'last_assessment_date')
+
+ACTION_COLUMNS = ('action_id', 'user_id', 'action_type', 'timestamp', 'session_id', 'details', 'ip_address', 'user_agent')
+
+def _parse_datetimes(data: Dict[str, Any]) -> Dict[str, Any]:
+    for key in DATETIME_FIELDS:
+        if isinstance(data.get(key), str):
+            data[key] = datetime.fromisoformat(data[key])
+    return data
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, 'value'):       # Enum
+        return value.value
+    return value
+
+class SQLiteUserDatabase:
+    """基于SQLite (WAL) 的用户数据库"""
+
+    def __init__(self, data_dir: str = "data", db_file: str = "freedom.db"):
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        self.db_path = os.path.join(data_dir, db_file)
+
+        # 与 UserDatabase 相同的文件属性，供 _load_data 兼容旧调用方
+        self.users_file = os.path.join(data_dir, "users.json")
+        self.profiles_file = os.path.join(data_dir, "user_profiles.json")
+        self.preferences_file = os.path.join(data_dir, "user_preferences.json")
+        self.sessions_file = os.path.join(data_dir, "user_sessions.json")
+        self.actions_file = os.path.join(data_dir, "user_actions.json")
+
+        self._local = threading.local()
+        self.conn.executescript(SCHEMA)
+
+        # start_action_logger() 之后 log_user_action 改为异步批量写入
+        self.action_logger: Optional[WriteBehindActionLogger] = None
+        # 资料/偏好更新成功后调用 listener(table, user_id) (如 InsightScheduler.observe_update)
+        self.update_listeners: List[Callable[[str, str], None]] = []
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """每个线程一个连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """写事务：BEGIN IMMEDIATE 提前获取写锁，避免并发写入时的升级死锁"""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def start_action_logger(self, listeners: Optional[List[Callable[[List[Dict[str, Any]]], None]]] = None,
+                            **options) -> WriteBehindActionLogger:
+        """启用异步批量行为日志
+
+        之后 log_user_action 只入队、由后台线程成批写入，每批写入成功后调用 listeners
+        (如 SearchTrends.observe_batch、WindowCache.observe_batch)。options 传给
+        WriteBehindActionLogger (capacity、batch_size、flush_interval、durability 等)。
+        """
+        if self.action_logger is None:
+            self.action_logger = WriteBehindActionLogger(DatabaseActionSink(self), listeners=listeners, **options)
+        elif listeners:
+            self.action_logger.listeners.extend(listeners)
+        return self.action_logger
+
+    def close(self):
+        """写出异步行为日志中剩余的记录并关闭当前线程的连接"""
+        if self.action_logger is not None:
+            self.action_logger.close()
+            self.action_logger = None
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # 文档读写
+
+    def _get_document(self, table: str, key_column: str, key: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(f"SELECT data FROM {table} WHERE {key_column} = ?", (key,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def _put_document(self, conn: sqlite3.Connection, table: str, data: Dict[str, Any]):
+        payload = json.dumps(data, ensure_ascii=False)
+        if table == 'users':
+            conn.execute("INSERT OR REPLACE INTO users (user_id, username, email, data) VALUES (?, ?, ?, ?)",
+                         (data['user_id'], data.get('username'), data.get('email'), payload))
+        elif table == 'user_sessions':
+            conn.execute(
+                "INSERT OR REPLACE INTO user_sessions (session_id, user_id, created_at, last_activity, is_active, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (data['session_id'], data['user_id'], data.get('created_at'), data.get('last_activity'),
+                 1 if data.get('is_active', True) else 0, payload))
+        else:
+            conn.execute(f"INSERT OR REPLACE INTO {table} (user_id, data) VALUES (?, ?)", (data['user_id'], payload))
+
+    def _insert_action(self, conn: sqlite3.Connection, data: Dict[str, Any]):
+        conn.execute(
+            f"INSERT OR REPLACE INTO user_actions ({', '.join(ACTION_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (data['action_id'], data['user_id'], _jsonable(data['action_type']), _jsonable(data['timestamp']),
+             data.get('session_id'), json.dumps(data.get('details') or {}, ensure_ascii=False),
+             data.get('ip_address'), data.get('user_agent')))
+
+    @staticmethod
+    def _row_to_action_data(row: sqlite3.Row) -> Dict[str, Any]:
+        data = dict(row)
+        data['details'] = json.loads(data['details']) if data['details'] else {}
+        return data
+
+    # 用户
+
+    def create_user(self, username: str, email: str, password: str) -> User:
+        """创建用户，用户名或邮箱已存在时抛出ValueError"""
+        salt = secrets.token_hex(16)
+        password_hash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), 100000).hex()
+        now = datetime.now().isoformat()
+        data = {
+            'user_id': f"user_{uuid.uuid4().hex[:12]}",
+            'username': username,
+            'email': email,
+            'password_hash': f"{salt}${password_hash}",
+            'created_at': now,
+            'last_login': None,
+            'is_active': True
+        }
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM users WHERE username = ? OR email = ?", (username, email)).fetchone():
+                raise ValueError("用户名或邮箱已存在")
+            self._put_document(conn, 'users', data)
+            self._put_document(conn, 'user_profiles', {'user_id': data['user_id'], 'updated_at': now})
+            self._put_document(conn, 'user_preferences', {'user_id': data['user_id']})
+        return User(**_parse_datetimes(data))
+
+    def get_user(self, user_id: str) -> Optional[User]:
+        data = self._get_document('users', 'user_id', user_id)
+        return User(**_parse_datetimes(data)) if data else None
+
+    def get_user_profile(self, user_id: str) -> Optional[UserProfile]:
+        data = self._get_document('user_profiles', 'user_id', user_id)
+        return UserProfile(**_parse_datetimes(data)) if data else None
+
+    def get_user_preferences(self, user_id: str) -> Optional[UserPreferences]:
+        data = self._get_document('user_preferences', 'user_id', user_id)
+        return UserPreferences(**_parse_datetimes(data)) if data else None
+
+    def update_user_profile(self, user_id: str, updates: Dict[str, Any]) -> bool:
+        return self._update_document('user_profiles', user_id, updates)
+
+    def update_user_preferences(self, user_id: str, updates: Dict[str, Any]) -> bool:
+        return self._update_document('user_preferences', user_id, updates)
+
+    def _update_document(self, table: str, user_id: str, updates: Dict[str, Any]) -> bool:
+        with self._transaction() as conn:
+            row = conn.execute(f"SELECT data FROM {table} WHERE user_id = ?", (user_id,)).fetchone()
+            if row is None:
+                return False
+            data = json.loads(row['data'])
+            data.update({key: _jsonable(value) for key, value in updates.items()})
+            data['updated_at'] = datetime.now().isoformat()
+            self._put_document(conn, table, data)
+
+        for listener in self.update_listeners:
+            try:
+                listener(table, user_id)
+            except Exception as e:
+                print(f"更新监听器出错: {e}", file=sys.stderr)
+        return True
+
+    # 会话
+
+    def create_session(self, user_id: str, ip_address: Optional[str] = None,
+                       user_agent: Optional[str] = None) -> Dict[str, Any]:
+        now = datetime.now().isoformat()
+        data = {
+            'session_id': f"session_{uuid.uuid4().hex[:16]}",
+            'user_id': user_id,
+            'created_at': now,
+            'last_activity': now,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'is_active': True
+        }
+        with self._transaction() as conn:
+            self._put_document(conn, 'user_sessions', data)
+        return data
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return self._get_document('user_sessions', 'session_id', session_id)
+
+    def get_user_sessions(self, user_id: str, active_only: bool = True) -> List[Dict[str, Any]]:
+        sql = "SELECT data FROM user_sessions WHERE user_id = ?"
+        if active_only:
+            sql += " AND is_active = 1"
+        return [json.loads(row['data']) for row in self.conn.execute(sql, (user_id,))]
+
+    # 行为记录
+
+    def log_user_action(self, user_id: str, action_type: ActionType, details: Optional[Dict[str, Any]] = None,
+                        session_id: Optional[str] = None, ip_address: Optional[str] = None,
+                        user_agent: Optional[str] = None) -> UserAction:
+        """记录用户行为 (单行插入；启用异步行为日志时只入队)"""
+        if self.action_logger is not None:
+            return self.action_logger.log(user_id, action_type, details, session_id, ip_address, user_agent)
+
+        action = UserAction(
+            action_id=str(uuid.uuid4()),
+            user_id=user_id,
+            action_type=action_type,
+            timestamp=datetime.now(),
+            details=details or {},
+            session_id=session_id,
+            ip_address=ip_address,
+            user_agent=user_agent
+        )
+        with self._transaction() as conn:
+            self._insert_action(conn, vars(action))
+        return action
+
+    def log_user_actions(self, actions: Iterable[Any], durable: bool = False) -> int:
+        """批量写入行为记录 (一个事务)，durable为True时本次提交同步落盘"""
+        count = 0
+        conn = self.conn
+        if durable:
+            conn.execute("PRAGMA synchronous=FULL")
+        try:
+            with self._transaction() as conn:
+                for action in actions:
+                    self._insert_action(conn, action if isinstance(action, dict) else vars(action))
+                    count += 1
+        finally:
+            if durable:
+                conn.execute("PRAGMA synchronous=NORMAL")
+        return count
+
+    def get_user_actions(self, user_id: str, limit: int = 100, start_date: Optional[datetime] = None,
+                         end_date: Optional[datetime] = None,
+                         action_type: Optional[ActionType] = None) -> List[UserAction]:
+        """按时间倒序返回用户行为 (走 (user_id, timestamp) 索引)"""
+        sql = "SELECT * FROM user_actions WHERE user_id = ?"
+        params: List[Any] = [user_id]
+        if start_date:
+            sql += " AND timestamp >= ?"
+            params.append(start_date.isoformat())
+        if end_date:
+            sql += " AND timestamp < ?"
+            params.append(end_date.isoformat())
+        if action_type:
+            sql += " AND action_type = ?"
+            params.append(_jsonable(action_type))
+        sql += " ORDER BY timestamp DESC LIMIT ?"
+        params.append(limit)
+
+        actions = []
+        for row in self.conn.execute(sql, params):
+            data = self._row_to_action_data(row)
+            data['timestamp'] = datetime.fromisoformat(data['timestamp'])
+            data['action_type'] = ActionType(data['action_type'])
+            actions.append(UserAction(**data))
+        return actions
+
+    def scan_actions(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                     types: Optional[Iterable[Any]] = None, users: Optional[Iterable[str]] = None,
+                     columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        """按条件扫描行为记录，过滤和投影都在SQL中完成，结果逐行产出 (不保证顺序)"""
+        columns = validate_columns(columns)
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since.isoformat())
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until.isoformat())
+        for column, values in (('action_type', type_values(types)), ('user_id', users)):
+            if values is None:
+                continue
+            values = list(values)
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})" if values else "0")
+            params.extend(values)
+
+        sql = f"SELECT {', '.join(columns)} FROM user_actions"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+
+        for row in self.conn.execute(sql, params):
+            record = {}
+            for column in columns:
+                value = row[column]
+                if column == 'details':
+                    value = json.loads(value) if value else {}
+                record[column] = convert_field(column, value)
+            yield record
+
+    def analyze_user_behavior(self, user_id: str, days: int = 30) -> Dict[str, Any]:
+        """用户行为概况：行为类型分布与活跃时段"""
+        start = (datetime.now() - timedelta(days=days)).isoformat()
+        type_counts = {
+            row['action_type']: row['n'] for row in self.conn.execute(
+                "SELECT action_type, COUNT(*) AS n FROM user_actions "
+                "WHERE user_id = ? AND timestamp >= ? GROUP BY action_type", (user_id, start))
+        }
+        hour_counts = Counter({
+            int(row['hour']): row['n'] for row in self.conn.execute(
+                "SELECT substr(timestamp, 12, 2) AS hour, COUNT(*) AS n FROM user_actions "
+                "WHERE user_id = ? AND timestamp >= ? GROUP BY hour", (user_id, start))
+        })
+        return {
+            'user_id': user_id,
+            'analysis_period': f'{days} days',
+            'total_actions': sum(type_counts.values()),
+            'action_types': type_counts,
+            'activity_hours': {
+                'distribution': dict(sorted(hour_counts.items())),
+                'most_active_hour': hour_counts.most_common(1)[0][0] if hour_counts else None
+            }
+        }
+
+    # 兼容旧的JSON文件接口
+
+    def _load_data(self, file_path: str) -> Dict[str, Any]:
+        """返回与旧JSON文件相同结构的数据 (整表读取，仅供尚未迁移的调用方使用)"""
+        if file_path == self.actions_file:
+            rows = self.conn.execute("SELECT * FROM user_actions ORDER BY timestamp")
+            return {'actions': [self._row_to_action_data(row) for row in rows]}
+
+        tables = {
+            self.users_file: ('users', 'user_id'),
+            self.profiles_file: ('user_profiles', 'user_id'),
+            self.preferences_file: ('user_preferences', 'user_id'),
+            self.sessions_file: ('user_sessions', 'session_id')
+        }
+        if file_path not in tables:
+            return {}
+        table, key_column = tables[file_path]
+        return {row[key_column]: json.loads(row['data'])
+                for row in self.conn.execute(f"SELECT {key_column}, data FROM {table}")}
+
+def migrate_json_to_sqlite(data_dir: str = "data", db_file: str = "freedom.db") -> Dict[str, int]:
+    """一次性把 data_dir 下的JSON文件导入SQLite，返回每张表导入的记录数
+
+    重复执行是安全的 (按主键覆盖)，原JSON文件保持不变。
+    """
+    db = SQLiteUserDatabase(data_dir, db_file)
+    sources = [
+        (db.users_file, 'users'),
+        (db.profiles_file, 'user_profiles'),
+        (db.preferences_file, 'user_preferences'),
+        (db.sessions_file, 'user_sessions')
+    ]
+    counts = {}
+
+    with db._transaction() as conn:
+        for path, table in sources:
+            counts[table] = 0
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                documents = json.load(f)
+            for document in documents.values():
+                db._put_document(conn, table, document)
+                counts[table] += 1
+
+        counts['user_actions'] = 0
+        if os.path.exists(db.actions_file):
+            with open(db.actions_file, 'r', encoding='utf-8') as f:
+                actions = json.load(f).get('actions', [])
+            for action in actions:
+                db._insert_action(conn, action)
+            counts['user_actions'] = len(actions)
+
+    db.close()
+    return counts
+
+if __name__ == "__main__":
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "data"
+    print("迁移完成:", json.dumps(migrate_json_to_sqlite(data_dir), ensure_ascii=False))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+字符串字典编码
+String Dictionary - shared interning and dense integer ids for repeated strings
+
+用户ID、会话ID、IP地址和User-Agent在行为记录和各个JSON文件中大量重复。
+数据层在加载时把它们映射为从0开始的连续整数 (同时返回规范化的字符串对象，
+相同内容只保留一份)，分析、会话和推荐在整数上做集合与分组运算，
+只在API边界处再解码回字符串。编码只增不删，同一进程内编号稳定。
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional
+
+class StringDictionary:
+    """字符串 <-> 连续整数ID 的双向映射 (线程安全，只追加)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._codes: Dict[str, int] = {}
+        self._strings: List[str] = []
+        self._lock = threading.Lock()
+
+    def encode(self, value: str) -> int:
+        """返回字符串的整数ID，首次出现时分配新ID"""
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self._strings)
+                    self._strings.append(value)
+                    self._codes[value] = code
+        return code
+
+    def intern(self, value: Optional[str]) -> Optional[str]:
+        """返回与 value 相等的规范化字符串对象 (None原样返回)"""
+        if value is None:
+            return None
+        return self._strings[self.encode(value)]
+
+    def get(self, value: str) -> Optional[int]:
+        """查询ID，不存在时返回None (不分配新ID)"""
+        return self._codes.get(value)
+
+    def decode(self, code: int) -> str:
+        return self._strings[code]
+
+    def encode_many(self, values: Iterable[str]) -> List[int]:
+        encode = self.encode
+        return [encode(value) for value in values]
+
+    def decode_many(self, codes: Iterable[int]) -> List[str]:
+        strings = self._strings
+        return [strings[code] for code in codes]
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def __contains__(self, value: str) -> bool:
+        return value in self._codes
+
+# 数据层共享的字典
+USER_IDS = StringDictionary('user_id')
+SESSION_IDS = StringDictionary('session_id')
+IP_ADDRESSES = StringDictionary('ip_address')
+USER_AGENTS = StringDictionary('user_agent')
+
+DICTIONARIES: Dict[str, StringDictionary] = {
+    d.name: d for d in (USER_IDS, SESSION_IDS, IP_ADDRESSES, USER_AGENTS)
+}
+
+def get_dictionary(field: str) -> StringDictionary:
+    """按字段名取共享字典，如 'user_id'"""
+    try:
+        return DICTIONARIES[field]
+    except KeyError:
+        raise ValueError(f"没有为字段 {field} 建立字典") from None
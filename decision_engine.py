@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+批量决策评分引擎
+Vectorized multi-criteria scoring engine
+
+将N个选项转换为特征矩阵，用NumPy一次性完成评分；
+支持每个用户一组权重，U个用户 × N个选项通过一次矩阵乘法完成。
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# 评分维度顺序，权重向量按此顺序排列
+CRITERIA = ('return', 'risk', 'probability', 'time')
+DEFAULT_WEIGHTS = (0.3, 0.25, 0.25, 0.2)
+
+WeightsLike = Union[Sequence[float], Dict[str, float], np.ndarray]
+
+def build_features(potential_return: Any, risk_score: Any,
+                   success_probability: Any, time_investment: Any) -> np.ndarray:
+    """由原始数组构建 N×4 的标准化特征矩阵"""
+    potential_return = np.asarray(potential_return, dtype=np.float64)
+    risk_score = np.asarray(risk_score, dtype=np.float64)
+    success_probability = np.asarray(success_probability, dtype=np.float64)
+    time_investment = np.asarray(time_investment, dtype=np.float64)
+
+    features = np.empty((potential_return.shape[0], len(CRITERIA)), dtype=np.float64)
+    np.minimum(potential_return / 100000, 1.0, out=features[:, 0])    # 标准化收益
+    np.subtract(1.0, risk_score, out=features[:, 1])                   # 风险越低得分越高
+    features[:, 2] = success_probability
+    time_efficiency = potential_return / np.maximum(time_investment, 1)
+    np.minimum(time_efficiency / 1000, 1.0, out=features[:, 3])        # 时间投资效率
+    return features
+
+def options_to_features(options: Sequence[Any]) -> np.ndarray:
+    """将DecisionOption列表转换为特征矩阵"""
+    return build_features(
+        [opt.potential_return for opt in options],
+        [opt.risk_score for opt in options],
+        [opt.success_probability for opt in options],
+        [opt.time_investment for opt in options]
+    )
+
+def normalize_weights(weights: Optional[WeightsLike]) -> np.ndarray:
+    """将权重统一为形状 (4,) 或 (U, 4) 的数组；字典按CRITERIA取值，缺省项用默认权重"""
+    if weights is None:
+        return np.asarray(DEFAULT_WEIGHTS, dtype=np.float64)
+    if isinstance(weights, dict):
+        defaults = dict(zip(CRITERIA, DEFAULT_WEIGHTS))
+        return np.array([weights.get(name, defaults[name]) for name in CRITERIA], dtype=np.float64)
+
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.shape[-1] != len(CRITERIA) or weights.ndim > 2:
+        raise ValueError(f"权重形状应为 (4,) 或 (U, 4)，实际为 {weights.shape}")
+    return weights
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """沿最后一维取得分最高的k个下标（已按得分降序），不做全量排序
+
+    得分相同时下标小的在前，与稳定排序的结果一致 (包括第k名处的并列)。
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+
+    part_scores = np.take_along_axis(scores, part, axis=-1)
+    if k < n:
+        # argpartition 在第k名并列时任取其一：这些行改为按 (得分降序, 下标升序) 完整排序
+        kth = part_scores.min(axis=-1, keepdims=True)
+        split = (scores == kth).sum(axis=-1) != (part_scores == kth).sum(axis=-1)
+        if np.any(split):
+            rows = np.reshape(scores, (-1, n))
+            fixed_part = np.reshape(part, (-1, k))
+            for row in np.flatnonzero(np.ravel(split)):
+                fixed_part[row] = np.lexsort((np.arange(n), -rows[row]))[:k]
+            part = np.reshape(fixed_part, part.shape)
+            part_scores = np.take_along_axis(scores, part, axis=-1)
+
+    # 得分相同时保持原顺序，与稳定排序的结果一致
+    order = np.lexsort((part, -part_scores), axis=-1)
+    return np.take_along_axis(part, order, axis=-1)
+
+class BatchDecisionEngine:
+    """批量决策评分引擎"""
+
+    def __init__(self, weights: Optional[WeightsLike] = None):
+        self.weights = normalize_weights(weights)
+
+    def score(self, features: np.ndarray, weights: Optional[WeightsLike] = None) -> np.ndarray:
+        """计算得分
+
+        weights为 (4,) 时返回 (N,)；为 (U, 4) 时返回 (U, N)。
+        按维度顺序逐项累加 (而不是矩阵乘法)，与逐个选项计算
+        return*w0 + risk*w1 + probability*w2 + time*w3 的浮点结果完全一致，
+        得分相同的选项不会因求和顺序不同而改变名次。
+        """
+        weights = self.weights if weights is None else normalize_weights(weights)
+        weights = weights[..., None]        # (4, 1) 或 (U, 4, 1)，与 (N,) 的特征列广播
+        scores = weights[..., 0, :] * features[:, 0]
+        for j in range(1, len(CRITERIA)):
+            scores = scores + weights[..., j, :] * features[:, j]
+        return scores
+
+    def rank(self, features: np.ndarray, k: int = 2,
+             weights: Optional[WeightsLike] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (前k个下标, 对应得分)，k=2 时即最佳选项与备选选项"""
+        scores = self.score(features, weights)
+        top = top_k_indices(scores, k)
+        return top, np.take_along_axis(scores, top, axis=-1)
+
+    def rank_options(self, options: Sequence[Any], k: int = 2,
+                     weights: Optional[WeightsLike] = None) -> List[Tuple[Any, float]]:
+        """对单个用户的选项列表评分，返回 [(选项, 得分)]，按得分降序"""
+        if not options:
+            return []
+        top, scores = self.rank(options_to_features(options), k, weights)
+        return [(options[i], float(s)) for i, s in zip(top, scores)]
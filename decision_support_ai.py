@@ -4,10 +4,14 @@
 """
 
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import cached_property
 from typing import Dict, List, Optional, Any
 from datetime import datetime
-import openai
+
+from decision_engine import BatchDecisionEngine, WeightsLike
+from decision_simulation import MonteCarloSimulator
+from integrations.llm_client_pool import LLMClientPool, get_shared_pool
 
 @dataclass
 class DecisionOption:
@@ -31,36 +35,196 @@ class DecisionContext:
     priorities: List[str]
     timeline: str
 
-@dataclass
+# 报告模板在模块加载时构建一次，渲染时只做格式化
+_REASONING_TEMPLATE = """
+基于数据分析，推荐选择"{name}"，原因如下：
+
+1. 潜在收益: {potential_return:,.0f}元
+2. 成功概率: {success_percent:.1f}%
+3. 风险等级: {risk_level:.1f}/10
+4. 时间投资: {time_investment}小时
+
+优势分析:
+{pros}
+
+需要注意的风险:
+{cons}
+""".strip()
+
+_RISK_TEMPLATE = """
+风险等级: {risk_label} ({risk_level:.1f}/10)
+
+主要风险因素:
+{cons}
+
+风险缓解建议:
+• 制定详细的执行计划
+• 设置阶段性检查点
+• 准备应急预案
+• 控制资源投入节奏
+""".strip()
+
+_ACTION_PLAN_TEMPLATE = (
+    "第一阶段：准备和规划",
+    "• 准备所需资源: {resources}",
+    "• 制定详细时间表",
+    "• 设定阶段性目标",
+    "",
+    "第二阶段：执行和监控",
+    "• 按计划开始执行",
+    "• 定期评估进展",
+    "• 及时调整策略",
+    "",
+    "第三阶段：优化和扩展",
+    "• 总结经验教训",
+    "• 优化执行流程",
+    "• 寻找扩展机会"
+)
+
+_SUCCESS_METRICS_TEMPLATE = (
+    "收益目标: {potential_return:,.0f}元",
+    "时间效率: 每小时产出 {hourly_return:,.0f}元",
+    "成功概率: 达到{success_percent:.0f}%预期",
+    "风险控制: 实际风险不超过预期",
+    "资源利用: 按计划使用资源"
+)
+
+_FALLBACK_TEMPLATE = """
+备选方案: {name}
+
+如果主方案遇到以下情况，可考虑切换到备选方案:
+• 风险超出预期
+• 资源不足
+• 外部环境变化
+• 预期收益大幅下降
+
+备选方案优势:
+{pros}
+""".strip()
+
+_NO_FALLBACK_TEXT = "如果主方案失败，建议重新评估现有选项或寻找新的机会。"
+
+def _bullets(items: List[str]) -> str:
+    return "\n".join(f"• {item}" for item in items)
+
+@dataclass(init=False)
 class DecisionRecommendation:
-    """决策建议"""
+    """决策建议
+    
+    recommended_option 和 confidence_score 在创建时确定；
+    文本部分在首次访问时才根据模板渲染并缓存，只需要排名结果的调用方不必承担渲染开销。
+    仍可按原来的方式直接传入全部文本字段构造 (此时不需要 option)。
+    """
     recommended_option: str
     confidence_score: float  # 0-1
-    reasoning: str
-    risk_analysis: str
-    action_plan: List[str]
-    success_metrics: List[str]
-    fallback_plan: str
+    option: Optional[DecisionOption] = field(default=None, repr=False)
+    backup_option: Optional[DecisionOption] = field(default=None, repr=False)
+    context: Optional[DecisionContext] = field(default=None, repr=False)
+    
+    FIELDS = (
+        'recommended_option', 'confidence_score', 'reasoning', 'risk_analysis',
+        'action_plan', 'success_metrics', 'fallback_plan'
+    )
+    
+    def __init__(self, recommended_option: str, confidence_score: float,
+                 reasoning: Optional[str] = None, risk_analysis: Optional[str] = None,
+                 action_plan: Optional[List[str]] = None, success_metrics: Optional[List[str]] = None,
+                 fallback_plan: Optional[str] = None, *, option: Optional[DecisionOption] = None,
+                 backup_option: Optional[DecisionOption] = None, context: Optional[DecisionContext] = None):
+        self.recommended_option = recommended_option
+        self.confidence_score = confidence_score
+        self.option = option
+        self.backup_option = backup_option
+        self.context = context
+        
+        # 直接给出的文本写入实例字典，优先于延迟渲染的 cached_property
+        texts = {
+            'reasoning': reasoning, 'risk_analysis': risk_analysis, 'action_plan': action_plan,
+            'success_metrics': success_metrics, 'fallback_plan': fallback_plan
+        }
+        missing = [name for name, value in texts.items() if value is None]
+        if option is None and missing:
+            raise TypeError(f"未提供 option 时需要给出全部文本字段，缺少: {', '.join(missing)}")
+        self.__dict__.update((name, value) for name, value in texts.items() if value is not None)
+    
+    @cached_property
+    def reasoning(self) -> str:
+        """推理过程"""
+        option = self.option
+        return _REASONING_TEMPLATE.format(
+            name=option.name,
+            potential_return=option.potential_return,
+            success_percent=option.success_probability * 100,
+            risk_level=option.risk_score * 10,
+            time_investment=option.time_investment,
+            pros=_bullets(option.pros),
+            cons=_bullets(option.cons)
+        ).strip()
+    
+    @cached_property
+    def risk_analysis(self) -> str:
+        """风险分析"""
+        option = self.option
+        risk_label = "低" if option.risk_score < 0.3 else "中" if option.risk_score < 0.7 else "高"
+        return _RISK_TEMPLATE.format(
+            risk_label=risk_label,
+            risk_level=option.risk_score * 10,
+            cons=_bullets(option.cons)
+        )
+    
+    @cached_property
+    def action_plan(self) -> List[str]:
+        """行动计划"""
+        resources = ', '.join(self.option.required_resources)
+        return [line.format(resources=resources) for line in _ACTION_PLAN_TEMPLATE]
+    
+    @cached_property
+    def success_metrics(self) -> List[str]:
+        """成功指标"""
+        option = self.option
+        values = {
+            'potential_return': option.potential_return,
+            'hourly_return': option.potential_return / option.time_investment,
+            'success_percent': option.success_probability * 100
+        }
+        return [line.format(**values) for line in _SUCCESS_METRICS_TEMPLATE]
+    
+    @cached_property
+    def fallback_plan(self) -> str:
+        """备选方案"""
+        if not self.backup_option:
+            return _NO_FALLBACK_TEXT
+        return _FALLBACK_TEMPLATE.format(
+            name=self.backup_option.name,
+            pros=_bullets(self.backup_option.pros)
+        ).strip()
+    
+    def to_dict(self, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """导出为字典，fields指定时只渲染所需字段"""
+        fields = self.FIELDS if fields is None else fields
+        unknown = [name for name in fields if name not in self.FIELDS]
+        if unknown:
+            raise ValueError(f"未知字段: {', '.join(unknown)}")
+        return {name: getattr(self, name) for name in fields}
 
 class DecisionSupportAI:
     """决策支持AI智能体"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, llm_pool: Optional[LLMClientPool] = None):
         self.api_key = api_key
-        if api_key:
-            openai.api_key = api_key
+        # 不再修改全局openai.api_key，统一走共享连接池限流
+        self.llm_pool = llm_pool or (get_shared_pool(api_key) if api_key else None)
+        self.engine = BatchDecisionEngine()
     
-    def analyze_decision(self, context: DecisionContext, options: List[DecisionOption]) -> DecisionRecommendation:
-        """分析决策选项并提供建议"""
+    def analyze_decision(self, context: DecisionContext, options: List[DecisionOption],
+                         weights: Optional[WeightsLike] = None) -> DecisionRecommendation:
+        """分析决策选项并提供建议
         
-        # 计算每个选项的综合得分
-        scored_options = []
-        for option in options:
-            score = self._calculate_option_score(option, context)
-            scored_options.append((option, score))
+        weights: 可选的用户权重 (收益, 风险, 成功概率, 时间效率)，缺省为 0.3/0.25/0.25/0.2
+        """
         
-        # 按得分排序
-        scored_options.sort(key=lambda x: x[1], reverse=True)
+        # 批量计算得分，只取最佳与备选两项，无需全量排序
+        scored_options = self.engine.rank_options(options, k=2, weights=weights)
         best_option = scored_options[0][0]
         
         # 生成详细分析
@@ -68,137 +232,28 @@ class DecisionSupportAI:
         
         return recommendation
     
-    def _calculate_option_score(self, option: DecisionOption, context: DecisionContext) -> float:
-        """计算选项综合得分"""
-        
-        # 基础得分计算
-        return_score = min(option.potential_return / 100000, 1.0)  # 标准化收益
-        risk_score = 1 - option.risk_score  # 风险越低得分越高
-        probability_score = option.success_probability
-        
-        # 时间投资评分（考虑效率）
-        time_efficiency = option.potential_return / max(option.time_investment, 1)
-        time_score = min(time_efficiency / 1000, 1.0)
-        
-        # 综合得分（可根据用户偏好调整权重）
-        total_score = (
-            return_score * 0.3 +
-            risk_score * 0.25 +
-            probability_score * 0.25 +
-            time_score * 0.2
-        )
-        
-        return total_score
-    
     def _generate_recommendation(self, best_option: DecisionOption, 
                                all_options: List[tuple], context: DecisionContext) -> DecisionRecommendation:
-        """生成详细的决策建议"""
-        
-        # 风险分析
-        risk_analysis = self._analyze_risks(best_option, context)
-        
-        # 行动计划
-        action_plan = self._create_action_plan(best_option)
-        
-        # 成功指标
-        success_metrics = self._define_success_metrics(best_option)
-        
-        # 备选方案
-        fallback_plan = self._create_fallback_plan(all_options[1][0] if len(all_options) > 1 else None)
-        
-        # 推理过程
-        reasoning = f"""
-基于数据分析，推荐选择"{best_option.name}"，原因如下：
-
-1. 潜在收益: {best_option.potential_return:,.0f}元
-2. 成功概率: {best_option.success_probability*100:.1f}%
-3. 风险等级: {best_option.risk_score*10:.1f}/10
-4. 时间投资: {best_option.time_investment}小时
-
-优势分析:
-{chr(10).join(f"• {pro}" for pro in best_option.pros)}
-
-需要注意的风险:
-{chr(10).join(f"• {con}" for con in best_option.cons)}
-        """.strip()
-        
+        """生成决策建议 (文本部分延迟渲染)"""
         return DecisionRecommendation(
             recommended_option=best_option.name,
             confidence_score=all_options[0][1],
-            reasoning=reasoning,
-            risk_analysis=risk_analysis,
-            action_plan=action_plan,
-            success_metrics=success_metrics,
-            fallback_plan=fallback_plan
+            option=best_option,
+            backup_option=all_options[1][0] if len(all_options) > 1 else None,
+            context=context
         )
     
-    def _analyze_risks(self, option: DecisionOption, context: DecisionContext) -> str:
-        """分析风险"""
-        risk_level = "低" if option.risk_score < 0.3 else "中" if option.risk_score < 0.7 else "高"
-        
-        return f"""
-风险等级: {risk_level} ({option.risk_score*10:.1f}/10)
-
-主要风险因素:
-{chr(10).join(f"• {con}" for con in option.cons)}
-
-风险缓解建议:
-• 制定详细的执行计划
-• 设置阶段性检查点
-• 准备应急预案
-• 控制资源投入节奏
-        """.strip()
-    
-    def _create_action_plan(self, option: DecisionOption) -> List[str]:
-        """创建行动计划"""
-        plan = [
-            "第一阶段：准备和规划",
-            f"• 准备所需资源: {', '.join(option.required_resources)}",
-            "• 制定详细时间表",
-            "• 设定阶段性目标",
-            "",
-            "第二阶段：执行和监控",
-            "• 按计划开始执行",
-            "• 定期评估进展",
-            "• 及时调整策略",
-            "",
-            "第三阶段：优化和扩展",
-            "• 总结经验教训",
-            "• 优化执行流程",
-            "• 寻找扩展机会"
-        ]
-        return plan
-    
-    def _define_success_metrics(self, option: DecisionOption) -> List[str]:
-        """定义成功指标"""
-        return [
-            f"收益目标: {option.potential_return:,.0f}元",
-            f"时间效率: 每小时产出 {option.potential_return/option.time_investment:,.0f}元",
-            f"成功概率: 达到{option.success_probability*100:.0f}%预期",
-            "风险控制: 实际风险不超过预期",
-            "资源利用: 按计划使用资源"
-        ]
-    
-    def _create_fallback_plan(self, backup_option: Optional[DecisionOption]) -> str:
-        """创建备选方案"""
-        if not backup_option:
-            return "如果主方案失败，建议重新评估现有选项或寻找新的机会。"
+    def compare_opportunities(self, opportunities: List[Dict[str, Any]],
+                              weights: Optional[WeightsLike] = None,
+                              simulate: bool = False,
+                              simulation_draws: int = 100000,
+                              simulation_workers: Optional[int] = None,
+                              fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """比较多个机会
         
-        return f"""
-备选方案: {backup_option.name}
-
-如果主方案遇到以下情况，可考虑切换到备选方案:
-• 风险超出预期
-• 资源不足
-• 外部环境变化
-• 预期收益大幅下降
-
-备选方案优势:
-{chr(10).join(f"• {pro}" for pro in backup_option.pros)}
-        """.strip()
-    
-    def compare_opportunities(self, opportunities: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """比较多个机会"""
+        simulate=True 时额外运行蒙特卡洛模拟，结果放在 'simulation' 字段中；
+        fields 指定返回的字段 (如 ['recommended_option', 'confidence_score'])，未请求的文本不会渲染
+        """
         
         # 转换为DecisionOption对象
         options = []
@@ -226,17 +281,15 @@ class DecisionSupportAI:
         )
         
         # 分析决策
-        recommendation = self.analyze_decision(context, options)
+        recommendation = self.analyze_decision(context, options, weights)
         
-        return {
-            'recommended_option': recommendation.recommended_option,
-            'confidence_score': recommendation.confidence_score,
-            'reasoning': recommendation.reasoning,
-            'risk_analysis': recommendation.risk_analysis,
-            'action_plan': recommendation.action_plan,
-            'success_metrics': recommendation.success_metrics,
-            'fallback_plan': recommendation.fallback_plan
-        }
+        result = recommendation.to_dict(fields)
+        
+        if simulate:
+            simulator = MonteCarloSimulator(n_draws=simulation_draws, workers=simulation_workers)
+            result['simulation'] = simulator.simulate(options)
+        
+        return result
 
 # 使用示例
 if __name__ == "__main__":
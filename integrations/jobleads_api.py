@@ -6,6 +6,7 @@ JobLeads API集成模块
 
 import json
 import time
+from collections import OrderedDict
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 import re
@@ -13,12 +14,21 @@ import re
 class JobLeadsAPI:
     """JobLeads API客户端"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, cache_size: int = 256, cache_ttl: float = 900,
+                 jobs: Optional[List[Dict[str, Any]]] = None):
         self.api_key = api_key
         self.base_url = "https://api.jobleads.com/v1"  # 假设的API端点
         
         # 由于演示环境可能没有requests库，我们主要使用模拟数据
         self.use_mock_data = True
+        # 外部职位库 (如基准测试生成的职位)，设置后代替内置的模拟职位
+        self.jobs = jobs
+        
+        # 搜索结果缓存: 查询条件 -> (写入时间, 职位列表)，LRU淘汰
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._search_cache: OrderedDict = OrderedDict()
+        self.cache_stats = {'hits': 0, 'misses': 0}
     
     def search_jobs(self, 
                    keywords: List[str] = None,
@@ -41,9 +51,51 @@ class JobLeadsAPI:
         Returns:
             职位列表
         """
+        # 关键词匹配不区分大小写和顺序，按规范化后的条件缓存
+        cache_key = (tuple(sorted({k.lower() for k in keywords})) if keywords else (),
+                     location, remote, salary_min, job_type, limit)
+        cached = self._search_cache.get(cache_key)
+        if cached is not None and time.time() - cached[0] < self.cache_ttl:
+            self._search_cache.move_to_end(cache_key)
+            self.cache_stats['hits'] += 1
+            # 调用方会在职位字典上写入匹配度等字段，返回副本
+            return [dict(job) for job in cached[1]]
+        self.cache_stats['misses'] += 1
         
         # 使用模拟数据（在实际环境中，这里会调用真实的JobLeads API）
-        return self._get_mock_jobs(keywords, location, remote, salary_min, job_type, limit)
+        if self.jobs is not None:
+            jobs = [dict(job) for job in self._filter_jobs(self.jobs, keywords, remote, salary_min, job_type, limit)]
+        else:
+            jobs = self._get_mock_jobs(keywords, location, remote, salary_min, job_type, limit)
+        
+        self._search_cache[cache_key] = (time.time(), [dict(job) for job in jobs])
+        self._search_cache.move_to_end(cache_key)
+        while len(self._search_cache) > self.cache_size:
+            self._search_cache.popitem(last=False)
+        return jobs
+    
+    def prewarm_cache(self, keywords: List[str], remote: bool = True, limit: int = 50) -> int:
+        """
+        按热门搜索关键词预先填充搜索缓存
+        
+        Args:
+            keywords: 关键词列表，通常来自 SearchTrends.trending()
+            remote: 与 search_jobs 相同
+            limit: 与 search_jobs 相同
+        
+        Returns:
+            新写入缓存的查询数
+        """
+        warmed = 0
+        for keyword in keywords:
+            misses = self.cache_stats['misses']
+            self.search_jobs(keywords=[keyword], remote=remote, limit=limit)
+            warmed += self.cache_stats['misses'] - misses
+        return warmed
+    
+    def clear_cache(self):
+        """清空搜索缓存"""
+        self._search_cache.clear()
     
     def _get_mock_jobs(self, keywords, location, remote, salary_min, job_type, limit) -> List[Dict[str, Any]]:
         """获取模拟职位数据"""
@@ -212,9 +264,12 @@ class JobLeadsAPI:
             }
         ]
         
-        # 根据搜索条件过滤
+        return self._filter_jobs(mock_jobs, keywords, remote, salary_min, job_type, limit)
+    
+    def _filter_jobs(self, jobs, keywords, remote, salary_min, job_type, limit) -> List[Dict[str, Any]]:
+        """根据搜索条件过滤职位"""
         filtered_jobs = []
-        for job in mock_jobs:
+        for job in jobs:
             # 关键词匹配
             if keywords:
                 job_text = f"{job['title']} {job['description']} {' '.join(job['requirements'])}".lower()
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+LLM客户端连接池
+Shared async LLM client pool with rate-limit aware scheduling
+
+所有智能体共享同一个异步客户端（复用HTTP连接），请求按优先级排队，
+由请求数/令牌数两个令牌桶共同限流，遇到429时自适应退避。
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Dict, List, Optional, Any, Tuple
+
+import openai
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
+
+class RequestPriority(IntEnum):
+    """请求优先级 (数值越小越先调度)"""
+    INTERACTIVE = 0  # 用户正在等待的请求
+    BATCH = 1        # 离线/批量任务
+
+@dataclass
+class LLMPoolConfig:
+    """连接池配置"""
+    model: str = "gpt-4o-mini"
+    base_url: Optional[str] = None          # 指向本地桩服务器时使用
+    requests_per_minute: float = 500
+    tokens_per_minute: float = 200000
+    max_concurrency: int = 16
+    burst_seconds: float = 10.0             # 令牌桶容量 = 速率 * burst_seconds
+    batch_reserve: float = 0.2              # 为交互请求保留的配额比例
+    max_retries: int = 5
+    request_timeout: float = 60.0
+
+    @classmethod
+    def from_config(cls, config_path: str = DEFAULT_CONFIG_PATH) -> 'LLMPoolConfig':
+        """从config.json的llm_pool段读取配置，文件或配置段缺失时使用默认值"""
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            config = {}
+
+        section = config.get('llm_pool', {})
+        known = {k: v for k, v in section.items() if k in cls.__dataclass_fields__}
+        return cls(**known)
+
+class TokenBucket:
+    """令牌桶限流器 (按每分钟配额匀速补充)"""
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        self.per_minute = per_minute
+        self.burst_seconds = burst_seconds
+        self.scale = 1.0  # 自适应退避时的速率倍数
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        """当前每秒补充速率"""
+        return self.per_minute * self.scale / 60.0
+
+    @property
+    def capacity(self) -> float:
+        return max(self.per_minute / 60.0 * self.burst_seconds, 1.0)
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def delay_for(self, amount: float, reserve: float = 0.0, now: Optional[float] = None) -> float:
+        """返回可以消费amount个令牌（并保留reserve个）之前需要等待的秒数"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        # 单个请求超过桶容量时按满桶处理，否则永远无法调度
+        needed = min(amount + reserve, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def consume(self, amount: float, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        """按实际用量修正预估 (amount为负表示补扣)"""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+@dataclass(order=True)
+class _PendingRequest:
+    priority: int
+    sequence: int
+    kwargs: Dict[str, Any] = field(compare=False)
+    estimated_tokens: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+class LLMClientPool:
+    """有界并发的LLM客户端池"""
+
+    def __init__(self, api_key: Optional[str] = None, config: Optional[LLMPoolConfig] = None,
+                 client: Optional[Any] = None):
+        self.config = config or LLMPoolConfig()
+        self.api_key = api_key
+        self._client = client
+
+        self.request_bucket = TokenBucket(self.config.requests_per_minute, self.config.burst_seconds)
+        self.token_bucket = TokenBucket(self.config.tokens_per_minute, self.config.burst_seconds)
+
+        self._queue: List[_PendingRequest] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._backoff = 1.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.stats = {
+            'completed': 0,
+            'failed': 0,
+            'rate_limited': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0
+        }
+
+    @property
+    def client(self):
+        """共享的异步客户端，所有请求复用同一个HTTP连接池"""
+        if self._client is None:
+            kwargs = {'api_key': self.api_key, 'max_retries': 0, 'timeout': self.config.request_timeout}
+            if self.config.base_url:
+                kwargs['base_url'] = self.config.base_url
+            self._client = openai.AsyncOpenAI(**kwargs)
+        return self._client
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch_loop())
+
+    @staticmethod
+    def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+        """粗略估算一次请求消耗的令牌数 (中文约每字1个令牌，英文约每4字符1个)"""
+        prompt_tokens = 0
+        for message in messages:
+            content = message.get('content') or ''
+            ascii_chars = sum(1 for ch in content if ord(ch) < 128)
+            prompt_tokens += ascii_chars // 4 + (len(content) - ascii_chars) + 4
+        return prompt_tokens + max_tokens
+
+    async def complete(self, messages: List[Dict[str, str]],
+                       priority: RequestPriority = RequestPriority.INTERACTIVE,
+                       max_tokens: int = 512, **kwargs) -> Any:
+        """提交一次对话补全请求并等待原始响应"""
+        self._ensure_started()
+
+        kwargs.setdefault('model', self.config.model)
+        kwargs['messages'] = messages
+        kwargs['max_tokens'] = max_tokens
+
+        request = _PendingRequest(
+            priority=int(priority),
+            sequence=next(self._sequence),
+            kwargs=kwargs,
+            estimated_tokens=self.estimate_tokens(messages, max_tokens),
+            future=self._loop.create_future()
+        )
+        heapq.heappush(self._queue, request)
+        self._wakeup.set()
+        return await request.future
+
+    async def chat(self, prompt: str, system: Optional[str] = None,
+                   priority: RequestPriority = RequestPriority.INTERACTIVE, **kwargs) -> str:
+        """便捷接口：发送单轮提示并返回文本"""
+        messages = []
+        if system:
+            messages.append({'role': 'system', 'content': system})
+        messages.append({'role': 'user', 'content': prompt})
+
+        response = await self.complete(messages, priority=priority, **kwargs)
+        return response.choices[0].message.content or ''
+
+    def _admission_delay(self, request: _PendingRequest, now: float) -> float:
+        """计算队首请求还需等待多久才能发出"""
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        request_reserve = token_reserve = 0.0
+        if request.priority >= RequestPriority.BATCH:
+            # 批量请求不能动用为交互请求预留的那部分额度
+            request_reserve = self.request_bucket.capacity * self.config.batch_reserve
+            token_reserve = self.token_bucket.capacity * self.config.batch_reserve
+
+        return max(
+            self.request_bucket.delay_for(1, request_reserve, now),
+            self.token_bucket.delay_for(request.estimated_tokens, token_reserve, now)
+        )
+
+    async def _dispatch_loop(self):
+        """调度循环：始终优先处理优先级最高的请求"""
+        while True:
+            if not self._queue or self._in_flight >= self.config.max_concurrency:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            request = self._queue[0]
+            if request.future.cancelled():
+                heapq.heappop(self._queue)
+                continue
+
+            now = time.monotonic()
+            delay = self._admission_delay(request, now)
+            if delay > 0:
+                # 等待配额恢复，期间若有更高优先级请求到达则提前唤醒重新选择
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._queue)
+            self.request_bucket.consume(1, now)
+            self.token_bucket.consume(request.estimated_tokens, now)
+            self._in_flight += 1
+            self._loop.create_task(self._execute(request))
+
+    async def _execute(self, request: _PendingRequest):
+        request.attempts += 1
+        try:
+            response = await self.client.chat.completions.create(**request.kwargs)
+        except openai.RateLimitError as e:
+            self._on_rate_limited(e)
+            if request.attempts <= self.config.max_retries and not request.future.cancelled():
+                heapq.heappush(self._queue, request)
+            elif not request.future.done():
+                self.stats['failed'] += 1
+                request.future.set_exception(e)
+        except Exception as e:
+            self.stats['failed'] += 1
+            if not request.future.done():
+                request.future.set_exception(e)
+        else:
+            self._on_success(request, response)
+            if not request.future.done():
+                request.future.set_result(response)
+        finally:
+            self._in_flight -= 1
+            self._wakeup.set()
+
+    def _on_success(self, request: _PendingRequest, response: Any):
+        """成功后按实际用量修正令牌桶，并缓慢恢复速率 (加性增)"""
+        self.stats['completed'] += 1
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            actual = (usage.prompt_tokens or 0) + (usage.completion_tokens or 0)
+            self.token_bucket.refund(request.estimated_tokens - actual)
+            self.stats['prompt_tokens'] += usage.prompt_tokens or 0
+            self.stats['completion_tokens'] += usage.completion_tokens or 0
+
+        self._backoff = max(1.0, self._backoff * 0.5)
+        for bucket in (self.request_bucket, self.token_bucket):
+            bucket.scale = min(1.0, bucket.scale + 0.02)
+
+    def _on_rate_limited(self, error: openai.RateLimitError):
+        """收到429：暂停调度并降低速率 (乘性减)"""
+        self.stats['rate_limited'] += 1
+        retry_after = _parse_retry_after(getattr(error, 'response', None))
+
+        pause = retry_after if retry_after is not None else self._backoff * (1 + random.random() * 0.25)
+        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        self._backoff = min(self._backoff * 2, 60.0)
+
+        for bucket in (self.request_bucket, self.token_bucket):
+            bucket.scale = max(0.1, bucket.scale * 0.7)
+
+    async def close(self):
+        """停止调度并关闭底层HTTP连接"""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for request in self._queue:
+            if not request.future.done():
+                request.future.cancel()
+        self._queue.clear()
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+def _parse_retry_after(response: Any) -> Optional[float]:
+    """解析Retry-After / x-ratelimit-reset-requests响应头"""
+    if response is None:
+        return None
+    headers = getattr(response, 'headers', {}) or {}
+
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get('retry-after')
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return None
+
+_shared_pools: Dict[Tuple[Optional[str], Optional[str]], LLMClientPool] = {}
+
+def get_shared_pool(api_key: Optional[str] = None, config: Optional[LLMPoolConfig] = None) -> LLMClientPool:
+    """获取进程内共享的连接池 (同一api_key和base_url只创建一次)；未指定config时读取config.json的llm_pool段"""
+    config = config or LLMPoolConfig.from_config()
+    key = (api_key, config.base_url)
+    if key not in _shared_pools:
+        _shared_pools[key] = LLMClientPool(api_key, config)
+    return _shared_pools[key]
+
+# 使用示例：针对本地桩服务器压测调度器
+def _start_stub_server(port: int = 0, rate_limit_every: int = 7):
+    """启动一个模拟OpenAI接口的本地HTTP服务器，每N个请求返回一次429"""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    counter = itertools.count(1)
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+
+            if next(counter) % rate_limit_every == 0:
+                payload = json.dumps({'error': {'message': 'Rate limit reached', 'type': 'rate_limit_error'}})
+                self.send_response(429)
+                self.send_header('Retry-After', '0.2')
+            else:
+                prompt = body.get('messages', [{}])[-1].get('content', '')
+                payload = json.dumps({
+                    'id': 'chatcmpl-stub',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': body.get('model', 'stub'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': f'echo: {prompt}'},
+                        'finish_reason': 'stop'
+                    }],
+                    'usage': {'prompt_tokens': len(prompt), 'completion_tokens': 8, 'total_tokens': len(prompt) + 8}
+                })
+                self.send_response(200)
+
+            data = payload.encode('utf-8')
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+async def demo_llm_pool():
+    """演示连接池在本地桩服务器上的调度效果"""
+    server = _start_stub_server()
+    config = LLMPoolConfig(
+        base_url=f"http://127.0.0.1:{server.server_address[1]}/v1",
+        requests_per_minute=1200,
+        tokens_per_minute=600000,
+        max_concurrency=8
+    )
+    pool = LLMClientPool(api_key="stub-key", config=config)
+
+    started = time.monotonic()
+    batch = [pool.chat(f"批量任务 {i}", priority=RequestPriority.BATCH, max_tokens=16) for i in range(40)]
+    interactive = [pool.chat(f"交互请求 {i}", max_tokens=16) for i in range(5)]
+    results = await asyncio.gather(*batch, *interactive)
+
+    print(f"完成 {len(results)} 个请求，用时 {time.monotonic() - started:.2f}s")
+    print("统计:", json.dumps(pool.stats, ensure_ascii=False))
+
+    await pool.close()
+    server.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(demo_llm_pool())
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+机会目录 - 预计算索引的机会库
+Opportunity Catalog with precomputed attribute indexes
+
+机会只在入库时构建一次，并按技能、风险等级、收入区间、时间投入建立索引。
+查询"适合该用户的前K个机会"时先通过索引生成候选，再对候选打分，无需遍历全库。
+过了截止日期的机会在查询时从各索引中移除，长期运行的进程中索引不会堆积失效条目。
+"""
+
+import bisect
+import heapq
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 区间下界（含），最后一个区间无上界
+INCOME_BANDS = (0, 1000, 3000, 5000, 10000, 20000)
+TIME_BANDS = (0, 10, 20, 40, 80)
+
+def _band(value: float, bands: Tuple[int, ...]) -> int:
+    """返回value所在区间的下标"""
+    return max(bisect.bisect_right(bands, value) - 1, 0)
+
+def _normalize_skill(skill: str) -> str:
+    return skill.strip().lower()
+
+class OpportunityCatalog:
+    """机会目录
+
+    条目需具备 potential_income / time_investment / risk_level / skills_required / deadline
+    属性（即 ai_agents_architecture.Opportunity）。
+    """
+
+    def __init__(self):
+        # 条目ID即下标，已移除的条目置为None
+        self._entries: List[Any] = []
+        self._live = 0
+        self._base_scores: List[float] = []
+        self._skill_counts: List[int] = []
+
+        # 技能倒排索引: 技能 -> 条目ID列表
+        self._skill_index: Dict[str, List[int]] = {}
+        # 风险/收入/时间网格索引: (风险等级, 收入区间, 时间区间) -> [(-基础分, 条目ID)] 有序列表
+        self._grid_index: Dict[Tuple[int, int, int], List[Tuple[float, int]]] = {}
+        # 截止日期最小堆: (截止日期, 条目ID)
+        self._deadlines: List[Tuple[datetime, int]] = []
+
+    def __len__(self) -> int:
+        return self._live
+
+    def __iter__(self) -> Iterator[Any]:
+        return (entry for entry in self._entries if entry is not None)
+
+    def get(self, entry_id: int) -> Any:
+        """按条目ID取机会，已移除的条目返回None"""
+        return self._entries[entry_id]
+
+    @staticmethod
+    def base_score(opportunity: Any) -> float:
+        """与用户无关的评分部分 (收入潜力、时间效率、风险)，入库时计算一次"""
+        income_score = min(opportunity.potential_income / 10000, 1.0) * 0.3
+        efficiency_score = (opportunity.potential_income / max(opportunity.time_investment, 1)) / 100 * 0.2
+        risk_score = (10 - opportunity.risk_level) / 10 * 0.2
+        return income_score + efficiency_score + risk_score
+
+    def add(self, opportunity: Any) -> int:
+        """添加机会并更新索引，返回条目ID"""
+        entry_id = len(self._entries)
+        base = self.base_score(opportunity)
+        skills = {_normalize_skill(s) for s in opportunity.skills_required}
+
+        self._entries.append(opportunity)
+        self._live += 1
+        self._base_scores.append(base)
+        self._skill_counts.append(len(opportunity.skills_required))
+
+        for skill in skills:
+            self._skill_index.setdefault(skill, []).append(entry_id)
+
+        bisect.insort(self._grid_index.setdefault(self._cell(opportunity), []), (-base, entry_id))
+        if opportunity.deadline is not None:
+            heapq.heappush(self._deadlines, (opportunity.deadline, entry_id))
+        return entry_id
+
+    @staticmethod
+    def _cell(opportunity: Any) -> Tuple[int, int, int]:
+        return (
+            int(opportunity.risk_level),
+            _band(opportunity.potential_income, INCOME_BANDS),
+            _band(opportunity.time_investment, TIME_BANDS)
+        )
+
+    def remove(self, entry_id: int):
+        """从目录和所有索引中移除条目 (条目ID不复用)"""
+        opportunity = self._entries[entry_id]
+        if opportunity is None:
+            return
+        self._entries[entry_id] = None
+        self._live -= 1
+
+        for skill in {_normalize_skill(s) for s in opportunity.skills_required}:
+            postings = self._skill_index[skill]
+            postings.remove(entry_id)
+            if not postings:
+                del self._skill_index[skill]
+
+        cell = self._cell(opportunity)
+        entries = self._grid_index[cell]
+        key = (-self._base_scores[entry_id], entry_id)
+        del entries[bisect.bisect_left(entries, key)]
+        if not entries:
+            del self._grid_index[cell]
+
+    def evict_expired(self, now: Optional[datetime] = None) -> int:
+        """移除截止日期早于now的条目，返回移除的条目数"""
+        now = now or datetime.now()
+        evicted = 0
+        while self._deadlines and self._deadlines[0][0] < now:
+            _, entry_id = heapq.heappop(self._deadlines)
+            if self._entries[entry_id] is not None:
+                self.remove(entry_id)
+                evicted += 1
+        return evicted
+
+    def extend(self, opportunities: List[Any]) -> List[int]:
+        return [self.add(opp) for opp in opportunities]
+
+    def top_k(self, profile: Dict[str, Any], k: int = 5,
+              now: Optional[datetime] = None) -> List[Tuple[float, Any]]:
+        """返回该用户画像下得分最高的k个机会 [(得分, 机会)]
+
+        profile支持的字段:
+            skills: 用户技能列表
+            risk_tolerance: 可接受的最高风险等级 (1-10)
+            available_hours: 可投入的最长时间
+            min_income: 期望的最低收入
+
+        查询前先按当前时间移除已过期的条目；now 只用于本次查询的截止日期过滤。
+        """
+        self.evict_expired()
+        if k <= 0 or not self._live:
+            return []
+
+        now = now or datetime.now()
+        max_risk = profile.get('risk_tolerance', 10)
+        max_hours = profile.get('available_hours')
+        min_income = profile.get('min_income', 0) or 0
+
+        def admissible(entry_id: int) -> bool:
+            opp = self._entries[entry_id]
+            if opp.risk_level > max_risk or opp.potential_income < min_income:
+                return False
+            if max_hours is not None and opp.time_investment > max_hours:
+                return False
+            return opp.deadline is None or opp.deadline >= now
+
+        scored: Dict[int, float] = {}
+
+        # 1. 技能候选：通过倒排索引统计每个条目命中的技能数
+        user_skills = {_normalize_skill(s) for s in profile.get('skills', [])}
+        matches = Counter()
+        for skill in user_skills:
+            matches.update(self._skill_index.get(skill, ()))
+
+        for entry_id, matched in matches.items():
+            if admissible(entry_id):
+                skill_match = matched / max(self._skill_counts[entry_id], 1)
+                scored[entry_id] = self._base_scores[entry_id] + skill_match * 0.3
+
+        # 2. 无技能命中的条目得分即基础分：从符合约束的网格单元中按基础分归并取前k个
+        cells = [
+            entries for (risk, income_band, time_band), entries in self._grid_index.items()
+            if risk <= max_risk
+            and (income_band + 1 >= len(INCOME_BANDS) or INCOME_BANDS[income_band + 1] > min_income)
+            and (max_hours is None or TIME_BANDS[time_band] <= max_hours)
+        ]
+        taken = 0
+        for neg_base, entry_id in heapq.merge(*cells):
+            if taken >= k:
+                break
+            if entry_id in scored or not admissible(entry_id):
+                continue
+            scored[entry_id] = -neg_base
+            taken += 1
+
+        best = heapq.nlargest(k, scored.items(), key=lambda item: item[1])
+        return [(score, self._entries[entry_id]) for entry_id, score in best]
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+行为记录解码测试
+Action Codec Tests
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import action_codec
+from database.action_codec import decode_actions, encode_record, load_actions, to_timestamp
+
+def _decode(timestamps):
+    actions = [{
+        'action_id': str(i),
+        'user_id': 'user_1',
+        'action_type': 'login',
+        'timestamp': ts,
+        'details': {}
+    } for i, ts in enumerate(timestamps)]
+    return [r.ts for r in decode_actions(json.dumps({'actions': actions}))]
+
+def test_offset_timestamps_match_scalar_path():
+    values = ['2025-08-29T19:43:00+08:00', '2025-08-29T19:43:00Z']
+    assert _decode(values) == [to_timestamp(v) for v in values]
+
+def test_mixed_timestamps_keep_order():
+    values = ['2025-08-29T19:43:00', '2025-08-29T19:43:00+08:00',
+              '2025-08-30T01:02:03.456789', '2025-08-29T10:00:00-05:00']
+    assert _decode(values) == [to_timestamp(v) for v in values]
+
+def test_nested_details_are_frozen(tmp_path):
+    path = tmp_path / "user_actions.json"
+    path.write_text(json.dumps({'actions': [{
+        'action_id': '1', 'user_id': 'user_1', 'action_type': 'search', 'timestamp': '2025-08-29T19:43:00',
+        'details': {'keywords': ['python'], 'filters': {'remote': True, 'tags': ['a']}}
+    }]}), encoding='utf-8')
+
+    details = load_actions(str(path))[0].details
+    with pytest.raises(TypeError):
+        details['filters']['remote'] = False
+    with pytest.raises(AttributeError):
+        details['keywords'].append('java')
+
+    encoded = encode_record(load_actions(str(path))[0])
+    encoded['details']['keywords'].append('java')
+    assert encoded['details'] == {'keywords': ['python', 'java'], 'filters': {'remote': True, 'tags': ['a']}}
+    assert load_actions(str(path))[0].details['keywords'] == ('python',)
+
+def test_load_actions_cache_is_bounded(tmp_path):
+    for i in range(action_codec.MAX_CACHED_FILES + 2):
+        path = tmp_path / f"actions_{i}.json"
+        path.write_text(json.dumps({'actions': []}), encoding='utf-8')
+        load_actions(str(path))
+    assert len(action_codec._cache) <= action_codec.MAX_CACHED_FILES
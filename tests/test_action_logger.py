@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+行为日志异步批量写入测试
+Write-behind Action Logger Tests
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.action_logger import JSONFileActionSink, WriteBehindActionLogger
+from database.sqlite_db import SQLiteUserDatabase
+from user_system.models import ActionType
+
+def _record(action_id: str):
+    return {'action_id': action_id, 'user_id': 'user_1', 'action_type': 'login',
+            'timestamp': '2025-08-29T19:43:00', 'details': {}}
+
+def _action_ids(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [a['action_id'] for a in json.load(f)['actions']]
+
+def test_json_sink_keeps_actions_from_other_writers(tmp_path):
+    path = str(tmp_path / "user_actions.json")
+    first, second = JSONFileActionSink(path), JSONFileActionSink(path)
+    first.write_batch([_record('a')], fsync=False)
+    second.write_batch([_record('b')], fsync=False)
+    first.write_batch([_record('c')], fsync=False)
+    assert _action_ids(path) == ['a', 'b', 'c']
+
+def test_json_sink_failed_batch_is_not_written_later(tmp_path, monkeypatch):
+    path = str(tmp_path / "user_actions.json")
+    sink = JSONFileActionSink(path)
+    sink.write_batch([_record('a')], fsync=False)
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, 'replace', fail)
+    with pytest.raises(OSError):
+        sink.write_batch([_record('lost')], fsync=False)
+    monkeypatch.undo()
+
+    sink.write_batch([_record('b')], fsync=False)
+    assert _action_ids(path) == ['a', 'b']
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+def test_database_logger_notifies_listeners(tmp_path):
+    db = SQLiteUserDatabase(str(tmp_path), "test.db")
+    seen = []
+    logger = db.start_action_logger(listeners=[seen.extend], flush_interval=60)
+    assert isinstance(logger, WriteBehindActionLogger)
+
+    db.log_user_action('user_1', ActionType.SEARCH, {'keywords': ['python']})
+    logger.flush()
+    assert [record['user_id'] for record in seen] == ['user_1']
+    assert len(db.get_user_actions('user_1')) == 1
+    db.close()
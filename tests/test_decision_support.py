@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+决策支持测试
+Decision Support Tests
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from decision_engine import top_k_indices
+from decision_support_ai import DecisionRecommendation, DecisionSupportAI
+
+def _opportunity(title, **overrides):
+    opportunity = {'title': title, 'risk_level': 4, 'potential_income': 50000, 'time_investment': 500,
+                   'success_probability': 0.7}
+    opportunity.update(overrides)
+    return opportunity
+
+def test_tied_options_rank_by_position():
+    assert top_k_indices(np.array([1.0, 2.0, 2.0, 2.0, 0.0]), 2).tolist() == [1, 2]
+    assert top_k_indices(np.array([[3.0, 1.0, 1.0, 1.0], [0.0, 1.0, 1.0, 1.0]]), 2).tolist() == [[0, 1], [1, 2]]
+
+    ai = DecisionSupportAI()
+    result = ai.compare_opportunities([_opportunity('低分', success_probability=0.3),
+                                       _opportunity('甲'), _opportunity('乙'), _opportunity('丙')])
+    assert result['recommended_option'] == '甲'
+    assert '备选方案: 乙' in result['fallback_plan']
+
+def test_confidence_matches_sequential_sum():
+    result = DecisionSupportAI().compare_opportunities([_opportunity('甲', risk_level=6, potential_income=100000,
+                                                                     time_investment=800, success_probability=0.5)])
+    expected = 1.0 * 0.3 + (1 - 0.6) * 0.25 + 0.5 * 0.25 + min(100000 / 800 / 1000, 1.0) * 0.2
+    assert result['confidence_score'] == expected
+
+def test_recommendation_accepts_prerendered_text():
+    recommendation = DecisionRecommendation('甲', 0.9, '推理', '风险', ['计划'], ['指标'], '备选')
+    assert recommendation.to_dict()['reasoning'] == '推理'
+    assert recommendation.to_dict(fields=[]) == {}
+    with pytest.raises(TypeError):
+        DecisionRecommendation('甲', 0.9)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+自由度批量评估测试
+Bulk Freedom Scoring Tests
+"""
+
+import io
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.freedom_bulk import ResultWriter, score_stream
+
+def _reject_constant(name):
+    raise ValueError(f"输出不是合法JSON: {name}")
+
+def _score(records):
+    stream = io.StringIO()
+    score_stream(records, ResultWriter(stream, 'ndjson'), chunk_size=2)
+    # NaN/Infinity 不是合法的JSON
+    return [json.loads(line, parse_constant=_reject_constant) for line in stream.getvalue().splitlines()]
+
+def test_null_and_non_finite_values_use_column_default(capsys):
+    base = {'user_id': 'u0', 'passive_income': 0, 'active_income': 5000, 'monthly_expenses': 3000}
+    records = [dict(base, user_id='u0'),
+               dict(base, user_id='u1', passive_income=None),
+               dict(base, user_id='u2', passive_income='nan'),
+               dict(base, user_id='u3', passive_income='inf'),
+               dict(base, user_id='u4', active_income='abc')]
+    rows = _score(records)
+
+    assert [row['financial'] for row in rows[1:4]] == [rows[0]['financial']] * 3
+    assert len({row['level'] for row in rows[:4]}) == 1
+    errors = capsys.readouterr().err
+    assert 'passive_income 列有 2 个无效数值' in errors and '(记录 3, 4)' in errors
+    assert 'active_income 列有 1 个无效数值' in errors and '(记录 5)' in errors
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+自由度计算器测试
+Freedom Calculator Tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.freedom_calculator import FreedomCalculator
+
+INPUT = {
+    'financial': {'passive_income': 100, 'active_income': 5000, 'monthly_expenses': 3000},
+    'time': {'flexible_hours': 10}
+}
+
+def test_incremental_results_are_not_shared_between_responses():
+    calculator = FreedomCalculator()
+    first = calculator.calculate_assessment(INPUT, user_id='u1')
+    first['individual_results']['financial']['recommendations'].append('修改响应')
+    first['individual_results']['time']['score'] = -1
+
+    second = calculator.calculate_assessment(INPUT, user_id='u1')
+    assert second['recomputed'] == []
+    assert '修改响应' not in second['individual_results']['financial']['recommendations']
+    assert second['individual_results']['time']['score'] >= 0
+
+def test_sweep_rejects_empty_value_lists():
+    calculator = FreedomCalculator()
+    with pytest.raises(ValueError):
+        calculator.sweep(INPUT, {'passive_income': []})
+    assert calculator.sweep(INPUT, {})['variables'] == {}
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+个性化洞察预计算测试
+Insight Scheduler Tests
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analytics.insight_scheduler import InsightScheduler
+from database.sqlite_db import SQLiteUserDatabase
+
+class CountingAnalytics:
+    """只记录调用次数的 BehaviorAnalytics 替身"""
+
+    def __init__(self, db):
+        self.db = db
+        self.calls = 0
+
+    def generate_personalized_insights(self, user_id):
+        self.calls += 1
+        return {'user_id': user_id, 'run': self.calls}
+
+def _scheduler(tmp_path, **options):
+    db = SQLiteUserDatabase(str(tmp_path), "test.db")
+    return db, InsightScheduler(CountingAnalytics(db), workers=1, store_path=None, **options)
+
+def test_expired_document_is_recomputed(tmp_path):
+    db, scheduler = _scheduler(tmp_path, max_age=60)
+    first = scheduler.get('user_1')
+    assert scheduler.get('user_1') is first
+
+    first['computed_at'] = (datetime.now() - timedelta(seconds=120)).isoformat()
+    assert scheduler.expired_users() == ['user_1']
+    second = scheduler.get('user_1')
+    assert second['version'] > first['version']
+    assert scheduler.stats['expired'] == 1
+    scheduler.close()
+
+def test_expired_documents_refresh_in_background_run(tmp_path):
+    db, scheduler = _scheduler(tmp_path, max_age=60)
+    scheduler.run_once()
+    document = scheduler.get('user_1')
+    document['computed_at'] = (datetime.now() - timedelta(seconds=120)).isoformat()
+    assert scheduler.run_once() == 1
+    assert scheduler.get('user_1')['version'] > document['version']
+    scheduler.close()
+
+def test_preference_update_marks_user(tmp_path):
+    db, scheduler = _scheduler(tmp_path, max_age=None)
+    user = db.create_user("insight_test", "insight@test.com", "password123")
+    document = scheduler.get(user.user_id)
+    scheduler.run_once()
+
+    db.update_user_preferences(user.user_id, {'preferred_job_types': ['remote']})
+    assert scheduler.run_once() == 1
+    assert scheduler.get(user.user_id)['version'] > document['version']
+    scheduler.close()
+
+def test_actions_flushed_after_scan_are_picked_up(tmp_path):
+    db, scheduler = _scheduler(tmp_path, max_age=None)
+    scheduler.run_once()
+    # 上一轮开始前发生、扫描之后才写入的行为
+    db.log_user_actions([{'action_id': 'late', 'user_id': 'user_late', 'action_type': 'search',
+                          'timestamp': scheduler._last_run - timedelta(seconds=5), 'details': {}}])
+    assert scheduler.run_once() == 1
+    assert scheduler.get('user_late')['insights']['user_id'] == 'user_late'
+    scheduler.close()
+
+def test_overlap_covers_action_logger_flush_interval(tmp_path):
+    db, scheduler = _scheduler(tmp_path, scan_overlap=1.0)
+    db.start_action_logger(flush_interval=30)
+    assert scheduler._overlap() == timedelta(seconds=60)
+    db.close()
+    scheduler.close()
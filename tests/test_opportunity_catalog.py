@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+机会目录测试
+Opportunity Catalog Tests
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from opportunity_catalog import OpportunityCatalog
+
+def _opportunity(title, deadline, skills=("Python",), income=3000.0):
+    return SimpleNamespace(title=title, potential_income=income, time_investment=20, risk_level=3,
+                           skills_required=list(skills), deadline=deadline)
+
+def test_expired_entries_are_evicted_from_indexes():
+    now = datetime.now()
+    catalog = OpportunityCatalog()
+    catalog.extend([
+        _opportunity("expired", now - timedelta(days=1)),
+        _opportunity("open", now + timedelta(days=30)),
+        _opportunity("no deadline", None, skills=("AI",), income=5000.0)
+    ])
+
+    titles = [opp.title for _, opp in catalog.top_k({'skills': ['python']}, k=5)]
+    assert titles == ["open", "no deadline"]
+    assert len(catalog) == 2
+    assert catalog.get(0) is None
+    assert sum(len(entries) for entries in catalog._grid_index.values()) == 2
+    assert catalog._skill_index['python'] == [1]
+
+def test_remove_then_query_remaining():
+    catalog = OpportunityCatalog()
+    ids = catalog.extend([_opportunity(f"o{i}", None, income=1000.0 * (i + 1)) for i in range(4)])
+    catalog.remove(ids[3])
+    catalog.remove(ids[3])
+    assert [opp.title for opp in catalog] == ["o0", "o1", "o2"]
+    assert [opp.title for _, opp in catalog.top_k({}, k=2)] == ["o2", "o1"]
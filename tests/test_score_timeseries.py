@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+自由度评分时间序列存储测试
+Score Time-Series Tests
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.score_timeseries import ScoreTimeSeries
+
+NOW = datetime(2025, 9, 1, 12, 0)
+
+def _timestamps(points):
+    return [datetime.fromisoformat(p['timestamp']) for p in points]
+
+def _compacted(tmp_path, **options):
+    store = ScoreTimeSeries(str(tmp_path), raw_retention_days=30, daily_retention_days=90, **options)
+    for days in (200, 60, 40, 5, 1):
+        store.append('u1', 0.5, NOW - timedelta(days=days), input_data={'days': days})
+    assert store.compact('u1', now=NOW)
+    return store
+
+def test_late_append_keeps_tiers_ordered(tmp_path):
+    store = _compacted(tmp_path)
+    for days in (150, 50, 10):
+        store.append('u1', 0.7, NOW - timedelta(days=days), input_data={'days': days})
+
+    points = store.query('u1')
+    assert _timestamps(points) == sorted(_timestamps(points))
+    assert [p['resolution'] for p in points].count('raw') == 3
+
+    reloaded = ScoreTimeSeries(str(tmp_path), raw_retention_days=30, daily_retention_days=90)
+    assert reloaded.query('u1') == points
+    assert len(reloaded.assessment_inputs('u1')) == 8
+
+def test_repeated_archive_is_deduplicated(tmp_path):
+    store = _compacted(tmp_path)
+    store._archive('u1', [store._archived_points('u1')[0].to_record()])
+    assert len(store.assessment_inputs('u1')) == 5
+
+def test_series_cache_is_bounded(tmp_path):
+    store = ScoreTimeSeries(str(tmp_path), max_cached_users=2)
+    for user_id in ('a', 'b', 'c'):
+        store.append(user_id, 0.5, NOW)
+    assert list(store._series) == ['b', 'c']
+    assert store.latest('a')['score'] == 0.5
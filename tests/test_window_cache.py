@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+分析时间窗口缓存测试
+Window Cache Tests
+"""
+
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analytics.window_cache import ActionWindow, WindowCache
+from database.action_codec import code_of, to_timestamp
+from database.action_scan import scan_actions
+from database.sqlite_db import SQLiteUserDatabase
+
+ACTION_TYPES = ['login', 'search', 'assessment', 'opportunity_view', 'learning_plan']
+
+def _make_db(data_dir, now: datetime, days: int, count: int = 2000) -> SQLiteUserDatabase:
+    rng = random.Random(7)
+    db = SQLiteUserDatabase(str(data_dir), "test.db")
+    db.log_user_actions({
+        'action_id': str(uuid.UUID(int=rng.getrandbits(128))),
+        'user_id': f"user_{rng.randrange(50):012x}",
+        'action_type': rng.choice(ACTION_TYPES),
+        'timestamp': (now - timedelta(seconds=rng.uniform(0, days * 86400))).isoformat(),
+        'details': {}
+    } for _ in range(count))
+    return db
+
+def _uncached(db, cache: WindowCache, days: int, now: datetime) -> ActionWindow:
+    """不经过缓存直接聚合同一个 (起点对齐到桶边界的) 窗口"""
+    start = (to_timestamp(now) - days * 86400 * 1000000) // cache.width * cache.width
+    user_codes, codes, timestamps = [], [], []
+    for action in scan_actions(db, columns=('user_code', 'action_type', 'timestamp')):
+        ts = to_timestamp(action['timestamp'])
+        if ts >= start:
+            user_codes.append(action['user_code'])
+            codes.append(code_of(action['action_type']))
+            timestamps.append(ts)
+    return ActionWindow.from_rows(np.array(user_codes, np.int64), np.array(codes, np.int64),
+                                  np.array(timestamps, np.int64))
+
+def _assert_same(cached: ActionWindow, expected: ActionWindow):
+    assert cached.total_actions == expected.total_actions
+    assert np.array_equal(cached.user_codes, expected.user_codes)
+    assert np.array_equal(cached.counts, expected.counts)
+    assert np.array_equal(cached.first_ts, expected.first_ts)
+    assert np.array_equal(cached.last_ts, expected.last_ts)
+
+def test_window_longer_than_cache_matches_uncached(tmp_path):
+    now = datetime(2025, 6, 1, 12, 30)
+    db = _make_db(tmp_path, now, days=40)
+    cache = WindowCache(db, bucket='hour', max_buckets=24 * 10)
+    days = 30    # 大于 max_buckets / 24
+
+    expected = _uncached(db, cache, days, now)
+    assert expected.total_actions > 0
+    _assert_same(cache.window(days, now=now), expected)
+    # 第二次查询：部分桶已被淘汰，部分仍在缓存中
+    _assert_same(cache.window(days, now=now), expected)
+    assert len(cache._buckets) <= cache.max_buckets
+    db.close()
+
+def test_partially_cached_window_matches_uncached(tmp_path):
+    now = datetime(2025, 6, 1, 12, 30)
+    db = _make_db(tmp_path, now, days=40)
+    cache = WindowCache(db, bucket='hour', max_buckets=24 * 10)
+
+    cache.window(5, now=now)
+    _assert_same(cache.window(30, now=now), _uncached(db, cache, 30, now))
+    _assert_same(cache.window(5, now=now), _uncached(db, cache, 5, now))
+    db.close()
+
+def test_invalidation_during_fill_is_not_lost(tmp_path):
+    now = datetime(2025, 6, 1, 12, 30)
+    db = _make_db(tmp_path, now, days=3)
+    cache = WindowCache(db, bucket='hour')
+    late = {'user_id': 'user_late', 'action_type': 'search', 'timestamp': (now - timedelta(days=1)).isoformat()}
+    scan = cache._scan
+
+    def scan_then_log_late_action(since, until):
+        rows = scan(since, until)
+        if until is not None:
+            db.log_user_actions([dict(late, action_id=str(uuid.uuid4()), details={})])
+            cache.observe_batch([late])
+        return rows
+
+    cache._scan = scan_then_log_late_action
+    cache.window(2, now=now)
+    cache._scan = scan
+    _assert_same(cache.window(2, now=now), _uncached(db, cache, 2, now))
+    assert not cache._bucket_generations
+    db.close()
+
+def test_missing_runs_are_filled_separately(tmp_path):
+    now = datetime(2025, 6, 1, 12, 30)
+    db = _make_db(tmp_path, now, days=10)
+    cache = WindowCache(db, bucket='hour')
+    cache.window(7, now=now)
+    first = min(cache._buckets)
+    # 只保留中间一段，前后各缺一段
+    for index in list(cache._buckets):
+        if not (first + 48 <= index < first + 96):
+            del cache._buckets[index]
+
+    scans = []
+    scan = cache._scan
+    cache._scan = lambda since, until: scans.append((since, until)) or scan(since, until)
+    _assert_same(cache.window(7, now=now), _uncached(db, cache, 7, now))
+    closed_scans = [(since, until) for since, until in scans if until is not None]
+    assert len(closed_scans) == 2
+    assert all(not (since < (first + 96) * cache.width and until > (first + 48) * cache.width)
+               for since, until in closed_scans)
+    db.close()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+批量自由度计算
+Batch Freedom Calculator - columnar scoring for whole user populations
+
+输入为列式数据（NumPy结构化数组或 {列名: 数组} 字典），一次性算出N个用户的
+各维度得分、综合得分、自由度等级和改进优先级，结果与 FreedomCalculator 逐条计算一致。
+"""
+
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.freedom_kernel import (FreedomKernel, financial_formula, get_default_kernel, location_formula,
+                                  skill_formula, time_formula)
+
+DIMENSIONS = ('financial', 'time', 'location', 'skill', 'relationship')
+
+# 列名 -> 缺省值 (与单条计算中 data.get 的默认值一致)
+NUMERIC_COLUMNS = {
+    'passive_income': 0.0,
+    'active_income': 0.0,
+    'monthly_expenses': 0.0,
+    'emergency_fund': 0.0,
+    'work_hours_per_week': 40.0,
+    'flexible_hours': 0.0,
+    'vacation_days': 0.0,
+    'can_work_remotely': 0.0,
+    'can_work_anywhere': 0.0,
+    'travel_frequency': 0.0,
+    'location_constraints': 0.0,
+    'learning_rate': 0.0,
+    'skill_count': 0.0,
+    'market_match_count': 0.0,
+    'relationship_score': 0.5
+}
+
+def _column_names(columns: Any) -> Sequence[str]:
+    names = getattr(getattr(columns, 'dtype', None), 'names', None)
+    return names if names is not None else list(columns.keys())
+
+def _row_count(columns: Any) -> int:
+    if getattr(columns, 'dtype', None) is not None and columns.dtype.names is not None:
+        return columns.shape[0]
+    for value in columns.values():
+        return len(value)
+    return 0
+
+def skill_counts(transferable_skills: Iterable[List[str]],
+                 market_demand_skills: Any = None) -> Dict[str, np.ndarray]:
+    """由技能列表计算 skill_count / market_match_count 两列
+
+    market_demand_skills 可以是所有用户共用的一个列表，也可以是与用户一一对应的列表序列。
+    """
+    skills_column = list(transferable_skills)
+    n = len(skills_column)
+    skill_count = np.fromiter((len(skills or ()) for skills in skills_column), dtype=np.float64, count=n)
+
+    if market_demand_skills is None:
+        return {'skill_count': skill_count, 'market_match_count': np.zeros(n)}
+
+    market_column = list(market_demand_skills)
+    per_user = bool(market_column) and isinstance(market_column[0], (list, tuple, set))
+
+    if per_user:
+        matches = (len(set(skills or ()) & set(market or ())) for skills, market in zip(skills_column, market_column))
+    else:
+        market = frozenset(market_column)
+        matches = (len(market.intersection(skills or ())) for skills in skills_column)
+
+    return {'skill_count': skill_count, 'market_match_count': np.fromiter(matches, dtype=np.float64, count=n)}
+
+def prepare_columns(columns: Any, market_demand_skills: Any = None) -> Dict[str, np.ndarray]:
+    """将任意列式输入规范为 float64 数组字典，缺失列填默认值"""
+    names = set(_column_names(columns))
+    n = _row_count(columns)
+    prepared = {}
+
+    if 'transferable_skills' in names and 'skill_count' not in names:
+        market = columns['market_demand_skills'] if 'market_demand_skills' in names else market_demand_skills
+        prepared.update(skill_counts(columns['transferable_skills'], market))
+
+    for name, default in NUMERIC_COLUMNS.items():
+        if name in prepared:
+            continue
+        if name in names:
+            prepared[name] = np.asarray(columns[name], dtype=np.float64)
+        else:
+            prepared[name] = np.full(n, default, dtype=np.float64)
+    return prepared
+
+def financial_scores(c: Mapping[str, np.ndarray]) -> np.ndarray:
+    """财务自由度"""
+    return financial_formula(c['passive_income'], c['active_income'], c['monthly_expenses'], c['emergency_fund'])['score']
+
+def time_scores(c: Mapping[str, np.ndarray]) -> np.ndarray:
+    """时间自由度"""
+    return time_formula(c['work_hours_per_week'], c['flexible_hours'], c['vacation_days'], c['can_work_remotely'])['score']
+
+def location_scores(c: Mapping[str, np.ndarray]) -> np.ndarray:
+    """地理自由度"""
+    return location_formula(c['can_work_anywhere'], c['travel_frequency'], c['location_constraints'])['score']
+
+def skill_scores(c: Mapping[str, np.ndarray]) -> np.ndarray:
+    """技能自由度"""
+    return skill_formula(c['skill_count'], c['learning_rate'], c['market_match_count'])['score']
+
+class BatchFreedomCalculator:
+    """列式批量自由度计算器"""
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, kernel: Optional[FreedomKernel] = None):
+        if kernel is None:
+            kernel = FreedomKernel(weights) if weights is not None else get_default_kernel()
+        self.kernel = kernel
+        self.dimensions = kernel.dimensions
+
+    @property
+    def weights(self) -> Mapping[str, float]:
+        """内核权重的只读视图"""
+        return self.kernel.weight_view
+
+    def score_dimensions(self, columns: Any, market_demand_skills: Any = None) -> Dict[str, np.ndarray]:
+        """计算各维度得分"""
+        c = prepare_columns(columns, market_demand_skills)
+        return {
+            'financial': financial_scores(c),
+            'time': time_scores(c),
+            'location': location_scores(c),
+            'skill': skill_scores(c),
+            'relationship': c['relationship_score']
+        }
+
+    def calculate(self, columns: Any, market_demand_skills: Any = None) -> Dict[str, np.ndarray]:
+        """计算所有维度得分、综合得分、等级与改进优先级，结果均为长度N的数组"""
+        scores = self.score_dimensions(columns, market_demand_skills)
+        return self.combine(scores)
+
+    def combine(self, scores: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """由各维度得分汇总综合结果"""
+        result = dict(scores)
+        result.update(self.kernel.evaluate_batch(scores))
+        return result
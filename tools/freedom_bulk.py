@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+自由度批量评估 - 流式读取CSV/NDJSON，分块计算并增量写出
+Bulk freedom scoring for CSV / NDJSON streams
+
+内存占用只与分块大小和工作进程数有关，与输入文件大小无关。
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.freedom_batch import BatchFreedomCalculator, NUMERIC_COLUMNS, skill_counts
+
+# 与交互模式使用的市场需求技能保持一致
+DEFAULT_MARKET_SKILLS = ['AI', 'Python', '数据分析', '数字营销', '项目管理']
+
+# 评估记录中按维度嵌套的输入段 (与 assessment_history 中 input_data 的结构一致)
+NESTED_SECTIONS = ('financial', 'time', 'location', 'skill')
+
+# 由技能列表计算得出的列
+SKILL_COUNT_COLUMNS = ('skill_count', 'market_match_count')
+
+OUTPUT_FIELDS = [
+    'user_id', 'financial', 'time', 'location', 'skill', 'relationship',
+    'overall', 'level', 'improvement_priority'
+]
+
+_TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+
+def to_number(value: Any, default: float) -> float:
+    if value is None:
+        return default
+    if isinstance(value, (bool, int, float)):
+        return float(value)
+    text = str(value).strip().lower()
+    if not text:
+        return default
+    if text in _TRUE_VALUES:
+        return 1.0
+    if text in {'0', 'false', 'no', 'n', 'f'}:
+        return 0.0
+    return float(text)
+
+def _to_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [item.strip() for item in str(value).replace('|', ';').split(';') if item.strip()]
+
+def flatten_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """展平一条记录
+
+    支持扁平记录，也支持 {'financial': {...}, 'time': {...}, ...} 形式的嵌套评估输入
+    (与 assessment_history 中 input_data 的结构一致)。
+    """
+    if not any(key in record for key in NESTED_SECTIONS) and 'input_data' not in record:
+        return record
+
+    flat = {}
+    for key, value in record.items():
+        if key in NESTED_SECTIONS and isinstance(value, dict):
+            flat.update(value)
+        elif key == 'input_data' and isinstance(value, dict):
+            flat.update(flatten_record(value))
+        else:
+            flat[key] = value
+    return flat
+
+def _numeric_column(values: List[Any], default: float, name: str = '', first_row: int = 1) -> np.ndarray:
+    """数值列转换：JSON数值与CSV数字字符串直接批量转换，布尔/空值等再逐个处理
+
+    空值 (JSON null) 使用该列的默认值；无法解析的值以及 NaN、inf 等非有限值同样使用默认值，
+    并在标准错误中报告所在的记录序号 (从 first_row 起算)，单个坏值不会中断整个批量任务。
+    """
+    invalid = []
+    try:
+        column = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        column = np.empty(len(values), dtype=np.float64)
+        for i, value in enumerate(values):
+            try:
+                column[i] = to_number(value, default)
+            except (TypeError, ValueError):
+                column[i] = default
+                invalid.append(i)
+
+    # 批量转换会把 None 变成 NaN，"nan"/"inf" 字符串也能解析成功，这里统一检查
+    non_finite = np.flatnonzero(~np.isfinite(column))
+    if len(non_finite):
+        column = np.array(column, dtype=np.float64)
+        column[non_finite] = default
+        invalid.extend(int(i) for i in non_finite if values[i] is not None)
+
+    if invalid:
+        invalid.sort()
+        shown = ', '.join(str(first_row + i) for i in invalid[:5]) + (' ...' if len(invalid) > 5 else '')
+        print(f"{name} 列有 {len(invalid)} 个无效数值，已使用默认值 {default} (记录 {shown})", file=sys.stderr)
+    return column
+
+def records_to_columns(records: List[Dict[str, Any]], market_skills: List[str],
+                       first_row: int = 1) -> Dict[str, Any]:
+    """把一个分块的记录转置为列，缺失值和非数值使用默认值；CSV中的技能列用分号或竖线分隔
+
+    first_row 为该分块第一条记录在输入中的序号 (从1起，不含CSV表头)，用于报告坏值的位置。
+    """
+    rows = [flatten_record(record) for record in records]
+    columns = {'user_id': [row.get('user_id') for row in rows]}
+
+    for name, default in NUMERIC_COLUMNS.items():
+        if name in SKILL_COUNT_COLUMNS:
+            continue
+        values = [row.get(name, default) for row in rows]
+        columns[name] = _numeric_column(values, default, name, first_row)
+
+    columns.update(skill_counts(
+        [_to_list(row.get('transferable_skills')) for row in rows],
+        [_to_list(row['market_demand_skills']) if 'market_demand_skills' in row else market_skills for row in rows]
+    ))
+    return columns
+
+def read_records(stream: TextIO, input_format: str) -> Iterator[Dict[str, Any]]:
+    """逐条读取输入记录"""
+    if input_format == 'csv':
+        for record in csv.DictReader(stream):
+            yield record
+    else:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def score_chunk(records: List[Dict[str, Any]], weights: Optional[Dict[str, float]] = None,
+                market_skills: Optional[List[str]] = None, first_row: int = 1) -> Dict[str, List[Any]]:
+    """计算一个分块，返回按 OUTPUT_FIELDS 组织的输出列 (可在工作进程中执行)"""
+    if not records:
+        return {name: [] for name in OUTPUT_FIELDS}
+
+    market_skills = DEFAULT_MARKET_SKILLS if market_skills is None else market_skills
+    columns = records_to_columns(records, market_skills, first_row)
+    result = BatchFreedomCalculator(weights).calculate(columns)
+
+    output = {'user_id': columns['user_id']}
+    for name in ('financial', 'time', 'location', 'skill', 'relationship', 'overall'):
+        output[name] = np.round(result[name], 6).tolist()
+    output['level'] = result['level'].tolist()
+    output['improvement_priority'] = result['improvement_priority'].tolist()
+    return output
+
+def _chunks(records: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    iterator = iter(records)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+class ResultWriter:
+    """增量写出结果"""
+
+    def __init__(self, stream: TextIO, output_format: str):
+        self.stream = stream
+        self.output_format = output_format
+        self.count = 0
+        self._csv = None
+        if output_format == 'csv':
+            self._csv = csv.writer(stream)
+            self._csv.writerow(OUTPUT_FIELDS)
+
+    def write(self, columns: Dict[str, List[Any]]):
+        rows = zip(*(columns[name] for name in OUTPUT_FIELDS))
+        if self._csv is not None:
+            self._csv.writerows(rows)
+        else:
+            self.stream.write(''.join(
+                json.dumps(dict(zip(OUTPUT_FIELDS, row)), ensure_ascii=False) + '\n' for row in rows
+            ))
+        self.stream.flush()
+        self.count += len(columns['user_id'])
+
+def score_stream(records: Iterable[Dict[str, Any]], writer: ResultWriter,
+                 weights: Optional[Dict[str, float]] = None,
+                 market_skills: Optional[List[str]] = None,
+                 chunk_size: int = 10000, workers: int = 1) -> int:
+    """分块计算并按输入顺序写出，返回处理的记录数
+
+    多进程时最多只有 2×workers 个分块在途，保证内存占用恒定。
+    """
+    # (分块, 分块第一条记录的序号)
+    chunks = ((chunk, 1 + i * chunk_size) for i, chunk in enumerate(_chunks(records, chunk_size)))
+
+    if workers <= 1:
+        for chunk, first_row in chunks:
+            writer.write(score_chunk(chunk, weights, market_skills, first_row))
+        return writer.count
+
+    with Pool(workers) as pool:
+        pending = deque()
+        for chunk, first_row in chunks:
+            pending.append(pool.apply_async(score_chunk, (chunk, weights, market_skills, first_row)))
+            if len(pending) >= workers * 2:
+                writer.write(pending.popleft().get())
+        while pending:
+            writer.write(pending.popleft().get())
+    return writer.count
+
+def detect_format(path: Optional[str], declared: str) -> str:
+    if declared != 'auto':
+        return declared
+    if path and path.lower().endswith('.csv'):
+        return 'csv'
+    return 'ndjson'
+
+def run_bulk(input_path: str, output_path: str = '-', input_format: str = 'auto',
+             output_format: str = 'auto', weights: Optional[Dict[str, float]] = None,
+             market_skills: Optional[List[str]] = None, chunk_size: int = 10000,
+             workers: int = 1) -> int:
+    """批量评估入口，input_path / output_path 为 '-' 时使用标准输入/输出"""
+    input_format = detect_format(None if input_path == '-' else input_path, input_format)
+    output_format = input_format if output_format == 'auto' else output_format
+
+    if input_path == '-':
+        source = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+    else:
+        source = open(input_path, 'r', encoding='utf-8', newline='')
+
+    if output_path == '-':
+        target = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline='', write_through=True)
+    else:
+        target = open(output_path, 'w', encoding='utf-8', newline='')
+
+    try:
+        writer = ResultWriter(target, output_format)
+        return score_stream(read_records(source, input_format), writer, weights,
+                            market_skills, chunk_size, workers)
+    finally:
+        if input_path != '-':
+            source.close()
+        if output_path != '-':
+            target.close()
+        else:
+            target.detach()
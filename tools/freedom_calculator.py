@@ -4,23 +4,62 @@
 Freedom Calculator - Practical Tools
 """
 
+import copy
 import json
 import argparse
+import os
+import sys
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.freedom_batch import BatchFreedomCalculator, NUMERIC_COLUMNS, skill_counts
+from tools.freedom_kernel import (FreedomKernel, financial_formula, get_default_kernel, location_formula,
+                                  skill_formula, time_formula)
+from tools.freedom_bulk import (DEFAULT_MARKET_SKILLS, ResultWriter, flatten_record, run_bulk,
+                                score_stream, to_number)
+
+# 各维度依赖的输入字段 (与 assessment_history 中 input_data 的分段一致)
+DIMENSION_FIELDS = {
+    'financial': ('passive_income', 'active_income', 'monthly_expenses', 'emergency_fund'),
+    'time': ('work_hours_per_week', 'flexible_hours', 'vacation_days', 'can_work_remotely'),
+    'location': ('can_work_anywhere', 'travel_frequency', 'location_constraints'),
+    'skill': ('transferable_skills', 'learning_rate', 'market_demand_skills')
+}
+FIELD_DIMENSIONS = {field: dim for dim, fields in DIMENSION_FIELDS.items() for field in fields}
+
+def _fingerprint(dimension: str, section: Dict[str, Any]) -> Tuple:
+    """维度输入的指纹：只取该维度关心的字段，列表转为元组以便比较"""
+    return tuple(
+        tuple(value) if isinstance(value, (list, tuple)) else value
+        for value in (section.get(field) for field in DIMENSION_FIELDS[dimension])
+    )
 
 class FreedomCalculator:
     """自由度计算器"""
     
-    def __init__(self):
-        self.weights = {
-            'financial': 0.35,  # 财务自由权重最高
-            'time': 0.25,
-            'location': 0.20,
-            'skill': 0.15,
-            'relationship': 0.05
+    def __init__(self, cache_size: int = 10000, kernel: Optional[FreedomKernel] = None):
+        # 权重来自config.json的freedom_weights (财务自由权重最高)
+        self.kernel = kernel or get_default_kernel()
+        
+        # 增量计算缓存: user_id -> {维度: (输入, 指纹, 结果)}，按最近使用淘汰
+        self.cache_size = cache_size
+        self._dimension_cache: 'OrderedDict[str, Dict[str, Tuple]]' = OrderedDict()
+        self._calculators = {
+            'financial': self.calculate_financial_freedom,
+            'time': self.calculate_time_freedom,
+            'location': self.calculate_location_freedom,
+            'skill': self.calculate_skill_freedom
         }
     
+    @property
+    def weights(self) -> Mapping[str, float]:
+        """评分内核权重的只读视图 (要换权重请构造新的 FreedomKernel)"""
+        return self.kernel.weight_view
+    
     def calculate_financial_freedom(self, data: Dict[str, float]) -> Dict[str, Any]:
         """计算财务自由度"""
         passive_income = data.get('passive_income', 0)
@@ -28,25 +67,11 @@ class FreedomCalculator:
         monthly_expenses = data.get('monthly_expenses', 0)
         emergency_fund = data.get('emergency_fund', 0)
         
-        # 基础财务自由度 = 被动收入 / 月支出
-        basic_ratio = passive_income / monthly_expenses if monthly_expenses > 0 else 0
-        
-        # 应急基金覆盖月数
-        emergency_months = emergency_fund / monthly_expenses if monthly_expenses > 0 else 0
-        
-        # 收入多样性 (简化计算)
-        income_diversity = min(len([i for i in [passive_income, active_income] if i > 0]) / 2, 1.0)
-        
-        # 综合财务自由度
-        financial_score = min((basic_ratio * 0.6 + min(emergency_months / 6, 1.0) * 0.3 + income_diversity * 0.1), 1.0)
-        
-        return {
-            'score': financial_score,
-            'basic_ratio': basic_ratio,
-            'emergency_months': emergency_months,
-            'income_diversity': income_diversity,
-            'recommendations': self._get_financial_recommendations(financial_score, basic_ratio, emergency_months)
-        }
+        # 被动收入覆盖率、应急基金月数、收入多样性 (公式见评分内核)
+        result = financial_formula(passive_income, active_income, monthly_expenses, emergency_fund)
+        result['recommendations'] = self._get_financial_recommendations(
+            result['score'], result['basic_ratio'], result['emergency_months'])
+        return result
     
     def calculate_time_freedom(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """计算时间自由度"""
@@ -55,25 +80,11 @@ class FreedomCalculator:
         vacation_days = data.get('vacation_days', 0)
         can_work_remotely = data.get('can_work_remotely', False)
         
-        # 工作时间灵活性
-        time_flexibility = flexible_hours / work_hours_per_week if work_hours_per_week > 0 else 0
-        
-        # 假期自由度
-        vacation_freedom = min(vacation_days / 30, 1.0)  # 30天为满分
-        
-        # 远程工作加分
-        remote_bonus = 0.2 if can_work_remotely else 0
-        
-        # 综合时间自由度
-        time_score = min(time_flexibility * 0.5 + vacation_freedom * 0.3 + remote_bonus, 1.0)
-        
-        return {
-            'score': time_score,
-            'time_flexibility': time_flexibility,
-            'vacation_freedom': vacation_freedom,
-            'remote_work': can_work_remotely,
-            'recommendations': self._get_time_recommendations(time_score, work_hours_per_week)
-        }
+        # 工作时间灵活性、假期 (30天为满分)、远程工作加分
+        result = time_formula(work_hours_per_week, flexible_hours, vacation_days, can_work_remotely)
+        result['remote_work'] = can_work_remotely
+        result['recommendations'] = self._get_time_recommendations(result['score'], work_hours_per_week)
+        return result
     
     def calculate_location_freedom(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """计算地理位置自由度"""
@@ -81,25 +92,11 @@ class FreedomCalculator:
         travel_frequency = data.get('travel_frequency', 0)  # 每年旅行次数
         location_constraints = data.get('location_constraints', 0)  # 地理限制数量
         
-        # 工作地点自由度
-        work_location_freedom = 1.0 if can_work_anywhere else 0.3
-        
-        # 旅行自由度
-        travel_freedom = min(travel_frequency / 4, 1.0)  # 每年4次旅行为满分
-        
-        # 地理限制惩罚
-        constraint_penalty = location_constraints * 0.1
-        
-        # 综合地理自由度
-        location_score = max(work_location_freedom * 0.6 + travel_freedom * 0.4 - constraint_penalty, 0)
-        
-        return {
-            'score': location_score,
-            'work_location_freedom': work_location_freedom,
-            'travel_freedom': travel_freedom,
-            'constraints': location_constraints,
-            'recommendations': self._get_location_recommendations(location_score, can_work_anywhere)
-        }
+        # 工作地点、旅行频率 (每年4次为满分)、地理限制惩罚
+        result = location_formula(can_work_anywhere, travel_frequency, location_constraints)
+        result['constraints'] = location_constraints
+        result['recommendations'] = self._get_location_recommendations(result['score'], can_work_anywhere)
+        return result
     
     def calculate_skill_freedom(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """计算技能自由度"""
@@ -107,57 +104,217 @@ class FreedomCalculator:
         learning_rate = data.get('learning_rate', 0)  # 每年学习新技能数量
         market_demand_skills = data.get('market_demand_skills', [])
         
-        # 可转移技能数量
+        # 技能数量 (10个为满分)、学习速度 (每年3个为满分)、市场需求匹配度
         skill_count = len(transferable_skills)
-        skill_diversity = min(skill_count / 10, 1.0)  # 10个技能为满分
-        
-        # 学习能力
-        learning_ability = min(learning_rate / 3, 1.0)  # 每年3个新技能为满分
-        
-        # 市场需求匹配度
-        demand_match = len(set(transferable_skills) & set(market_demand_skills)) / max(len(transferable_skills), 1)
-        
-        # 综合技能自由度
-        skill_score = skill_diversity * 0.4 + learning_ability * 0.3 + demand_match * 0.3
-        
-        return {
-            'score': skill_score,
-            'skill_diversity': skill_diversity,
-            'learning_ability': learning_ability,
-            'market_match': demand_match,
-            'recommendations': self._get_skill_recommendations(skill_score, skill_count)
-        }
+        market_match_count = len(set(transferable_skills) & set(market_demand_skills))
+        result = skill_formula(skill_count, learning_rate, market_match_count)
+        result['recommendations'] = self._get_skill_recommendations(result['score'], skill_count)
+        return result
     
     def calculate_overall_freedom(self, individual_scores: Dict[str, float]) -> Dict[str, Any]:
         """计算综合自由度"""
-        weighted_score = sum(
-            individual_scores.get(category, 0) * weight 
-            for category, weight in self.weights.items()
-        )
-        
-        # 自由度等级
-        if weighted_score >= 0.8:
-            level = "高度自由"
-            color = "green"
-        elif weighted_score >= 0.6:
-            level = "相对自由"
-            color = "yellow"
-        elif weighted_score >= 0.4:
-            level = "部分自由"
-            color = "orange"
-        else:
-            level = "受限状态"
-            color = "red"
+        evaluation = self.kernel.evaluate(individual_scores)
+        weighted_score = evaluation['overall_score']
         
         return {
             'overall_score': weighted_score,
-            'level': level,
-            'color': color,
+            'level': evaluation['level'],
+            'color': evaluation['color'],
             'breakdown': individual_scores,
             'next_milestone': self._get_next_milestone(weighted_score),
             'improvement_priority': self._get_improvement_priority(individual_scores)
         }
     
+    def calculate_batch(self, columns: Any, market_demand_skills: Any = None) -> Dict[str, Any]:
+        """批量计算N个用户的自由度
+        
+        Args:
+            columns: NumPy结构化数组或 {列名: 数组} 字典，列名与单条计算的输入字段相同；
+                     技能可以给出 transferable_skills 列，也可以直接给出 skill_count / market_match_count
+            market_demand_skills: 所有用户共用的市场需求技能列表
+        
+        Returns:
+            各维度得分、overall、level、color、improvement_priority 等数组
+        """
+        return BatchFreedomCalculator(kernel=self.kernel).calculate(columns, market_demand_skills)
+    
+    def sweep(self, input_data: Dict[str, Any], variables: Dict[str, Sequence[float]],
+              grid: bool = False, max_points: int = 1000000) -> Dict[str, Any]:
+        """假设分析：在基准输入上扰动若干变量，一次向量化计算全部结果
+        
+        Args:
+            input_data: 基准输入，结构同 calculate_assessment (也接受扁平字段)
+            variables: {字段名: 取值序列 (不能为空)}，字段名为 NUMERIC_COLUMNS 中的数值字段，
+                       布尔字段用 0/1 表示，技能可通过 skill_count / market_match_count 扰动
+            grid: False 时逐个变量单独扫描 (其余变量保持基准值)；
+                  True 时额外计算所有变量取值的笛卡尔积响应面
+            max_points: 笛卡尔积的点数上限
+        
+        Returns:
+            baseline: 基准得分；variables: 每个变量的取值、综合得分、各维度得分、
+            边际收益 (综合得分对该变量的导数) 及各维度对边际收益的贡献；
+            grid 为 True 时另含 grid (按 variables 顺序排列的多维综合得分)
+        """
+        unknown = [name for name in variables if name not in NUMERIC_COLUMNS]
+        if unknown:
+            raise ValueError(f"不支持扫描的字段: {unknown}")
+        empty = [name for name, values in variables.items() if len(values) == 0]
+        if empty:
+            raise ValueError(f"扫描字段的取值列表为空: {empty}")
+        
+        baseline = self._baseline_columns(input_data)
+        batch = BatchFreedomCalculator(kernel=self.kernel)
+        weights = self.kernel.weight_view
+        
+        def evaluate(overrides: Dict[str, np.ndarray], n: int) -> Dict[str, np.ndarray]:
+            columns = {name: np.full(n, value) for name, value in baseline.items()}
+            columns.update(overrides)
+            return batch.calculate(columns)
+        
+        base_result = evaluate({}, 1)
+        result = {
+            'baseline': {
+                'overall': float(base_result['overall'][0]),
+                'scores': {dim: float(base_result[dim][0]) for dim in self.kernel.dimensions}
+            },
+            'variables': {}
+        }
+        
+        # 逐变量扫描：所有变量拼成一个批次一起计算
+        names = list(variables)
+        values = [np.asarray(variables[name], dtype=np.float64) for name in names]
+        offsets = np.cumsum([0] + [len(v) for v in values])
+        total = int(offsets[-1])
+        overrides = {}
+        for i, name in enumerate(names):
+            column = np.full(total, baseline[name])
+            column[offsets[i]:offsets[i + 1]] = values[i]
+            overrides[name] = column
+        swept = evaluate(overrides, total) if total else {}
+        
+        for i, name in enumerate(names):
+            part = slice(offsets[i], offsets[i + 1])
+            xs = values[i]
+            scores = {dim: swept[dim][part] for dim in self.kernel.dimensions}
+            result['variables'][name] = {
+                'values': xs.tolist(),
+                'overall': swept['overall'][part].tolist(),
+                'scores': {dim: score.tolist() for dim, score in scores.items()},
+                'marginal_gain': self._gradient(swept['overall'][part], xs).tolist(),
+                'dimension_gains': {
+                    dim: (self._gradient(score, xs) * weights[dim]).tolist()
+                    for dim, score in scores.items()
+                }
+            }
+        
+        if grid and names:
+            shape = tuple(len(v) for v in values)
+            n = int(np.prod(shape))
+            if n > max_points:
+                raise ValueError(f"响应面共 {n} 个点，超过上限 {max_points}")
+            mesh = np.meshgrid(*values, indexing='ij')
+            surface = evaluate({name: axis.ravel() for name, axis in zip(names, mesh)}, n)
+            result['grid'] = {
+                'variables': names,
+                'shape': list(shape),
+                'overall': surface['overall'].reshape(shape).tolist()
+            }
+        
+        return result
+    
+    @staticmethod
+    def _gradient(ys: np.ndarray, xs: np.ndarray) -> np.ndarray:
+        """dy/dx，取值不足两个或存在重复取值时按0处理"""
+        if len(xs) < 2 or np.any(np.diff(xs) == 0):
+            return np.zeros(len(xs))
+        return np.gradient(ys, xs)
+    
+    def _baseline_columns(self, input_data: Dict[str, Any]) -> Dict[str, float]:
+        """基准输入转换为 {数值字段: 值}，技能列表折算为 skill_count / market_match_count"""
+        flat = flatten_record(input_data)
+        baseline = {
+            name: to_number(flat.get(name), default)
+            for name, default in NUMERIC_COLUMNS.items()
+            if name not in ('skill_count', 'market_match_count')
+        }
+        counts = skill_counts([flat.get('transferable_skills') or []], flat.get('market_demand_skills') or [])
+        for name in ('skill_count', 'market_match_count'):
+            baseline[name] = to_number(flat[name], 0.0) if name in flat else float(counts[name][0])
+        return baseline
+    
+    def calculate_assessment(self, input_data: Dict[str, Any], user_id: Optional[str] = None) -> Dict[str, Any]:
+        """完整评估一次输入
+        
+        Args:
+            input_data: 与 assessment_history 中 input_data 相同的结构，
+                        即 {'financial': {...}, 'time': {...}, 'location': {...}, 'skill': {...}, 'relationship_score': x}
+            user_id: 给出时启用增量模式，只重新计算输入指纹发生变化的维度
+        
+        Returns:
+            individual_results (各维度详细结果)、individual_scores、overall、recomputed (本次重新计算的维度)
+        """
+        sections = {dim: input_data.get(dim) or {} for dim in DIMENSION_FIELDS}
+        return self._assess(sections, input_data.get('relationship_score', 0.5), user_id)
+    
+    def update_assessment(self, user_id: str, changes: Dict[str, Any]) -> Dict[str, Any]:
+        """按字段增量更新评估 (例如偏好更新只改了 vacation_days)
+        
+        changes 为扁平的 {字段: 新值}，字段会被归入所属维度；
+        未缓存过的用户等同于以 changes 作为全部输入做一次完整评估。
+        """
+        cached = self._dimension_cache.get(user_id, {})
+        sections = {dim: dict(cached[dim][0]) if dim in cached else {} for dim in DIMENSION_FIELDS}
+        relationship_score = cached.get('relationship', (0.5,))[0]
+        
+        for field, value in changes.items():
+            if field == 'relationship_score':
+                relationship_score = value
+            elif field in FIELD_DIMENSIONS:
+                sections[FIELD_DIMENSIONS[field]][field] = value
+        
+        return self._assess(sections, relationship_score, user_id)
+    
+    def invalidate(self, user_id: Optional[str] = None):
+        """清除某个用户 (或全部用户) 的增量缓存"""
+        if user_id is None:
+            self._dimension_cache.clear()
+        else:
+            self._dimension_cache.pop(user_id, None)
+    
+    def _assess(self, sections: Dict[str, Dict[str, Any]], relationship_score: float,
+                user_id: Optional[str]) -> Dict[str, Any]:
+        cached = self._dimension_cache.get(user_id, {}) if user_id is not None else {}
+        entry = {}
+        results = {}
+        recomputed = []
+        
+        for dim, section in sections.items():
+            fingerprint = _fingerprint(dim, section)
+            if dim in cached and cached[dim][1] == fingerprint:
+                results[dim] = cached[dim][2]
+            else:
+                results[dim] = self._calculators[dim](section)
+                recomputed.append(dim)
+            entry[dim] = (dict(section), fingerprint, results[dim])
+        entry['relationship'] = (relationship_score,)
+        
+        if user_id is not None:
+            self._dimension_cache[user_id] = entry
+            self._dimension_cache.move_to_end(user_id)
+            while len(self._dimension_cache) > self.cache_size:
+                self._dimension_cache.popitem(last=False)
+        
+        individual_scores = {dim: result['score'] for dim, result in results.items()}
+        individual_scores['relationship'] = relationship_score
+        
+        # 缓存中的结果在多次响应之间共享，返回副本，调用方修改响应不会影响缓存
+        return {
+            'individual_results': copy.deepcopy(results),
+            'individual_scores': individual_scores,
+            'overall': self.calculate_overall_freedom(individual_scores),
+            'recomputed': recomputed
+        }
+    
     def _get_financial_recommendations(self, score: float, ratio: float, emergency_months: float) -> List[str]:
         """财务自由建议"""
         recommendations = []
@@ -231,6 +388,12 @@ def main():
     parser = argparse.ArgumentParser(description='自由度计算器')
     parser.add_argument('--config', type=str, help='配置文件路径')
     parser.add_argument('--interactive', action='store_true', help='交互式模式')
+    parser.add_argument('--input', type=str, help='批量模式输入文件 (CSV/NDJSON)，"-" 表示标准输入')
+    parser.add_argument('--output', type=str, default='-', help='批量模式输出文件，默认标准输出')
+    parser.add_argument('--format', choices=['auto', 'csv', 'ndjson'], default='auto', help='输入格式')
+    parser.add_argument('--output-format', choices=['auto', 'csv', 'ndjson'], default='auto', help='输出格式，默认与输入相同')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='每个计算分块的记录数')
+    parser.add_argument('--workers', type=int, default=1, help='并行计算的进程数')
     
     args = parser.parse_args()
     
@@ -290,7 +453,7 @@ def main():
         skill_data = {
             'transferable_skills': skills,
             'learning_rate': learning_rate,
-            'market_demand_skills': ['AI', 'Python', '数据分析', '数字营销', '项目管理']
+            'market_demand_skills': DEFAULT_MARKET_SKILLS
         }
         
         # 计算结果
@@ -334,16 +497,25 @@ def main():
         for rec in skill_result['recommendations']:
             print(f"  • {rec}")
     
+    elif args.input:
+        # 批量模式：流式读取、分块计算、增量写出
+        count = run_bulk(
+            args.input, args.output, args.format, args.output_format,
+            weights=calculator.kernel.weight_map, chunk_size=args.chunk_size, workers=args.workers
+        )
+        print(f"已完成 {count} 条记录的自由度评估", file=sys.stderr)
+    
     elif args.config:
-        # 从配置文件读取
+        # 从配置文件读取 (单条评估输入或评估输入列表)
         with open(args.config, 'r', encoding='utf-8') as f:
             config = json.load(f)
         
-        # 处理配置文件数据...
-        print("从配置文件计算自由度...")
+        records = config if isinstance(config, list) else [config]
+        writer = ResultWriter(sys.stdout, 'ndjson')
+        score_stream(records, writer, weights=calculator.kernel.weight_map)
     
     else:
-        print("请使用 --interactive 进行交互式评估，或 --config 指定配置文件")
+        print("请使用 --interactive 进行交互式评估，--input 进行批量评估，或 --config 指定配置文件")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+自由度评分内核
+Freedom Scoring Kernel - stateless weighted scoring shared by all freedom paths
+
+权重在构造时一次性编译为元组和只读NumPy向量，内核本身不可变、无共享可变状态，
+可在多个线程/请求间直接复用；同一内核同时提供单条 (scalar) 和批量 (batch) 两种形式。
+各维度的评分公式也只在这里定义一次，参数既可以是单个数值也可以是NumPy数组，
+FreedomCalculator、BatchFreedomCalculator 和 FreedomMetrics 都调用同一组公式。
+"""
+
+import json
+import os
+import threading
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_WEIGHTS = {
+    'financial': 0.35,
+    'time': 0.25,
+    'location': 0.20,
+    'skill': 0.15,
+    'relationship': 0.05
+}
+
+# 等级下界与名称，由低到高
+LEVEL_THRESHOLDS = (0.4, 0.6, 0.8)
+LEVEL_NAMES = np.array(["受限状态", "部分自由", "相对自由", "高度自由"])
+LEVEL_COLORS = np.array(["red", "orange", "yellow", "green"])
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
+
+# 维度公式 (标量与数组通用)
+
+def _minimum(x: Any, bound: float) -> Any:
+    return np.minimum(x, bound) if isinstance(x, np.ndarray) else min(x, bound)
+
+def _maximum(x: Any, bound: float) -> Any:
+    return np.maximum(x, bound) if isinstance(x, np.ndarray) else max(x, bound)
+
+def _choose(flag: Any, if_true: float, if_false: float) -> Any:
+    """按真值取值 (数组中非0为真)"""
+    return np.where(flag != 0, if_true, if_false) if isinstance(flag, np.ndarray) else (if_true if flag else if_false)
+
+def _positive(x: Any) -> Any:
+    return (x > 0).astype(np.float64) if isinstance(x, np.ndarray) else (1.0 if x > 0 else 0.0)
+
+def safe_ratio(numerator: Any, denominator: Any) -> Any:
+    """分母不大于0时结果为0"""
+    if isinstance(numerator, np.ndarray) or isinstance(denominator, np.ndarray):
+        numerator, denominator = np.broadcast_arrays(np.asarray(numerator, dtype=np.float64),
+                                                     np.asarray(denominator, dtype=np.float64))
+        out = np.zeros(numerator.shape, dtype=np.float64)
+        np.divide(numerator, denominator, out=out, where=denominator > 0)
+        return out
+    return numerator / denominator if denominator > 0 else 0
+
+def financial_formula(passive_income: Any, active_income: Any, monthly_expenses: Any,
+                      emergency_fund: Any) -> Dict[str, Any]:
+    """财务自由度：被动收入覆盖率、应急基金月数和收入多样性"""
+    basic_ratio = safe_ratio(passive_income, monthly_expenses)
+    emergency_months = safe_ratio(emergency_fund, monthly_expenses)
+    income_diversity = _minimum((_positive(passive_income) + _positive(active_income)) / 2, 1.0)
+    score = _minimum(basic_ratio * 0.6 + _minimum(emergency_months / 6, 1.0) * 0.3 + income_diversity * 0.1, 1.0)
+    return {'score': score, 'basic_ratio': basic_ratio, 'emergency_months': emergency_months,
+            'income_diversity': income_diversity}
+
+def time_formula(work_hours_per_week: Any, flexible_hours: Any, vacation_days: Any,
+                 can_work_remotely: Any) -> Dict[str, Any]:
+    """时间自由度：弹性工时比例、假期 (30天满分) 和远程工作加分"""
+    time_flexibility = safe_ratio(flexible_hours, work_hours_per_week)
+    vacation_freedom = _minimum(vacation_days / 30, 1.0)
+    remote_bonus = _choose(can_work_remotely, 0.2, 0.0)
+    score = _minimum(time_flexibility * 0.5 + vacation_freedom * 0.3 + remote_bonus, 1.0)
+    return {'score': score, 'time_flexibility': time_flexibility, 'vacation_freedom': vacation_freedom}
+
+def location_formula(can_work_anywhere: Any, travel_frequency: Any, location_constraints: Any) -> Dict[str, Any]:
+    """地理自由度：工作地点、旅行频率 (每年4次满分) 和地理限制惩罚"""
+    work_location_freedom = _choose(can_work_anywhere, 1.0, 0.3)
+    travel_freedom = _minimum(travel_frequency / 4, 1.0)
+    constraint_penalty = location_constraints * 0.1
+    score = _maximum(work_location_freedom * 0.6 + travel_freedom * 0.4 - constraint_penalty, 0)
+    return {'score': score, 'work_location_freedom': work_location_freedom, 'travel_freedom': travel_freedom}
+
+def skill_formula(skill_count: Any, learning_rate: Any, market_match_count: Any) -> Dict[str, Any]:
+    """技能自由度：技能数量 (10个满分)、学习速度 (每年3个满分) 和市场需求匹配度"""
+    skill_diversity = _minimum(skill_count / 10, 1.0)
+    learning_ability = _minimum(learning_rate / 3, 1.0)
+    demand_match = market_match_count / _maximum(skill_count, 1)
+    score = skill_diversity * 0.4 + learning_ability * 0.3 + demand_match * 0.3
+    return {'score': score, 'skill_diversity': skill_diversity, 'learning_ability': learning_ability,
+            'market_match': demand_match}
+
+class FreedomKernel:
+    """自由度评分内核 (构造后只读)"""
+
+    def __init__(self, weights: Optional[Mapping[str, float]] = None):
+        weights = dict(weights or DEFAULT_WEIGHTS)
+        self.dimensions: Tuple[str, ...] = tuple(weights.keys())
+        self.weights: Tuple[Tuple[str, float], ...] = tuple((dim, float(w)) for dim, w in weights.items())
+        self._weight_view = MappingProxyType(dict(self.weights))
+
+        # 只读向量：内核构造后不再被修改，多线程共享无需加锁
+        self.weight_vector = np.array([w for _, w in self.weights], dtype=np.float64)
+        self.weight_vector.setflags(write=False)
+        self._thresholds = np.asarray(LEVEL_THRESHOLDS, dtype=np.float64)
+        self._thresholds.setflags(write=False)
+
+    @classmethod
+    def from_config(cls, config_path: str = DEFAULT_CONFIG_PATH) -> 'FreedomKernel':
+        """从config.json的freedom_weights段读取权重，文件或配置段缺失时使用默认权重"""
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            config = {}
+        return cls(config.get('freedom_weights') or DEFAULT_WEIGHTS)
+
+    @property
+    def weight_map(self) -> Dict[str, float]:
+        """权重的可修改副本 (修改不影响内核)"""
+        return dict(self.weights)
+
+    @property
+    def weight_view(self) -> Mapping[str, float]:
+        """权重的只读视图"""
+        return self._weight_view
+
+    # 单条形式
+
+    def overall(self, scores: Mapping[str, float]) -> float:
+        """加权综合得分，缺失维度按0计"""
+        return sum(scores.get(dim, 0) * weight for dim, weight in self.weights)
+
+    def level_code(self, overall: float) -> int:
+        code = 0
+        for threshold in LEVEL_THRESHOLDS:
+            if overall >= threshold:
+                code += 1
+        return code
+
+    def evaluate(self, scores: Mapping[str, float]) -> Dict[str, Any]:
+        """单个用户：综合得分、等级和得分最低的维度"""
+        overall = self.overall(scores)
+        code = self.level_code(overall)
+        priority = min(self.dimensions, key=lambda dim: scores.get(dim, 0))
+        return {
+            'overall_score': overall,
+            'level_code': code,
+            'level': str(LEVEL_NAMES[code]),
+            'color': str(LEVEL_COLORS[code]),
+            'improvement_priority': priority,
+            'improvement_priority_score': scores.get(priority, 0)
+        }
+
+    # 批量形式
+
+    def overall_batch(self, matrix: np.ndarray) -> np.ndarray:
+        """N×D 得分矩阵 (列顺序同 dimensions) 的加权综合得分"""
+        return matrix @ self.weight_vector
+
+    def evaluate_batch(self, scores: Mapping[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """N个用户的综合得分、等级和改进优先级，值均为长度N的数组"""
+        matrix = np.column_stack([np.asarray(scores[dim], dtype=np.float64) for dim in self.dimensions])
+        overall = self.overall_batch(matrix)
+        code = np.searchsorted(self._thresholds, overall, side='right')
+        priority_code = matrix.argmin(axis=1)
+        return {
+            'overall': overall,
+            'level_code': code,
+            'level': LEVEL_NAMES[code],
+            'color': LEVEL_COLORS[code],
+            'improvement_priority_code': priority_code,
+            'improvement_priority': np.asarray(self.dimensions)[priority_code],
+            'improvement_priority_score': matrix[np.arange(matrix.shape[0]), priority_code]
+        }
+
+_default_kernel: Optional[FreedomKernel] = None
+_default_kernel_lock = threading.Lock()
+
+def get_default_kernel() -> FreedomKernel:
+    """获取按config.json构建的进程内共享内核 (只构建一次)"""
+    global _default_kernel
+    if _default_kernel is None:
+        with _default_kernel_lock:
+            if _default_kernel is None:
+                _default_kernel = FreedomKernel.from_config()
+    return _default_kernel